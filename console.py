@@ -4,6 +4,7 @@ This program contains the entry point of command interpreter
 Class HBNBCommand is defined in this module and inherits from cmd.Cmd
 """
 import cmd
+import math
 import sys
 import shlex
 import ast
@@ -16,6 +17,9 @@ from models.city import City
 from models.amenity import Amenity
 from models.place import Place
 from models.review import Review
+from models.engine.query import Query
+from models import integrity
+from models.schema import Schema
 
 
 class HBNBCommand(cmd.Cmd):
@@ -30,9 +34,21 @@ class HBNBCommand(cmd.Cmd):
             "City": City, "Amenity": Amenity, "Place": Place,
             "Review": Review
             }
+    protected = ("id", "created_at", "updated_at")
+    batch_depth = 0
+    import_chunk = 1000
+
+    def precmd(self, line):
+        """Picks up the changes other processes saved before each command
+        """
+        storage.refresh()
+        return (line)
 
     def do_quit(self, line):
         """Quit command to exit the program gracefully"""
+        while self.batch_depth > 0:
+            self.do_commit("")
+        storage.close()
         return (True)
 
     def do_EOF(self, line):
@@ -40,6 +56,94 @@ class HBNBCommand(cmd.Cmd):
         print()
         return (self.do_quit(line))
 
+    def do_begin(self, line):
+        """Starts a batch: changes are only written by the matching commit
+
+            Ex: begin
+        """
+        storage.begin()
+        self.batch_depth += 1
+
+    def do_commit(self, line):
+        """Ends a batch and writes all its changes at once
+
+            Ex: commit
+        """
+        if self.batch_depth == 0:
+            print("** no batch in progress **")
+            return
+        self.batch_depth -= 1
+        storage.commit()
+
+    def do_import(self, line):
+        """Creates instances from a file holding one JSON record per line,
+        converting their values to the types of the class Schema
+
+            Ex: import places.ndjson
+        """
+        args = line.split()
+        if not args:
+            print("** file name missing **")
+            return
+
+        if self._read_only():
+            return
+
+        try:
+            file = open(args[0], 'r', encoding="utf-8")
+        except OSError:
+            print("** file doesn't exist **")
+            return
+
+        count = 0
+        with file, storage.batch():
+            for line_number, record in enumerate(file, 1):
+                if not record.strip():
+                    continue
+                try:
+                    obj_dict = json.loads(record)
+                    cls = self.class_map[obj_dict["__class__"]]
+                    obj_dict = Schema.of(cls).coerce_dict(obj_dict)
+                    storage.new(cls(**obj_dict))
+                except (ValueError, KeyError, TypeError):
+                    print(f"** invalid record on line {line_number} **")
+                    continue
+                count += 1
+                if count % self.import_chunk == 0:
+                    print(f"** {count} records imported **", file=sys.stderr)
+        print(count)
+
+    def do_export(self, line):
+        """Writes every instance of a class to a file, one JSON record
+        per line
+
+            Ex: export Place places.ndjson
+        """
+        args = line.split()
+        if not args:
+            print("** class name missing **")
+            return
+
+        class_name = args[0]
+        if class_name not in self.class_list:
+            print("** class doesn't exist **")
+            return
+
+        if len(args) < 2:
+            print("** file name missing **")
+            return
+
+        count = 0
+        try:
+            with open(args[1], 'w', encoding="utf-8") as file:
+                for obj in storage.all(class_name).values():
+                    file.write(json.dumps(obj.to_dict()) + "\n")
+                    count += 1
+        except OSError:
+            print("** file can't be written **")
+            return
+        print(count)
+
     def do_create(self, line):
         """Creates a new instance of BaseModel, saves it and prints the id
 
@@ -54,6 +158,9 @@ class HBNBCommand(cmd.Cmd):
             print("** class doesn't exist **")
             return
 
+        if self._read_only():
+            return
+
         cls = self.class_map[class_name]
         new_instance = cls()
         new_instance.save()
@@ -81,8 +188,7 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        key = f"{class_name}.{instance_id}"
-        instance = storage.all().get(key)
+        instance = storage.get(class_name, instance_id)
 
         if instance:
             print(instance)
@@ -90,7 +196,9 @@ class HBNBCommand(cmd.Cmd):
             print("** no instance found **")
 
     def do_destroy(self, line):
-        """Deletes an instance based on the class
+        """Deletes an instance based on the class, with the instances
+        the cascade relationships set by HBNB_ON_DELETE destroy; an
+        instance a restrict relationship refers to is kept
 
             Ex: destroy BaseModel 1234-1234-1234
         """
@@ -111,14 +219,40 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        key = f"{class_name}.{instance_id}"
-        instance = storage.all().get(key)
+        instance = storage.get(class_name, instance_id)
 
-        if instance:
-            del storage.all()[key]
-            storage.save()
-        else:
+        if not instance:
             print("** no instance found **")
+            return
+
+        if self._read_only():
+            return
+
+        try:
+            integrity.destroy(instance)
+        except ValueError as error:
+            print(f"** instance is {error} **")
+
+    def do_fsck(self, line):
+        """Prints every id an instance refers to without a stored
+        instance; with repair, destroys the instances of cascade
+        relationships left without their target and drops the missing
+        ids from id lists
+
+            Ex: fsck
+            Ex: fsck repair
+        """
+        args = line.split()
+        if args not in ([], ["repair"]):
+            print("** invalid fsck format **")
+            return
+
+        problems = integrity.check()
+        print([f"{obj.__class__.__name__}.{obj.id}.{relationship.attribute}"
+               f" -> {relationship.target}.{id}"
+               for obj, relationship, id in problems])
+        if args and not self._read_only():
+            print(f"{integrity.repair(problems)} repaired")
 
     def do_all(self, line):
         """Prints all string representation of all instances of a class"""
@@ -133,17 +267,16 @@ class HBNBCommand(cmd.Cmd):
             print("** class doesn't exist **")
             return
 
-        all_objs = storage.all()
         filtered_objs = []
 
-        for obj in all_objs.values():
-            if type(obj).__name__ == class_name:
-                filtered_objs.append(str(obj))
+        for obj in storage.all(class_name).values():
+            filtered_objs.append(str(obj))
 
         print(filtered_objs)
 
     def do_update(self, line):
-        """Updates an instance based on the class name and id
+        """Updates an instance based on the class name and id, converting
+        the value to the type of the attribute in the class Schema
 
             Ex: update BaseModel 1234-1234-1234 email "aibnb@mail.com"
         """
@@ -163,9 +296,8 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        all_objs = storage.all()
-        obj_key = f"{class_name}.{instance_id}"
-        if obj_key not in all_objs:
+        obj = storage.get(class_name, instance_id)
+        if obj is None:
             print("** no instance found **")
             return
 
@@ -179,33 +311,109 @@ class HBNBCommand(cmd.Cmd):
             print("** value missing **")
             return
 
-        obj = all_objs[obj_key]
-
-        if attr_name in ("id", "created_at", "updated_at"):
+        if attr_name in self.protected:
             print("** attribute cannot be updated **")
             return
 
-        current_value = getattr(obj, attr_name, None)
-        if isinstance(current_value, int):
-            try:
-                attr_value = int(attr_value)
-            except ValueError:
-                print("** invalid value type **")
-                return
-        elif isinstance(current_value, float):
-            try:
-                attr_value = float(attr_value)
-            except ValueError:
-                print("** invalid value type **")
-                return
-        elif isinstance(current_value, str):
-            attr_value = str(attr_value)
+        if self._read_only():
+            return
 
-        setattr(obj, attr_name, attr_value)
+        try:
+            attr_value = self._coerce(obj, {attr_name: attr_value})
+        except ValueError:
+            print("** invalid value type **")
+            return
+
+        setattr(obj, attr_name, attr_value[attr_name])
         obj.save()
 
-    def do_count(self, line):
-        """Retrieve the number of instances of a class"""
+    def do_near(self, line):
+        """Prints the instances of a class within a radius in km of a
+        latitude and longitude, nearest first, optionally only the
+        given number of nearest ones; with a radius of *, only the
+        nearest ones are printed
+
+            Ex: near Place 6.45 3.39 10
+            Ex: near Place 6.45 3.39 * 5
+        """
+        args = line.split()
+
+        if not args:
+            print("** class name missing **")
+            return
+
+        class_name = args[0]
+        if class_name not in self.class_list:
+            print("** class doesn't exist **")
+            return
+
+        if len(args) < 4 or (args[3] == "*" and len(args) < 5):
+            print("** coordinates and radius missing **")
+            return
+
+        try:
+            latitude, longitude = float(args[1]), float(args[2])
+            radius = None if args[3] == "*" else float(args[3])
+            count = int(args[4]) if len(args) > 4 else None
+            values = [latitude, longitude, radius or 0]
+            if not all(math.isfinite(value) for value in values):
+                raise ValueError("coordinates and radius must be finite")
+            if (radius or 0) < 0 or (count or 0) < 0:
+                raise ValueError("radius and count cannot be negative")
+        except ValueError:
+            print("** invalid value type **")
+            return
+
+        if not storage.spatial_indexes.get(class_name):
+            print("** class has no spatial index **")
+            return
+        try:
+            matches = storage.nearby(class_name, latitude, longitude,
+                                     radius, count)
+        except ValueError:
+            print("** invalid value type **")
+            return
+        print([f"({km:.3f} km) {obj}" for km, obj in matches])
+
+    def do_search(self, line):
+        """Prints the instances of a class whose text holds the given
+        words, best match first
+
+            Ex: search Review fast wifi
+        """
+        args = line.split(maxsplit=1)
+
+        if not args:
+            print("** class name missing **")
+            return
+
+        class_name = args[0]
+        if class_name not in self.class_list:
+            print("** class doesn't exist **")
+            return
+
+        if len(args) < 2:
+            print("** search text missing **")
+            return
+
+        self._print_search(class_name, args[1])
+
+    def _print_search(self, class_name, text, count=None):
+        """Prints the search results of text in class_name"""
+        try:
+            matches = storage.search(class_name, text, count)
+        except ValueError:
+            print("** class has no text index **")
+            return
+        print([str(obj) for score, obj in matches])
+
+    def do_stats(self, line):
+        """Prints the count of instances of a class and the sum, min,
+        max and average of an attribute, optionally per value of another
+
+            Ex: stats Place price_by_night by city_id
+            Ex: stats Review by place_id
+        """
         args = line.split()
 
         if not args:
@@ -217,14 +425,31 @@ class HBNBCommand(cmd.Cmd):
             print("** class doesn't exist **")
             return
 
-        all_objs = storage.all()
-        num_of_instances = 0
+        args = args[1:]
+        group = None
+        if len(args) >= 2 and args[-2] == "by":
+            group = args[-1]
+            args = args[:-2]
+        if len(args) > 1 or "by" in args:
+            print("** invalid stats format **")
+            return
+
+        print(storage.stats(class_name, args[0] if args else None, group))
 
-        for obj in all_objs.values():
-            if type(obj).__name__ == class_name:
-                num_of_instances += 1
+    def do_count(self, line):
+        """Retrieve the number of instances of a class"""
+        args = line.split()
+
+        if not args:
+            print("** class name missing **")
+            return
+
+        class_name = args[0]
+        if class_name not in self.class_list:
+            print("** class doesn't exist **")
+            return
 
-        print(num_of_instances)
+        print(storage.count(class_name))
 
     def default(self, line):
         """
@@ -235,6 +460,11 @@ class HBNBCommand(cmd.Cmd):
             <class name>.show(<id>)
             <class name>.destroy(<id>)
             <class name>.update(<id>, <attribute>, <value>)
+            <class name>.where(<attribute>=<value>, ...)
+            <class name>.where(<attribute> < <value>, ...).order_by(...)
+            <class name>.near(<latitude>, <longitude>, <radius>[, <count>])
+            <class name>.search(<text>[, <count>])
+            <class name>.stats([<attribute>][, by=<attribute>])
         """
         if "." not in line or "(" not in line or ")" not in line:
             print(f"** Unknown command: {line} **")
@@ -262,12 +492,41 @@ class HBNBCommand(cmd.Cmd):
             self.do_destroy(f"{class_name} {args}")
         elif command == "update":
             self._handle_update(class_name, args)
+        elif command == "near":
+            self.do_near(f"{class_name} {args.replace(',', ' ')}")
+        elif command == "search":
+            self._handle_search(class_name, args)
+        elif command == "stats":
+            self._handle_stats(class_name, args)
+        elif command == "where":
+            self._handle_where(class_name, rest)
         else:
             print(f"** Unknown command: {line} **")
 
+    def _read_only(self):
+        """Prints an error and returns True when the storage cannot be
+        changed, so that commands refuse before changing anything"""
+        if getattr(storage, "read_only", False):
+            print("** storage is read-only **")
+            return (True)
+        return (False)
+
+    def _coerce(self, obj, attributes):
+        """
+        Returns the dictionary attributes with each value converted to
+        the type of the attribute in the Schema of obj, or of its current
+        value for an attribute the class does not declare.
+        Raises ValueError when a value cannot be converted.
+        """
+        schema = Schema.of(type(obj))
+        return ({name: schema.coerce(name, value,
+                                     None if name in schema.types
+                                     else getattr(obj, name, None))
+                 for name, value in attributes.items()})
+
     def _handle_update(self, class_name, args):
         """
-        Handle update commands.
+        Handle update commands, converting the values like update does.
         Examples:
             <class name>.update(<id>, <attribute name>, <attribute value>)
             <class name>.update(<id>, <dictionary of attributes>)
@@ -278,22 +537,34 @@ class HBNBCommand(cmd.Cmd):
             return
 
         instance_id = parts[0].strip("\"'")
-        key = f"{class_name}.{instance_id}"
-        instance = storage.all().get(key)
+        instance = storage.get(class_name, instance_id)
 
         if not instance:
             print("** no instance found **")
             return
 
+        if self._read_only():
+            return
+
         if "{" in parts[1] and "}" in parts[1]:
             try:
                 attributes = ast.literal_eval(parts[1])
                 if not isinstance(attributes, dict):
-                    pass
+                    raise ValueError("not a dictionary")
             except (SyntaxError, ValueError):
                 print("** invalid dictionary format **")
                 return
 
+            if set(attributes) & set(self.protected):
+                print("** attribute cannot be updated **")
+                return
+
+            try:
+                attributes = self._coerce(instance, attributes)
+            except ValueError:
+                print("** invalid value type **")
+                return
+
             for attr, value in attributes.items():
                 setattr(instance, attr, value)
             instance.save()
@@ -305,9 +576,134 @@ class HBNBCommand(cmd.Cmd):
 
             attr_name = attr_parts[0].strip("\"'")
             attr_value = attr_parts[1].strip("\"'")
-            setattr(instance, attr_name, attr_value)
+            if attr_name in self.protected:
+                print("** attribute cannot be updated **")
+                return
+
+            try:
+                attr_value = self._coerce(instance, {attr_name: attr_value})
+            except ValueError:
+                print("** invalid value type **")
+                return
+            setattr(instance, attr_name, attr_value[attr_name])
             instance.save()
 
+    def _handle_search(self, class_name, args):
+        """
+        Handle search commands, printing at most count matches if given.
+        Example:
+            <class name>.search("fast wifi", 10)
+        """
+        try:
+            values = ast.literal_eval(f"({args},)")
+        except (SyntaxError, ValueError):
+            values = ()
+        if not values or not isinstance(values[0], str) or \
+                len(values) > 2 or \
+                (len(values) == 2 and not isinstance(values[1], int)):
+            print("** invalid search format **")
+            return
+        self._print_search(class_name, *values)
+
+    def _handle_stats(self, class_name, args):
+        """
+        Handle stats commands, grouping on the by attribute if given.
+        Examples:
+            <class name>.stats("price_by_night", by="city_id")
+            <class name>.stats(by="place_id")
+        """
+        try:
+            call = ast.parse(f"stats({args})", mode="eval").body
+            values = [ast.literal_eval(arg) for arg in call.args]
+            options = {keyword.arg: ast.literal_eval(keyword.value)
+                       for keyword in call.keywords}
+        except (SyntaxError, ValueError, AttributeError):
+            values, options = None, None
+        if values is None or len(values) > 1 or set(options) - {"by"} or \
+                not all(isinstance(value, str)
+                        for value in values + list(options.values())):
+            print("** invalid stats format **")
+            return
+        self.do_stats(" ".join([class_name] + values +
+                               (["by", options["by"]] if options else [])))
+
+    def _handle_where(self, class_name, line):
+        """
+        Handle where commands, printing the instances meeting every
+        condition, optionally ordered, limited and projected on fields.
+        Conditions compare an attribute with ==, !=, <, <=, >, >= or =.
+        Examples:
+            <class name>.where(place_id="1234-1234-1234")
+            Place.where(price_by_night<100, max_guest>=4)
+                .order_by("-price_by_night").limit(20).select("name")
+        """
+        try:
+            query = self._parse_query(class_name, line)
+        except (SyntaxError, ValueError, TypeError):
+            print("** invalid filter format **")
+            return
+
+        try:
+            print([str(obj) if query.fields is None else obj
+                   for obj in storage.query(query)])
+        except TypeError:
+            print("** values cannot be ordered **")
+
+    def _parse_query(self, class_name, line):
+        """
+        Returns the Query described by a where(...) call chained with
+        order_by(...), limit(...) and select(...) calls.
+        Raises SyntaxError, ValueError or TypeError when it is malformed.
+        """
+        calls = []
+        node = ast.parse(line, mode="eval").body
+        while isinstance(node, ast.Call) and \
+                isinstance(node.func, ast.Attribute):
+            calls.append(node)
+            node = node.func.value
+        if not isinstance(node, ast.Call) or \
+                not isinstance(node.func, ast.Name) or \
+                node.func.id != "where":
+            raise ValueError("a query starts with where()")
+        calls.append(node)
+
+        operators = {ast.Eq: "==", ast.NotEq: "!=", ast.Lt: "<",
+                     ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">="}
+        query = Query(class_name)
+        for call in reversed(calls):
+            name = getattr(call.func, "attr", "where")
+            if name == "where":
+                for condition in call.args:
+                    if not isinstance(condition, ast.Compare) or \
+                            len(condition.ops) != 1 or \
+                            not isinstance(condition.left, ast.Name):
+                        raise ValueError("invalid condition")
+                    op = operators.get(type(condition.ops[0]))
+                    if op is None:
+                        raise ValueError("invalid operator")
+                    value = ast.literal_eval(condition.comparators[0])
+                    query.where((condition.left.id, op, value))
+                for keyword in call.keywords:
+                    if keyword.arg is None:
+                        raise ValueError("invalid condition")
+                    query.where(**{keyword.arg:
+                                   ast.literal_eval(keyword.value)})
+            elif name in ("order_by", "select") and not call.keywords:
+                names = [arg.id if isinstance(arg, ast.Name)
+                         else ast.literal_eval(arg) for arg in call.args]
+                if not all(isinstance(arg, str) for arg in names):
+                    raise ValueError("attribute names are expected")
+                getattr(query, name)(*names)
+            elif name == "limit" and len(call.args) == 1 and \
+                    not call.keywords:
+                count = ast.literal_eval(call.args[0])
+                if not isinstance(count, int):
+                    raise ValueError("limit takes an integer")
+                query.limit(count)
+            else:
+                raise ValueError(f"unknown query method: {name}")
+        return (query)
+
 
 if __name__ == '__main__':
     HBNBCommand().cmdloop()
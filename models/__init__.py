@@ -1,10 +1,45 @@
 #!/usr/bin/python3
 """
 Python package initializer.
-Creates a unique FileStorage instance for the application.
+Creates a unique storage instance for the application.
+HBNB_TYPE_STORAGE=db selects the SQLite DBStorage instead of FileStorage.
+For FileStorage, HBNB_FILE_JOURNAL=1 makes it append changes to a journal
+and HBNB_LAZY_RELOAD=1 defers building the stored objects until first use.
+HBNB_FSYNC=always|group syncs saves to disk, for group at most every
+HBNB_FSYNC_INTERVAL milliseconds. HBNB_ASYNC_SAVE=1 writes saves from a
+background thread every HBNB_FLUSH_INTERVAL milliseconds.
+HBNB_SHARED_FILE=1 lets several processes use the same file safely.
+HBNB_SERIALIZER=json|orjson|pickle selects the format of the file.
+HBNB_SHARDED=1 keeps each class in its own file, split by the first
+HBNB_SHARD_PREFIX characters of the ids when that is set.
+HBNB_OFFSET_INDEX=1 writes the offset index read by HBNB_READ_ONLY=1
+processes, which map the file in memory and cannot save.
+HBNB_TEXT_INDEX_FILE=1 saves the full-text indexes next to the file, so
+lazy and read-only processes do not rebuild them.
+HBNB_ON_DELETE sets what models.integrity.destroy() does to the instances
+referring to the destroyed one, e.g. "City.state=cascade,Place.user=restrict";
+by default they are left as they are.
 """
-from models.engine.file_storage import FileStorage
+from os import getenv
 
 
-storage = FileStorage()
+if getenv("HBNB_TYPE_STORAGE") == "db":
+    from models.engine.db_storage import DBStorage
+    storage = DBStorage()
+else:
+    from models.engine.file_storage import FileStorage
+    storage = FileStorage()
+    storage.journal = getenv("HBNB_FILE_JOURNAL") == "1"
+    storage.lazy = getenv("HBNB_LAZY_RELOAD") == "1"
+    storage.fsync = getenv("HBNB_FSYNC", "none")
+    storage.fsync_interval = int(getenv("HBNB_FSYNC_INTERVAL", "50"))
+    storage.async_save = getenv("HBNB_ASYNC_SAVE") == "1"
+    storage.flush_interval = int(getenv("HBNB_FLUSH_INTERVAL", "100"))
+    storage.shared = getenv("HBNB_SHARED_FILE") == "1"
+    storage.serializer = getenv("HBNB_SERIALIZER", "json")
+    storage.sharded = getenv("HBNB_SHARDED") == "1"
+    storage.shard_prefix = int(getenv("HBNB_SHARD_PREFIX", "0"))
+    storage.offset_index = getenv("HBNB_OFFSET_INDEX") == "1"
+    storage.read_only = getenv("HBNB_READ_ONLY") == "1"
+    storage.text_index_file = getenv("HBNB_TEXT_INDEX_FILE") == "1"
 storage.reload()
@@ -3,9 +3,10 @@
 Module amenity
 This module defines the Amenity class that inherits from BaseModel class
 """
-from models.base_model import BaseModel
+from models.base_model import BaseModel, compact
 
 
+@compact
 class Amenity(BaseModel):
     """Represents an amenity in the application projet.
 
@@ -4,46 +4,183 @@ Module base_model
 This module defines the parent class BaseModel
 """
 from datetime import datetime
+from os import getenv
 from uuid import uuid4
-# from models import storage
+import models
+from models.schema import Schema
 
 
 class BaseModel():
     """This defines all common attributes and methods of other classes"""
 
+    __generated = frozenset(("__class__", "id", "created_at", "updated_at"))
+
     def __init__(self, *args, **kwargs):
-        """Initializes instance attributes"""
-        curr_date = datetime.now()
-        self.id = str(uuid4())
-        self.created_at = curr_date
-        self.updated_at = curr_date
-
-        if kwargs:
-            for key, value in kwargs.items():
-                if key != "__class__":
-                    if key in ['created_at', 'updated_at']:
-                        if isinstance(value, str):
-                            value = datetime.fromisoformat(value)
-                    setattr(self, key, value)
-        else:
+        """Initializes instance attributes
+
+        With kwargs, only the id and timestamps missing from them are
+        generated, and when created_at and updated_at are equal, as for
+        objects never saved again, they are parsed once and shared.
+        The other values are converted to the types of the class
+        Schema, or kept as they are when they cannot be.
+        """
+        store = self._store
+        if not kwargs:
+            curr_date = datetime.now()
+            store("id", str(uuid4()))
+            store("created_at", curr_date)
+            store("updated_at", curr_date)
             from models import storage
             storage.new(self)
+            return
+
+        curr_date = None
+        if "created_at" not in kwargs or "updated_at" not in kwargs:
+            curr_date = datetime.now()
+        created_at = kwargs.get("created_at", curr_date)
+        updated_at = kwargs.get("updated_at", curr_date)
+        shared = updated_at == created_at
+        created_at = self.__timestamp(created_at)
+        updated_at = created_at if shared else self.__timestamp(updated_at)
+        store("id", kwargs["id"] if "id" in kwargs else str(uuid4()))
+        store("created_at", created_at)
+        store("updated_at", updated_at)
+        schema = Schema.of(type(self))
+        types = schema.types
+        for key, value in kwargs.items():
+            if key not in self.__generated:
+                kind = types.get(key)
+                if kind is not None and type(value) is not kind:
+                    value = schema.load(key, value)
+                store(key, value)
+
+    def __setattr__(self, name, value):
+        """Sets an attribute and reports the change to storage"""
+        self._store(name, value)
+        models.storage.touch(self, name)
 
     def __str__(self):
         """Returns a string representation of Square"""
         class_name = self.__class__.__name__
-        return (f"[{class_name}] ({self.id}) {self.__dict__}")
+        return (f"[{class_name}] ({self.id}) {self._attributes()}")
 
     def save(self):
         """Updates updated_at with the current datetime"""
         self.updated_at = datetime.now()
         from models import storage
+        storage.new(self)
         storage.save()
 
     def to_dict(self):
         """Returns a dictionary containing all keys/values of the instance"""
-        instance_dict = self.__dict__.copy()
+        instance_dict = self._attributes().copy()
         instance_dict["__class__"] = self.__class__.__name__
-        instance_dict["created_at"] = self.created_at.isoformat()
-        instance_dict["updated_at"] = self.updated_at.isoformat()
+        created_at = self.created_at.isoformat()
+        instance_dict["created_at"] = created_at
+        if self.updated_at is self.created_at:
+            instance_dict["updated_at"] = created_at
+        else:
+            instance_dict["updated_at"] = self.updated_at.isoformat()
         return (instance_dict)
+
+    def _store(self, name, value):
+        """Stores an attribute without reporting it to storage"""
+        object.__setattr__(self, name, value)
+
+    def _attributes(self):
+        """Returns the instance attributes in the order they were set"""
+        return (self.__dict__)
+
+    @staticmethod
+    def __timestamp(value):
+        """Returns value as a datetime, parsing it if it is a string"""
+        if isinstance(value, str):
+            return (datetime.fromisoformat(value))
+        return (value)
+
+
+def compact(cls):
+    """Class decorator keeping the attributes of cls in slots
+
+    Unless HBNB_COMPACT_MODELS=1, cls is returned unchanged. Otherwise a
+    subclass with the same name is returned that stores id, created_at,
+    updated_at and every str, int, float or list class attribute in
+    __slots__, and any other attribute in an _extra dictionary created
+    on first use, so instances never fill a __dict__. Reading an unset
+    slot returns the class default; a list default is copied into the
+    instance first so it is no longer shared between instances. The
+    names are listed in an _order slot as they are first set, so that
+    __dict__, to_dict() and __str__ show the attributes in the same
+    order as the regular class.
+    """
+    if getenv("HBNB_COMPACT_MODELS") != "1" or "__slots__" in vars(cls):
+        return (cls)
+
+    fields = ["id", "created_at", "updated_at"]
+    for name, value in vars(cls).items():
+        if not name.startswith("_") and \
+                isinstance(value, (str, int, float, list)):
+            fields.append(name)
+    slots = frozenset(fields)
+
+    def _store(self, name, value):
+        """Stores a schema attribute in its slot, others in _extra, and
+        records the order the names are first set in"""
+        try:
+            order = object.__getattribute__(self, "_order")
+        except AttributeError:
+            order = []
+            object.__setattr__(self, "_order", order)
+        if name not in order:
+            order.append(name)
+        if name in slots:
+            object.__setattr__(self, name, value)
+            return
+        try:
+            extra = object.__getattribute__(self, "_extra")
+        except AttributeError:
+            extra = {}
+            object.__setattr__(self, "_extra", extra)
+        extra[name] = value
+
+    def _attributes(self):
+        """Returns the attributes kept in the slots and in _extra, in
+        the order they were set"""
+        try:
+            order = object.__getattribute__(self, "_order")
+        except AttributeError:
+            return ({})
+        attributes = {}
+        for name in order:
+            try:
+                if name in slots:
+                    attributes[name] = object.__getattribute__(self, name)
+                else:
+                    attributes[name] = \
+                        object.__getattribute__(self, "_extra")[name]
+            except (AttributeError, KeyError):
+                pass
+        return (attributes)
+
+    def __getattr__(self, name):
+        """Returns an _extra attribute or the default of an unset slot"""
+        try:
+            return (object.__getattribute__(self, "_extra")[name])
+        except (AttributeError, KeyError):
+            pass
+        if name not in slots:
+            raise AttributeError(
+                    f"'{cls.__name__}' object has no attribute '{name}'")
+        value = getattr(cls, name)
+        if isinstance(value, list):
+            value = list(value)
+            _store(self, name, value)
+        return (value)
+
+    return (type(cls.__name__, (cls,), {
+            "__slots__": tuple(fields) + ("_extra", "_order"),
+            "_store": _store, "_attributes": _attributes,
+            "__dict__": property(_attributes), "__getattr__": __getattr__,
+            "__module__": cls.__module__, "__qualname__": cls.__qualname__,
+            "__doc__": cls.__doc__
+            }))
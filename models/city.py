@@ -3,15 +3,23 @@
 Module city
 This module defines the City class that inherits from BaseModel class
 """
-from models.base_model import BaseModel
+from models.base_model import BaseModel, compact
+from models.relationship import BelongsTo, HasMany, Through
 
 
+@compact
 class City(BaseModel):
     """Represents city classification within application.
 
         Attributes:
             state_id (str): The unique identifier of the State instance.
             name (str): The name of the city.
+            state (State): The State instance, or None.
+            places (list): The places in the city.
+            reviews (list): The reviews of the places in the city.
     """
     state_id = ""
     name = ""
+    state = BelongsTo("State", "state_id")
+    places = HasMany("Place", "city_id")
+    reviews = Through("places", "reviews")
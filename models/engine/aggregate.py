@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+"""
+Module aggregate
+This module defines the class Aggregate used by FileStorage to keep
+statistics of an attribute up to date as objects change
+"""
+import bisect
+from models.engine.index import RangeIndex
+
+
+class Aggregate():
+    """Count, sum, min, max and average of one attribute per group
+
+    The objects are grouped on the value of the group attribute, or all
+    in the group None when there is none. Each group keeps its number
+    of objects and, when an attribute is given, the sum and the sorted
+    list of its numeric values, so adding, moving or removing an object
+    only updates its own group and the minimum and maximum are the ends
+    of the list. Values that are not numbers are counted but left out
+    of the other statistics, like objects whose group is unhashable.
+
+    Attributes:
+        group (str): The name of the attribute the objects are grouped
+            on, or None.
+        attribute (str): The name of the summarized attribute, or None
+            to only count the objects.
+    """
+
+    def __init__(self, group=None, attribute=None):
+        """Initializes the empty statistics of attribute per group"""
+        self.group = group
+        self.attribute = attribute
+        self.attributes = tuple(name for name in (group, attribute) if name)
+        self.__groups = {}
+        self.__entries = {}
+
+    def add(self, key, obj):
+        """Counts obj in the group of its current values, moving it if
+        they changed"""
+        group = getattr(obj, self.group, None) if self.group else None
+        try:
+            hash(group)
+        except TypeError:
+            self.remove(key)
+            return
+        value = None
+        if self.attribute:
+            value = getattr(obj, self.attribute, None)
+            if not RangeIndex.indexable(value):
+                value = None
+        entry = (group, value)
+        if key in self.__entries:
+            if self.__entries[key] == entry:
+                return
+            self.remove(key)
+        self.__entries[key] = entry
+        stats = self.__groups.setdefault(group, [0, 0, []])
+        stats[0] += 1
+        if value is not None:
+            stats[1] += value
+            bisect.insort(stats[2], value)
+
+    def remove(self, key):
+        """Removes the object stored under key from the statistics"""
+        entry = self.__entries.pop(key, None)
+        if entry is None:
+            return
+        group, value = entry
+        stats = self.__groups[group]
+        stats[0] -= 1
+        if not stats[0]:
+            del self.__groups[group]
+            return
+        if value is not None:
+            values = stats[2]
+            del values[bisect.bisect_left(values, value)]
+            stats[1] = stats[1] - value if values else 0
+
+    def stats(self):
+        """Returns a dictionary group -> statistics, each a dictionary
+        with the count of objects and, when there is an attribute, the
+        sum, min, max and avg of its values, None without values"""
+        results = {}
+        for group, (count, total, values) in self.__groups.items():
+            results[group] = {"count": count}
+            if self.attribute:
+                results[group].update(
+                        sum=total if values else None,
+                        min=values[0] if values else None,
+                        max=values[-1] if values else None,
+                        avg=total / len(values) if values else None)
+        return (results)
+
+    def __len__(self):
+        """Returns the number of counted objects"""
+        return (len(self.__entries))
@@ -0,0 +1,458 @@
+#!/usr/bin/python3
+"""
+Module db_storage
+This module defines the class DBStorage
+"""
+import json
+import sqlite3
+from contextlib import contextmanager
+from os import getenv
+from models.base_model import BaseModel
+from models.user import User
+from models.state import State
+from models.city import City
+from models.amenity import Amenity
+from models.place import Place
+from models.review import Review
+from models.engine.aggregate import Aggregate
+from models.engine.geo import bounds, distance, nearest, valid
+from models.engine.text import TextIndex
+
+
+class DBStorage():
+    """Stores instances in a local SQLite database
+
+    Every class of class_map has its own table with id, created_at,
+    updated_at and one column per str, int or float class attribute;
+    any other attribute is kept as JSON in the extra column. Objects are
+    read on demand and kept in an identity map so that the same row is
+    always the same instance. Changes are written when storage is
+    queried and committed by save(), one transaction per save, or by
+    the outermost commit() after begin() or at the end of batch().
+    """
+    class_map = {
+            "BaseModel": BaseModel, "User": User, "State": State,
+            "City": City, "Amenity": Amenity, "Place": Place,
+            "Review": Review
+            }
+    indexes = {
+            "City": ["state_id"], "Place": ["city_id", "user_id"],
+            "Review": ["place_id", "user_id"]
+            }
+    range_indexes = {
+            "Place": ["price_by_night", "number_rooms", "max_guest",
+                      "latitude", "longitude"]
+            }
+    spatial_indexes = {"Place": [("latitude", "longitude")]}
+    text_indexes = {
+            "Place": [("name", "description")], "Review": [("text",)]
+            }
+    __sql_types = {str: "TEXT", int: "INTEGER", float: "REAL"}
+
+    def __init__(self, path=None):
+        """Initializes the storage for the database file at path
+
+        The path defaults to HBNB_SQLITE_PATH, then to hbnb.db.
+        """
+        self.__path = path or getenv("HBNB_SQLITE_PATH", "hbnb.db")
+        self.__connection = None
+        self.__batch_depth = 0
+        self.__objects = {}
+        self.__changes = {}
+        self.__dirty = {}
+        self.__revisions = {}
+        self.__columns = {}
+        for class_name, cls in self.class_map.items():
+            self.__columns[class_name] = self.__schema(cls)
+
+    def all(self, cls=None):
+        """Returns a dictionary key -> obj of every object, or of cls"""
+        class_names = self.class_map if cls is None else \
+            [self.__class_name(cls)]
+        objects = {}
+        for class_name in class_names:
+            objects.update(self.__select(class_name))
+        return (objects)
+
+    def count(self, cls=None):
+        """Returns the number of objects, or of objects of cls"""
+        class_names = self.class_map if cls is None else \
+            [self.__class_name(cls)]
+        self.__write_changes()
+        count = 0
+        for class_name in class_names:
+            if class_name in self.class_map:
+                row = self.__connection.execute(
+                        f'SELECT COUNT(*) FROM "{class_name}"').fetchone()
+                count += row[0]
+        return (count)
+
+    def get(self, cls, id):
+        """Returns the object of cls with the given id, or None"""
+        class_name = self.__class_name(cls)
+        obj = self.__objects.get(f"{class_name}.{id}")
+        if obj is None:
+            objects = self.__select(class_name, id=id)
+            obj = next(iter(objects.values()), None)
+        return (obj)
+
+    def find(self, cls, **attributes):
+        """Returns a dictionary key -> obj of the cls objects matching
+        every attribute=value pair
+
+        Attributes with a column are matched in SQL when their value is
+        a str, int or float, the others on the rows it returns.
+        """
+        class_name = self.__class_name(cls)
+        columns = self.__columns.get(class_name, {})
+        in_sql = {name: value for name, value in attributes.items()
+                  if name in columns and self.__bindable(value)}
+        return ({key: obj for key, obj in
+                 self.__select(class_name, **in_sql).items()
+                 if all(getattr(obj, name, None) == value
+                        for name, value in attributes.items())})
+
+    def query(self, query):
+        """Returns an iterator over the objects matching query, a Query
+
+        Equality conditions on columns with a str, int or float value,
+        and comparisons of numeric columns with numbers, are matched in
+        SQL, and the whole query is then run on the rows it returns.
+        """
+        columns = self.__columns.get(query.class_name, {})
+        in_sql = []
+        for name, op, value in query.conditions:
+            if op == "==" and name in columns and self.__bindable(value):
+                in_sql.append((name, "=", value))
+            elif op in ("<", "<=", ">", ">=") and \
+                    columns.get(name) in ("INTEGER", "REAL") and \
+                    isinstance(value, (int, float)):
+                in_sql.append((name, op, value))
+        objects = self.__select(query.class_name, in_sql)
+        return (query.run(objects.values()))
+
+    def nearby(self, cls, latitude, longitude, radius=None, count=None):
+        """Returns the (distance, obj) of the objects of cls within
+        radius kilometers of a point, or its count nearest objects, or
+        the count nearest within radius, nearest first
+
+        The rows in the bounding box of the circle are selected through
+        the indexes of the coordinates, then checked one by one. Raises
+        ValueError when cls has no spatial index, neither radius nor
+        count is given, or one of them is negative.
+        """
+        class_name = self.__class_name(cls)
+        if radius is None and count is None:
+            raise ValueError("radius or count is required")
+        if (radius is not None and radius < 0) or \
+                (count is not None and count < 0):
+            raise ValueError("radius and count cannot be negative")
+        if not self.spatial_indexes.get(class_name):
+            raise ValueError(f"{class_name} has no spatial index")
+        lat_name, lon_name = self.spatial_indexes[class_name][0]
+
+        def within(latitude, longitude, radius):
+            """Returns the sorted (distance, key, obj) within radius"""
+            south, north, west, east = bounds(latitude, longitude, radius)
+            conditions = [(lat_name, ">=", south), (lat_name, "<=", north)]
+            if west <= east:
+                conditions += [(lon_name, ">=", west), (lon_name, "<=", east)]
+            matches = []
+            for key, obj in self.__select(class_name, conditions).items():
+                point = (getattr(obj, lat_name, None),
+                         getattr(obj, lon_name, None))
+                if valid(*point):
+                    km = distance(latitude, longitude, *point)
+                    if km <= radius:
+                        matches.append((km, key, obj))
+            matches.sort(key=lambda match: (match[0], match[1]))
+            return (matches)
+
+        if count is None:
+            matches = within(latitude, longitude, radius)
+        else:
+            matches = nearest(within, latitude, longitude, count, radius)
+        return ([(km, obj) for km, key, obj in matches])
+
+    def search(self, cls, text, count=None):
+        """Returns the (score, obj) of the objects of cls whose indexed
+        text holds words of text, best first, at most count if given
+
+        The rows are read and ranked like FileStorage does, without a
+        persistent index. Raises ValueError when cls has no text index.
+        """
+        class_name = self.__class_name(cls)
+        if not self.text_indexes.get(class_name):
+            raise ValueError(f"{class_name} has no text index")
+        index = TextIndex(*self.text_indexes[class_name][0])
+        objects = self.__select(class_name)
+        for key, obj in objects.items():
+            index.add(key, obj)
+        return ([(score, objects[key])
+                 for score, key in index.search(text, count)])
+
+    def stats(self, cls, attribute=None, group=None):
+        """Returns a dictionary group value -> statistics of attribute
+        for the objects of cls, all in the group None without a group
+
+        Each statistics dictionary holds the count of objects and, when
+        attribute is given, the sum, min, max and avg of its numeric
+        values. Columns are aggregated by SQL, leaving out the values
+        that are not numbers like FileStorage does; attributes kept in
+        the extra column are summarized on the rows.
+        """
+        class_name = self.__class_name(cls)
+        columns = self.__columns.get(class_name, {})
+        if class_name not in self.class_map or \
+                (group is not None and group not in columns) or \
+                (attribute is not None and
+                 columns.get(attribute) not in ("INTEGER", "REAL")):
+            aggregate = Aggregate(group, attribute)
+            for key, obj in self.__select(class_name).items():
+                aggregate.add(key, obj)
+            return (aggregate.stats())
+        self.__write_changes()
+        names = [f'"{group}"' if group else "NULL", "COUNT(*)"]
+        if attribute:
+            column = f'"{attribute}"'
+            value = (f"CASE WHEN typeof({column}) IN ('integer', 'real') "
+                     f"THEN {column} END")
+            names += [f'{function}({value})'
+                      for function in ("SUM", "MIN", "MAX", "AVG")]
+        rows = self.__connection.execute(
+                f'SELECT {", ".join(names)} FROM "{class_name}"'
+                f'{f" GROUP BY {names[0]}" if group else ""}')
+        results = {}
+        for row in rows:
+            if not row[1]:
+                continue
+            results[row[0]] = {"count": row[1]}
+            if attribute:
+                results[row[0]].update(sum=row[2], min=row[3], max=row[4],
+                                       avg=row[5])
+        return (results)
+
+    def revision(self, cls, attribute=None):
+        """Returns a number that changes whenever an object of cls is
+        added or deleted, or its attribute changed if given, or the
+        loaded objects are forgotten"""
+        class_name = self.__class_name(cls)
+        revisions = self.__revisions
+        return (revisions.get(None, 0) + revisions.get(class_name, 0) +
+                (revisions.get((class_name, attribute), 0)
+                 if attribute else 0))
+
+    def create_index(self, cls, attribute):
+        """Creates an SQL index on the column of attribute for cls"""
+        class_name = self.__class_name(cls)
+        if attribute in self.__columns.get(class_name, {}):
+            self.__connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS "{class_name}_{attribute}" '
+                    f'ON "{class_name}" ("{attribute}")')
+
+    def create_aggregate(self, cls, attribute=None, group=None):
+        """Creates an SQL index on the column of group for cls, so that
+        stats() groups through it; the statistics are computed by SQL"""
+        if group is not None:
+            self.create_index(cls, group)
+
+    def new(self, obj):
+        """Adds obj to the current transaction"""
+        if obj:
+            key = f"{obj.__class__.__name__}.{obj.id}"
+            self.__objects[key] = obj
+            self.__changes[key] = obj
+            self.__revise(obj.__class__.__name__)
+
+    def delete(self, obj=None):
+        """Deletes obj from the current transaction"""
+        if obj:
+            key = f"{obj.__class__.__name__}.{obj.id}"
+            self.__objects.pop(key, None)
+            self.__changes[key] = None
+            self.__revise(obj.__class__.__name__)
+
+    def touch(self, obj, name):
+        """Records that the attribute name of a loaded obj has changed"""
+        key = f"{obj.__class__.__name__}.{obj.id}"
+        if self.__objects.get(key) is obj:
+            self.__changes[key] = obj
+            self.__dirty.setdefault(key, set()).add(name)
+            self.__revise((obj.__class__.__name__, name))
+
+    def dirty(self, obj):
+        """Returns the attribute names of obj changed since the last flush"""
+        key = f"{obj.__class__.__name__}.{obj.id}"
+        return (self.__dirty.get(key, set()))
+
+    def save(self):
+        """Commits all changes of the current transaction"""
+        if self.__batch_depth == 0:
+            self.flush()
+
+    def begin(self):
+        """Defers every save() until the matching commit()"""
+        self.__batch_depth += 1
+
+    def commit(self):
+        """Ends a begin(); the outermost commit commits all the changes"""
+        if self.__batch_depth > 0:
+            self.__batch_depth -= 1
+            if self.__batch_depth == 0:
+                self.flush()
+
+    @contextmanager
+    def batch(self):
+        """Context manager committing the changes of its block at once"""
+        self.begin()
+        try:
+            yield (self)
+        finally:
+            self.commit()
+
+    def flush(self):
+        """Writes the changed rows and commits them"""
+        self.__write_changes()
+        self.__connection.commit()
+        self.__dirty.clear()
+
+    def reload(self, classes=None):
+        """Opens the database, creating the missing tables and indexes
+
+        classes, a list of classes or class names, only forgets their
+        loaded objects, so that their rows are read again on access.
+        """
+        if classes is not None:
+            class_names = {self.__class_name(cls) for cls in classes}
+            for key in [key for key in self.__objects
+                        if key.split(".", 1)[0] in class_names]:
+                del self.__objects[key]
+            for class_name in class_names:
+                self.__revise(class_name)
+            return
+        self.disconnect()
+        self.__connection = sqlite3.connect(self.__path)
+        self.__connection.row_factory = sqlite3.Row
+        for class_name, columns in self.__columns.items():
+            definitions = ", ".join(
+                    f'"{name}" {sql_type}' for name, sql_type in
+                    columns.items())
+            self.__connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{class_name}" '
+                    f'(id TEXT PRIMARY KEY, created_at TEXT, '
+                    f'updated_at TEXT, {definitions}'
+                    f'{", " if definitions else ""}extra TEXT)')
+            for attribute in self.indexes.get(class_name, []) + \
+                    self.range_indexes.get(class_name, []):
+                self.create_index(class_name, attribute)
+        self.__connection.commit()
+
+    def refresh(self):
+        """Forgets the loaded objects without pending changes, so that
+        the rows other processes committed are read again"""
+        for key in [key for key in self.__objects
+                    if key not in self.__changes]:
+            del self.__objects[key]
+        self.__revise(None)
+
+    def close(self):
+        """Commits the changes already sent to the database; like a
+        closed FileStorage, the storage stays usable and unsaved changes
+        are kept"""
+        if self.__connection is not None and \
+                self.__connection.in_transaction:
+            self.__connection.commit()
+
+    def disconnect(self):
+        """Discards uncommitted changes and closes the database until
+        the next reload()"""
+        if self.__connection is not None:
+            self.__connection.close()
+            self.__connection = None
+        self.__objects.clear()
+        self.__changes.clear()
+        self.__dirty.clear()
+        self.__revise(None)
+
+    def __revise(self, name):
+        """Changes the revision of a class name, a (class name,
+        attribute) pair, or with None of every class"""
+        self.__revisions[name] = self.__revisions.get(name, 0) + 1
+
+    def __select(self, class_name, conditions=(), **columns):
+        """Returns the key -> obj of the rows of class_name meeting the
+        (column, SQL operator, value) conditions and matching the
+        column=value pairs, reusing the objects already loaded"""
+        cls = self.class_map.get(class_name)
+        if cls is None:
+            return ({})
+        self.__write_changes()
+        conditions = list(conditions)
+        conditions += [(name, "=", value) for name, value in columns.items()]
+        where = " AND ".join(f'"{name}" {op} ?'
+                             for name, op, value in conditions)
+        rows = self.__connection.execute(
+                f'SELECT * FROM "{class_name}"'
+                f'{" WHERE " + where if where else ""}',
+                [value for name, op, value in conditions])
+
+        objects = {}
+        for row in rows:
+            key = f"{class_name}.{row['id']}"
+            obj = self.__objects.get(key)
+            if obj is None:
+                obj_dict = {name: row[name] for name in row.keys()
+                            if name != "extra" and row[name] is not None}
+                if row["extra"]:
+                    obj_dict.update(json.loads(row["extra"]))
+                obj = self.__objects[key] = cls(**obj_dict)
+            objects[key] = obj
+        return (objects)
+
+    def __write_changes(self):
+        """Sends the pending changes to the current transaction; the
+        columns of attributes still at their class default hold that
+        default, so that SQL filters see the values the objects have"""
+        for key, obj in self.__changes.items():
+            class_name, id = key.split(".", 1)
+            if class_name not in self.class_map:
+                continue
+            if obj is None:
+                self.__connection.execute(
+                        f'DELETE FROM "{class_name}" WHERE id = ?', (id,))
+                continue
+            obj_dict = obj.to_dict()
+            del obj_dict["__class__"]
+            names = ["id", "created_at", "updated_at"]
+            names += list(self.__columns[class_name])
+            values = [obj_dict.pop(name, None) for name in names[:3]]
+            values += [obj_dict.pop(name, getattr(obj, name, None))
+                       for name in names[3:]]
+            names.append("extra")
+            values.append(json.dumps(obj_dict) if obj_dict else None)
+            quoted = ", ".join(f'"{name}"' for name in names)
+            self.__connection.execute(
+                    f'INSERT OR REPLACE INTO "{class_name}" ({quoted}) '
+                    f'VALUES ({", ".join("?" * len(names))})', values)
+        self.__changes.clear()
+
+    @classmethod
+    def __schema(cls, model):
+        """Returns the column -> SQL type of the attributes of model"""
+        columns = {}
+        for klass in reversed(model.__mro__):
+            for name, value in vars(klass).items():
+                sql_type = cls.__sql_types.get(type(value))
+                if sql_type and not name.startswith("_"):
+                    columns[name] = sql_type
+        return (columns)
+
+    @staticmethod
+    def __bindable(value):
+        """Returns True if value can be compared in SQL like in Python"""
+        return (isinstance(value, (str, int, float)))
+
+    @staticmethod
+    def __class_name(cls):
+        """Returns the name of cls, which can be a class or a string"""
+        return (cls if isinstance(cls, str) else cls.__name__)
@@ -5,6 +5,9 @@ This module defines the class FileStorage
 """
 import os
 import json
+import threading
+import warnings
+from contextlib import contextmanager, nullcontext
 from models.base_model import BaseModel
 from models.user import User
 from models.state import State
@@ -12,52 +15,1094 @@ from models.city import City
 from models.amenity import Amenity
 from models.place import Place
 from models.review import Review
+from models.engine.aggregate import Aggregate
+from models.engine.filelock import FileLock
+from models.engine.flusher import Flusher
+from models.engine.journal import Journal
+from models.engine.geo import GeoIndex
+from models.engine.index import HashIndex, IndexSet, RangeIndex
+from models.engine.lazy import LazyIndex
+from models.engine.rwlock import RWLock
+from models.engine.serializer import JSONSerializer, decode_errors, \
+    detect, get_serializer, load_file
+from models.engine.shards import ShardLayout
+from models.engine.sync import SyncPolicy
+from models.engine.text import TextIndex
 
 
 class FileStorage():
-    """Serializes/deserializes instances to a JSON file and vice versa"""
+    """Serializes/deserializes instances to a JSON file and vice versa
+
+    The class attributes select the optional modes (journal, lazy,
+    async_save, shared, sharded, read_only, ...) and the indexes kept
+    per class; the README describes them. Lookups and changes hold a
+    readers-writer lock, so the storage can be shared by threads.
+    """
     __file_path = "file.json"
     __objects = {}
+    __classes = {}
+    __indexes = {}
+    __changes = {}
+    __dirty = {}
+    __cache = {}
+    __journal = None
+    __lazy = None
+    __sync = None
+    __flusher = None
+    __lock = RWLock()
+    __flushing = threading.RLock()
+    __file_lock = None
+    __shards = {}
+    __stale = set()
+    __revisions = {}
+    __serializer = None
+    __generation = None
+    __batches = threading.local()
+    async_save = False
+    flush_interval = 100
+    backup = True
+    fsync = "none"
+    fsync_interval = 50
+    journal = False
+    journal_threshold = 1000
+    lazy = False
+    shared = False
+    serializer = "json"
+    sharded = False
+    shard_prefix = 0
+    offset_index = False
+    read_only = False
+    indexes = {
+            "City": ["state_id"], "Place": ["city_id", "user_id"],
+            "Review": ["place_id", "user_id"]
+            }
+    range_indexes = {
+            "Place": ["price_by_night", "number_rooms", "max_guest",
+                      "latitude", "longitude"]
+            }
+    spatial_indexes = {"Place": [("latitude", "longitude")]}
+    text_indexes = {
+            "Place": [("name", "description")], "Review": [("text",)]
+            }
+    text_index_file = False
+    aggregates = {
+            "Place": [("city_id", "price_by_night")],
+            "Review": [("place_id",)]
+            }
     class_map = {
             "BaseModel": BaseModel, "User": User, "State": State,
             "City": City, "Amenity": Amenity, "Place": Place,
             "Review": Review
             }
 
-    def all(self):
-        """Returns the dictionary __objects"""
-        return (self.__objects)
+    def all(self, cls=None):
+        """Returns a copy of __objects, or only the objects of cls
+
+        cls can be a class or a class name and is looked up in the
+        per-class index, so the cost is proportional to its instances.
+        """
+        if cls is None:
+            self.__fetch()
+            pending = self.__pending()
+            if pending is not None and pending.count():
+                with self.__lock.write():
+                    for key, obj_dict in pending.pop_all().items():
+                        self.__load(key, obj_dict)
+            with self.__lock.read():
+                return (dict(self.__objects))
+        class_name = self.__class_name(cls)
+        self.__prepare(class_name)
+        with self.__lock.read():
+            return (dict(self.__classes.get(class_name, {})))
+
+    def count(self, cls=None):
+        """Returns the number of objects, or of objects of cls"""
+        self.__fetch(None if cls is None else self.__class_name(cls))
+        pending = self.__pending()
+        with self.__lock.read():
+            if cls is None:
+                count = len(self.__objects)
+                if pending is not None:
+                    count += pending.count()
+                return (count)
+            class_name = self.__class_name(cls)
+            count = len(self.__classes.get(class_name, {}))
+            if pending is not None:
+                count += pending.count(class_name)
+            return (count)
+
+    def get(self, cls, id):
+        """Returns the object of cls with the given id, or None"""
+        key = f"{self.__class_name(cls)}.{id}"
+        with self.__lock.read():
+            obj = self.__objects.get(key)
+        if obj is None and FileStorage.__shards:
+            self.__fetch(key=key)
+            with self.__lock.read():
+                obj = self.__objects.get(key)
+        if obj is None and FileStorage.__lazy is not None:
+            pending = self.__pending()
+            with self.__lock.write():
+                obj = self.__objects.get(key)
+                if obj is None:
+                    obj_dict = pending.pop(key)
+                    if obj_dict is not None:
+                        obj = self.__load(key, obj_dict)
+        return (obj)
+
+    def find(self, cls, **attributes):
+        """Returns a dictionary key -> obj of the cls objects matching
+        every attribute=value pair
+
+        The most selective attribute listed in indexes or range_indexes
+        narrows the candidates and the remaining pairs are checked on
+        those only. A single pair on a hash-indexed attribute is
+        answered by the index alone.
+        """
+        class_name = self.__class_name(cls)
+        self.__prepare(class_name)
+        with self.__lock.read():
+            candidates = self.__candidates(
+                    class_name, [(name, "==", value)
+                                 for name, value in attributes.items()])
+            if len(attributes) == 1:
+                name = next(iter(attributes))
+                if isinstance(self.__indexes[class_name].get(name),
+                              HashIndex):
+                    return (candidates)
+            return ({key: obj for key, obj in candidates.items()
+                     if all(getattr(obj, name, None) == value
+                            for name, value in attributes.items())})
+
+    def query(self, query):
+        """Returns an iterator over the objects matching query, a Query
+
+        The candidates are narrowed like in find(), comparisons on the
+        attributes listed in range_indexes by a binary search, and
+        copied under the lock; they are then filtered, ordered and
+        limited lazily.
+        """
+        self.__prepare(query.class_name)
+        with self.__lock.read():
+            candidates = self.__candidates(query.class_name,
+                                           query.conditions)
+            objects = list(candidates.values())
+        return (query.run(objects))
+
+    def nearby(self, cls, latitude, longitude, radius=None, count=None):
+        """Returns the (distance, obj) of the objects of cls within
+        radius kilometers of a point, or its count nearest objects, or
+        the count nearest within radius, nearest first
+
+        The (latitude, longitude) pairs listed in spatial_indexes are
+        kept in a GeoIndex grid. Raises ValueError when cls has no
+        spatial index, neither radius nor count is given, or one of them
+        is negative.
+        """
+        class_name = self.__class_name(cls)
+        if radius is None and count is None:
+            raise ValueError("radius or count is required")
+        if (radius is not None and radius < 0) or \
+                (count is not None and count < 0):
+            raise ValueError("radius and count cannot be negative")
+        self.__prepare(class_name)
+        with self.__lock.read():
+            geo = [index for index in self.__indexes[class_name].composites
+                   if isinstance(index, GeoIndex)]
+            if not geo:
+                raise ValueError(f"{class_name} has no spatial index")
+            if count is None:
+                matches = geo[0].within(latitude, longitude, radius)
+            else:
+                matches = geo[0].nearest(latitude, longitude, count, radius)
+        return ([(km, obj) for km, key, obj in matches])
+
+    def search(self, cls, text, count=None):
+        """Returns the (score, obj) of the objects of cls whose indexed
+        text holds words of text, best first, at most count if given
+
+        The words of the attributes listed in text_indexes are kept in
+        a TextIndex. Pending objects are only built if the text index
+        does not cover them yet. Raises ValueError when cls has no text
+        index.
+        """
+        class_name = self.__class_name(cls)
+        pending = self.__pending()
+        with self.__lock.write():
+            indexes = self.__indexes_of(class_name)
+            index = next((index for index in indexes.composites
+                          if isinstance(index, TextIndex)), None)
+            if index is None:
+                raise ValueError(f"{class_name} has no text index")
+            covered = pending is None or \
+                index.covers(pending.keys(class_name))
+        if not covered:
+            self.__prepare(class_name)
+        with self.__lock.read():
+            matches = index.search(text, count)
+        results = []
+        for score, key in matches:
+            obj = self.get(class_name, key.split(".", 1)[1])
+            if obj is not None:
+                results.append((score, obj))
+        return (results)
+
+    def stats(self, cls, attribute=None, group=None):
+        """Returns a dictionary group value -> statistics of attribute
+        for the objects of cls, all in the group None without a group
+
+        Each statistics dictionary holds the count of objects and, when
+        attribute is given, the sum, min, max and avg of its numeric
+        values. The pairs listed in aggregates or given to
+        create_aggregate() are kept up to date by every change, so they
+        are answered without reading the objects; any other pair is
+        computed by scanning the class.
+        """
+        class_name = self.__class_name(cls)
+        self.__prepare(class_name)
+        with self.__lock.read():
+            aggregate = self.__aggregate(class_name, attribute, group)
+            if aggregate is None:
+                aggregate = Aggregate(group, attribute)
+                for key, obj in self.__classes.get(class_name, {}).items():
+                    aggregate.add(key, obj)
+            return (aggregate.stats())
+
+    def revision(self, cls, attribute=None):
+        """Returns a number that changes whenever an object of cls is
+        registered or removed, or its attribute changed if given, so
+        that results computed from them can be cached"""
+        class_name = self.__class_name(cls)
+        revisions = self.__revisions
+        return (revisions.get(class_name, 0) +
+                (revisions.get((class_name, attribute), 0)
+                 if attribute else 0))
+
+    def create_index(self, cls, attribute, ordered=False):
+        """Starts maintaining a hash index on attribute for cls, or a
+        range index if ordered"""
+        with self.__lock.write():
+            class_name = self.__class_name(cls)
+            indexes = self.__indexes_of(class_name)
+            if attribute not in indexes:
+                index = (RangeIndex if ordered else HashIndex)(attribute)
+                for key, obj in self.__classes.get(class_name, {}).items():
+                    index.add(key, obj)
+                indexes[attribute] = index
+
+    def create_aggregate(self, cls, attribute=None, group=None):
+        """Starts maintaining the statistics of attribute per group for
+        cls, so that stats() answers them without reading the objects"""
+        class_name = self.__class_name(cls)
+        self.__prepare(class_name)
+        with self.__lock.write():
+            if self.__aggregate(class_name, attribute, group) is None:
+                self.__add_composite(class_name, Aggregate(group, attribute))
 
     def new(self, obj):
-        """Sets in __objects the obj with key <obj class name>.id"""
+        """Sets in __objects the obj with key <obj class name>.id;
+        raises RuntimeError in read-only mode"""
         if obj:
+            self.__writable()
             key = f"{obj.__class__.__name__}.{obj.id}"
-            self.__objects[key] = obj
+            with self.__lock.write():
+                if FileStorage.__lazy is not None:
+                    FileStorage.__lazy.discard([key])
+                self.__register(key, obj)
+                self.__changes[key] = obj
+
+    def delete(self, obj=None):
+        """Deletes obj from __objects if it is inside; raises
+        RuntimeError in read-only mode"""
+        if obj:
+            self.__writable()
+            key = f"{obj.__class__.__name__}.{obj.id}"
+            with self.__lock.write():
+                if key in self.__objects:
+                    self.__unregister(key)
+                    self.__changes[key] = None
+
+    def touch(self, obj, name):
+        """Records that the attribute name of a stored obj has changed,
+        so that flush() writes it again; changes made without setattr,
+        e.g. appending to a list, are recorded by obj.save()"""
+        key = f"{obj.__class__.__name__}.{obj.id}"
+        if self.__objects.get(key) is not obj:
+            return
+        with self.__lock.write():
+            if self.__objects.get(key) is obj:
+                self.__changes[key] = obj
+                self.__dirty.setdefault(key, set()).add(name)
+                self.__revise((obj.__class__.__name__, name))
+                indexes = self.__indexes_of(obj.__class__.__name__)
+                index = indexes.get(name)
+                if index is not None:
+                    index.add(key, obj)
+                for index in indexes.watching.get(name, ()):
+                    index.add(key, obj)
+
+    def dirty(self, obj):
+        """Returns the attribute names of obj changed since the last flush"""
+        key = f"{obj.__class__.__name__}.{obj.id}"
+        with self.__lock.read():
+            return (set(self.__dirty.get(key, set())))
 
     def save(self):
-        """Serializes __objects to the JSON file (path: __file_path)"""
-        serializable_objects = {}
+        """Serializes __objects to the JSON file (path: __file_path)
+
+        When async_save is True, save() returns at once and a background
+        Flusher writes the saved changes at most every flush_interval
+        milliseconds.
+        """
+        if self.__batch_depth() == 0:
+            if self.async_save:
+                self.__get_flusher().request()
+            else:
+                self.flush()
+
+    def begin(self):
+        """Defers every save() of the calling thread until the matching
+        commit()"""
+        self.__batches.depth = self.__batch_depth() + 1
+
+    def commit(self):
+        """Ends a begin(); the outermost commit flushes all the changes"""
+        depth = self.__batch_depth()
+        if depth == 0:
+            return
+        self.__batches.depth = depth - 1
+        if depth == 1:
+            self.save()
+
+    def __batch_depth(self):
+        """Returns the number of batches the calling thread has begun"""
+        return (getattr(self.__batches, "depth", 0))
+
+    @contextmanager
+    def batch(self):
+        """Context manager writing the changes of its block in one flush"""
+        self.begin()
+        try:
+            yield (self)
+        finally:
+            self.commit()
+
+    def flush(self):
+        """Writes the changed objects, reusing the cache for the others
+
+        Only copying the state to write holds the storage lock, so
+        readers and writers are not blocked while the file is written.
+        When journal is True, the changed objects are appended to
+        <file>.log, folded into the snapshot in the background past
+        journal_threshold records. Otherwise the snapshot is written to
+        a temporary file renamed over the file, keeping the previous one
+        in <file>.bak if backup, and synced as fsync says: "none",
+        "always" or "group" (within fsync_interval milliseconds). When
+        sharded, only the shards holding a changed object are rewritten
+        (see ShardLayout). offset_index and text_index_file also write
+        <file>.idx and <file>.fts. When shared, the changes of other
+        processes are merged first.
+        """
+        self.__writable()
+        with self.__flushing:
+            journal = self.__get_journal()
+            if not self.journal or self.sharded:
+                journal.wait()
+            with self.__file_locked(exclusive=True):
+                if self.shared:
+                    self.__merge()
+                if self.sharded:
+                    self.__write_shards()
+                elif self.journal:
+                    self.__flush_journal()
+                else:
+                    self.__write_snapshot()
+                    journal.clear()
+                    if self.text_index_file:
+                        self.__save_text_indexes()
+                if self.shared:
+                    FileStorage.__generation = \
+                        self.__get_file_lock().bump()
 
-        for key, obj in self.__objects.items():
-            serializable_objects[key] = obj.to_dict()
+    def reload(self, classes=None):
+        """Deserializes the JSON file to __objects if the JSON file exits
 
-        with open(self.__file_path, 'w', encoding="utf-8") as file:
-            json.dump(serializable_objects, file)
+        classes, a list of classes or class names, limits the objects
+        read again to theirs. When sharded, only their shards are read
+        and the other classes are read on first access.
 
-    def reload(self):
-        """Deserializes the JSON file to __objects if the JSON file exits"""
-        if os.path.exists(self.__file_path):
+        The format is detected from the first byte, whatever serializer
+        says, and the journal is replayed over it. When lazy is True,
+        objects are only built on first access; when read_only is True,
+        the file is mapped in memory and its records found through
+        <file>.idx. A missing or unreadable file falls back to
+        <file>.bak, and an unreadable one is renamed to <file>.corrupt
+        with a RuntimeWarning, unless read_only.
+        """
+        wanted = None
+        if classes is not None:
+            wanted = {self.__class_name(cls) for cls in classes}
+        if FileStorage.__flusher is not None:
+            FileStorage.__flusher.stop()
+        journal = self.__get_journal()
+        journal.wait()
+        with self.__flushing, self.__file_locked(), self.__lock.write():
+            if self.shared:
+                FileStorage.__generation = \
+                    self.__get_file_lock().generation()
+            if FileStorage.__lazy is not None:
+                FileStorage.__lazy.close()
+                FileStorage.__lazy = None
+            FileStorage.__shards = {}
+            if self.sharded:
+                self.__reload_shards(wanted)
+                return
+            if self.lazy or self.read_only:
+                FileStorage.__lazy = LazyIndex(self.__file_path,
+                                               self.read_only)
+                if self.text_index_file:
+                    self.__load_text_indexes()
+                return
+
+            for key, obj_dict in self.__read().items():
+                if wanted is None or key.split(".", 1)[0] in wanted:
+                    self.__load(key, obj_dict)
+
+    def refresh(self):
+        """Merges the changes other processes wrote since the last
+        reload, refresh or flush; does nothing unless shared
+
+        Shared processes hold a FileLock on <file>.lock, whose
+        generation number each write bumps. Objects not changed here
+        are updated like in the file, while unsaved changes win.
+        """
+        if not self.__behind():
+            return
+        with self.__flushing, self.__file_locked():
+            self.__merge()
+
+    def close(self):
+        """Writes the saves still pending in the background, and waits
+        for the running compaction and group commit"""
+        if FileStorage.__flusher is not None:
+            FileStorage.__flusher.stop()
+        with self.__flushing:
+            self.__get_journal().wait()
+            self.__get_sync().wait()
+
+    def __writable(self):
+        """Raises RuntimeError in read-only mode, before any change"""
+        if self.read_only:
+            raise RuntimeError("the storage is read-only")
+
+    def __read(self):
+        """Returns the key -> dictionary records of the snapshot, or of
+        its backup, with the journal replayed over them, or of every
+        shard when sharded"""
+        layout = self.__layout()
+        if self.sharded and os.path.isdir(layout.directory):
+            data = {}
+            for name in layout.existing():
+                data.update(self.__read_shard(layout.path(name)))
+            return (data)
+        data = {}
+        for path in self.__snapshots():
             try:
-                with open(self.__file_path, 'r', encoding="utf-8") as file:
-                    data = json.load(file)
-
-                for key, obj_dict in data.items():
-                    class_name = obj_dict.get("__class__")
-                    if class_name:
-                        cls = self.class_map.get(class_name)
-                        if cls:
-                            obj = cls(**obj_dict)
-                            self.__objects[key] = obj
-
-            except json.JSONDecodeError:
-                pass
+                data = load_file(path, self.serializer)
+                break
+            except decode_errors as error:
+                self.__set_aside(path, error)
+        return (self.__get_journal().replay(data))
+
+    def __behind(self):
+        """Returns True if another process wrote since this one read"""
+        return (self.shared and FileStorage.__generation !=
+                self.__get_file_lock().generation())
+
+    def __merge(self):
+        """Applies what other processes wrote to the objects that were
+        not changed here, once the file lock is held"""
+        generation = self.__get_file_lock().generation()
+        if generation == FileStorage.__generation:
+            return
+        data = self.__read()
+        with self.__lock.write():
+            changes = self.__changes
+            pending = FileStorage.__lazy
+            layout = self.__layout()
+            for key in list(self.__objects):
+                if key not in data and key not in changes:
+                    self.__unregister(key)
+                    self.__cache.pop(key, None)
+            for key, obj_dict in data.items():
+                obj = self.__objects.get(key)
+                if key in changes or (obj is None and pending is not None):
+                    continue
+                if obj is None and layout.name(key) in self.__shards:
+                    continue
+                if obj is None or obj.to_dict() != obj_dict:
+                    self.__cache.pop(key, None)
+                    self.__load(key, obj_dict)
+            if pending is not None:
+                self.__scan()
+            FileStorage.__generation = generation
+
+    def __file_locked(self, exclusive=False):
+        """Returns a context manager holding the file lock when shared"""
+        if not self.shared:
+            return (nullcontext())
+        lock = self.__get_file_lock()
+        return (lock.exclusive() if exclusive else lock.shared())
+
+    def __load(self, key, obj_dict):
+        """Builds the object described by obj_dict and registers it"""
+        cls = self.class_map.get(obj_dict.get("__class__"))
+        if cls:
+            obj = cls(**obj_dict)
+            self.__register(key, obj)
+            return (obj)
+
+    def __load_class(self, class_name):
+        """Builds the pending objects of class_name, if any"""
+        pending = self.__pending()
+        if pending is not None:
+            for key, obj_dict in pending.pop_class(class_name).items():
+                self.__load(key, obj_dict)
+
+    def __prepare(self, class_name):
+        """Builds the pending objects and the indexes of class_name, so
+        that readers of the class never have to change the storage"""
+        self.__fetch(class_name)
+        pending = self.__pending()
+        if class_name in self.__indexes and \
+                (pending is None or not pending.count(class_name)):
+            return
+        with self.__lock.write():
+            self.__load_class(class_name)
+            self.__indexes_of(class_name)
+
+    def __reload_shards(self, wanted):
+        """Reads the shards of the wanted class names, or of every class
+        unless lazy, and leaves the others to __fetch()
+
+        Without shards, the single file is read and every object marked
+        changed so that the next flush splits it. The classes having a
+        shard of another layout are read at once and marked changed, so
+        the next flush rewrites them and removes the old shards.
+        """
+        layout = self.__layout()
+        shards = layout.existing()
+        if not shards:
+            for key, obj_dict in self.__read().items():
+                obj = self.__load(key, obj_dict)
+                if obj is not None:
+                    self.__changes[key] = obj
+            return
+        FileStorage.__shards = {name: class_name for name, class_name
+                                in shards.items()
+                                if class_name in self.class_map}
+        FileStorage.__stale = {name for name in self.__shards
+                               if not layout.conforms(name)}
+        stale_classes = {self.__shards[name] for name in self.__stale}
+        if wanted is None and not self.lazy:
+            wanted = set(self.__shards.values())
+        for class_name in (wanted or set()) | stale_classes:
+            self.__load_shards([name for name, owner in
+                                self.__shards.items()
+                                if owner == class_name])
+        for class_name in stale_classes:
+            for key, obj in self.__classes.get(class_name, {}).items():
+                self.__changes[key] = obj
+
+    def __fetch(self, class_name=None, key=None):
+        """Reads the shards not read yet: the one holding key, those of
+        class_name, or all of them"""
+        if not FileStorage.__shards:
+            return
+        with self.__file_locked(), self.__lock.write():
+            if key is not None:
+                names = [self.__layout().name(key)]
+            else:
+                names = [name for name, owner in self.__shards.items()
+                         if class_name in (None, owner)]
+            self.__load_shards(names)
+
+    def __load_shards(self, names):
+        """Builds the objects of the shards in names that were not read
+        yet, except those stored or changed since, under the lock"""
+        layout = self.__layout()
+        for name in names:
+            if self.__shards.pop(name, None) is None:
+                continue
+            for key, obj_dict in self.__read_shard(layout.path(name)).items():
+                if key not in self.__objects and key not in self.__changes:
+                    self.__load(key, obj_dict)
+
+    def __read_shard(self, path):
+        """Returns the key -> dictionary records of a shard, or of its
+        backup"""
+        paths = [path, f"{path}.bak" if self.backup else None]
+        for path in paths:
+            if path is not None and os.path.exists(path):
+                try:
+                    return (load_file(path, self.serializer))
+                except decode_errors as error:
+                    self.__set_aside(path, error)
+        return ({})
+
+    def __candidates(self, class_name, conditions):
+        """Returns the key -> obj of the class_name objects that can meet
+        the (attribute, operator, value) conditions: those of the most
+        selective index lookup, or every object of the class
+
+        The comparisons of a number with an attribute in a range index
+        are combined into one range per attribute. A range index only
+        holds numbers, so other values are looked for by a scan.
+        """
+        indexes = self.__indexes[class_name]
+        lookups = []
+        bounds = {}
+        for name, op, value in conditions:
+            index = indexes.get(name)
+            if index is None:
+                continue
+            if op == "==":
+                if not isinstance(index, RangeIndex) or \
+                        RangeIndex.indexable(value):
+                    lookups.append((index.find, (value,)))
+            elif isinstance(index, RangeIndex) and op != "!=" and \
+                    RangeIndex.indexable(value):
+                low, high, include_low, include_high = bounds.get(
+                        name, (None, None, True, True))
+                if op in (">", ">=") and (low is None or value >= low):
+                    include_low = op == ">=" and (low != value or
+                                                  include_low)
+                    low = value
+                elif op in ("<", "<=") and (high is None or value <= high):
+                    include_high = op == "<=" and (high != value or
+                                                   include_high)
+                    high = value
+                bounds[name] = (low, high, include_low, include_high)
+        for name, bound in bounds.items():
+            lookups.append((indexes[name].range, bound))
+        candidates = None
+        for lookup, args in lookups:
+            matches = lookup(*args)
+            if candidates is None or len(matches) < len(candidates):
+                candidates = matches
+        if candidates is None:
+            candidates = self.__classes.get(class_name, {})
+        return (candidates)
+
+    def __pending(self):
+        """Returns the LazyIndex of the records not built yet, scanning
+        the file on first use, or None when reload() was not lazy"""
+        pending = FileStorage.__lazy
+        if pending is None or pending.scanned:
+            return (pending)
+        with self.__file_locked(), self.__lock.write():
+            if not FileStorage.__lazy.scanned:
+                self.__scan()
+        return (FileStorage.__lazy)
+
+    def __scan(self):
+        """Replaces the lazy index by a scan of the snapshot, or of its
+        backup, with the journal replayed over it, under both locks"""
+        FileStorage.__lazy.close()
+        pending = FileStorage.__lazy = LazyIndex(self.__file_path,
+                                                 self.read_only)
+        for path in self.__snapshots():
+            pending = FileStorage.__lazy = LazyIndex(path, self.read_only)
+            with open(path, 'rb') as file:
+                binary = detect(file.read(1)).binary
+            offsets_path = None
+            if path == self.__file_path:
+                offsets_path = self.__offsets_path()
+            try:
+                data = load_file(path) if binary else None
+            except decode_errors as error:
+                pending.error = error
+            else:
+                pending.scan(self.class_map, data, offsets_path)
+            if pending.error is None:
+                break
+            pending.close()
+            self.__set_aside(path, pending.error)
+        if not pending.scanned:
+            pending.scan(self.class_map)
+        self.__get_journal().replay(pending)
+        pending.discard(list(self.__objects))
+        pending.discard(list(self.__changes))
+
+    def __write_snapshot(self):
+        """Writes every object to a temporary file renamed over the file
+
+        The objects and changes are copied under the lock, then written
+        without it. In a text format, records still pending are copied
+        byte for byte from the previous file, which the lazy index keeps
+        open, and the index is then pointed at their position in the new
+        file. A binary format is written in one piece, and the pending
+        records are kept in the index as dictionaries.
+        """
+        pending = self.__pending()
+        sync = self.__get_sync()
+        serializer = self.__get_serializer()
+        with self.__lock.write():
+            changes = self.__take_changes()
+            objects = list(self.__objects.items())
+            records = pending.items() if pending is not None else []
+        spans = {}
+        offsets = None
+        if self.offset_index and not serializer.binary:
+            offsets = {}
+        tmp_path = f"{self.__file_path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as file:
+                if serializer.binary:
+                    data = {key: self.__encode(key, obj, changes)
+                            for key, obj in objects}
+                    for key, record in records:
+                        data[key] = spans[key] = pending.read(record)
+                    file.write(serializer.dumps(data))
+                else:
+                    self.__write_records(file, objects, changes,
+                                         pending, records, spans, offsets)
+                sync.file(file)
+            sync.replace(tmp_path, self.__file_path, self.__backup_path())
+        except BaseException:
+            self.__restore_changes(changes)
+            raise
+        if offsets is not None:
+            offsets.update(spans)
+            LazyIndex.save_offsets(self.__file_path, self.__offsets_path(),
+                                   offsets)
+        if pending is not None:
+            with self.__lock.write():
+                pending.rebase(self.__file_path, spans)
+
+    def __write_shards(self):
+        """Writes the shards holding an object changed since the last
+        flush, each to a temporary file renamed over it
+
+        A changed shard that was not read yet is read first, so that
+        the objects of other processes or sessions stay in it.
+        """
+        layout = self.__layout()
+        sync = self.__get_sync()
+        serializer = self.__get_serializer()
+        with self.__lock.write():
+            names = {layout.name(key) for key in self.__changes}
+            self.__load_shards(names)
+            changes = self.__take_changes()
+            shards = {name: [] for name in names}
+            for class_name in {name.split(".", 1)[0] for name in names}:
+                for key, obj in self.__classes.get(class_name, {}).items():
+                    objects = shards.get(layout.name(key))
+                    if objects is not None:
+                        objects.append((key, obj))
+            stale = set(self.__stale)
+        try:
+            os.makedirs(layout.directory, exist_ok=True)
+            for name, objects in shards.items():
+                path = layout.path(name)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, 'wb') as file:
+                    if serializer.binary:
+                        file.write(serializer.dumps(
+                                {key: self.__encode(key, obj, changes)
+                                 for key, obj in objects}))
+                    else:
+                        self.__write_records(file, objects, changes,
+                                             None, [], {})
+                    sync.file(file)
+                sync.replace(tmp_path, path,
+                             f"{path}.bak" if self.backup else None)
+        except BaseException:
+            self.__restore_changes(changes)
+            raise
+        for name in stale:
+            path = layout.path(name)
+            for stale_path in (path, f"{path}.bak"):
+                if os.path.exists(stale_path):
+                    os.remove(stale_path)
+        FileStorage.__stale = self.__stale - stale
+
+    def __write_records(self, file, objects, changes, pending, records,
+                        spans, offsets=None):
+        """Writes the JSON object of the snapshot record by record,
+        storing in spans the position of each pending record, and in
+        offsets, if given, the position of the others"""
+        separator = b""
+        file.write(b"{")
+        for key, obj in objects:
+            record = self.__encode(key, obj, changes)
+            file.write(separator + json.dumps(key).encode() + b": ")
+            if offsets is not None:
+                offsets[key] = (file.tell(), file.tell() + len(record))
+            file.write(record)
+            separator = b", "
+        for key, record in records:
+            file.write(separator + json.dumps(key).encode() + b": ")
+            start = file.tell()
+            file.write(pending.raw(record))
+            spans[key] = (start, file.tell())
+            separator = b", "
+        file.write(b"}")
+
+    def __save_text_indexes(self):
+        """Writes to <file>.fts the text indexes that cover every object
+        of their class, stamped like the snapshot they belong to"""
+        pending = FileStorage.__lazy
+        stat = os.stat(self.__file_path)
+        saved = {"stamp": [stat.st_ino, stat.st_size, stat.st_mtime_ns],
+                 "classes": {}}
+        tmp_path = f"{self.__text_path()}.tmp"
+        with self.__lock.read():
+            for class_name, indexes in self.__indexes.items():
+                states = [index.state() for index in indexes.composites
+                          if isinstance(index, TextIndex) and
+                          (pending is None or
+                           index.covers(pending.keys(class_name)))]
+                if states:
+                    saved["classes"][class_name] = states
+            with open(tmp_path, 'w', encoding="utf-8") as file:
+                json.dump(saved, file)
+        os.replace(tmp_path, self.__text_path())
+
+    def __load_text_indexes(self):
+        """Fills the text indexes from <file>.fts if it was written with
+        the current snapshot and no journal is left to replay over it"""
+        journal = self.__get_journal()
+        if os.path.exists(journal.path) or \
+                os.path.exists(journal.rotated_path):
+            return
+        try:
+            with open(self.__text_path(), 'r', encoding="utf-8") as file:
+                saved = json.load(file)
+            stat = os.stat(self.__file_path)
+        except (OSError, ValueError):
+            return
+        if saved.get("stamp") != [stat.st_ino, stat.st_size,
+                                  stat.st_mtime_ns]:
+            return
+        for class_name, states in saved["classes"].items():
+            if class_name not in self.class_map:
+                continue
+            indexes = self.__indexes_of(class_name)
+            for state in states:
+                for index in indexes.composites:
+                    if isinstance(index, TextIndex) and \
+                            list(index.attributes) == state["attributes"]:
+                        index.load(state)
+
+    def __take_changes(self):
+        """Returns the changes since the last flush and starts anew,
+        dropping the cached records of the deleted objects"""
+        changes = dict(self.__changes)
+        self.__changes.clear()
+        self.__dirty.clear()
+        for key, obj in changes.items():
+            if obj is None:
+                self.__cache.pop(key, None)
+        return (changes)
+
+    def __restore_changes(self, changes):
+        """Marks again the changes of a flush that failed"""
+        with self.__lock.write():
+            for key, obj in changes.items():
+                self.__changes.setdefault(key, obj)
+
+    def __snapshots(self):
+        """Returns the existing paths to load a snapshot from, the file
+        first and then its backup"""
+        paths = [self.__file_path, self.__backup_path()]
+        return ([path for path in paths
+                 if path is not None and os.path.exists(path)])
+
+    def __text_path(self):
+        """Returns the path of the saved text indexes of the file"""
+        return (f"{self.__file_path}.fts")
+
+    def __offsets_path(self):
+        """Returns the path of the offset index of the file"""
+        return (f"{self.__file_path}.idx")
+
+    def __layout(self):
+        """Returns the ShardLayout of the file for shard_prefix"""
+        return (ShardLayout(self.__file_path, self.shard_prefix))
+
+    def __backup_path(self):
+        """Returns the path of the previous snapshot, or None"""
+        return (f"{self.__file_path}.bak" if self.backup else None)
+
+    def __set_aside(self, path, error):
+        """Renames an unreadable snapshot to <path>.corrupt so that no
+        save replaces it, and warns about it; in read-only mode the file
+        is left in place for the writers"""
+        if self.read_only:
+            warnings.warn(f"{path} is unreadable ({error})", RuntimeWarning)
+            return
+        os.replace(path, f"{path}.corrupt")
+        warnings.warn(f"{path} is unreadable ({error}), "
+                      f"moved to {path}.corrupt", RuntimeWarning)
+
+    def __register(self, key, obj):
+        """Stores obj under key in __objects and in its class index"""
+        self.__objects[key] = obj
+        class_name = key.split(".", 1)[0]
+        self.__classes.setdefault(class_name, {})[key] = obj
+        self.__revise(class_name)
+        indexes = self.__indexes_of(class_name)
+        for index in indexes.values():
+            index.add(key, obj)
+        for index in indexes.composites:
+            index.add(key, obj)
+
+    def __unregister(self, key):
+        """Removes key from __objects, from its class index and from the
+        cache of encoded records"""
+        del self.__objects[key]
+        self.__cache.pop(key, None)
+        class_name = key.split(".", 1)[0]
+        self.__classes.get(class_name, {}).pop(key, None)
+        self.__revise(class_name)
+        indexes = self.__indexes_of(class_name)
+        for index in indexes.values():
+            index.remove(key)
+        for index in indexes.composites:
+            index.remove(key)
+
+    def __revise(self, name):
+        """Changes the revision of a class name or of a (class name,
+        attribute) pair"""
+        self.__revisions[name] = self.__revisions.get(name, 0) + 1
+
+    def __indexes_of(self, class_name):
+        """Returns the IndexSet of class_name, building the indexes
+        declared for it on first use"""
+        indexes = self.__indexes.get(class_name)
+        if indexes is None:
+            indexes = self.__indexes[class_name] = IndexSet()
+            for attribute in self.indexes.get(class_name, []):
+                self.create_index(class_name, attribute)
+            for attribute in self.range_indexes.get(class_name, []):
+                self.create_index(class_name, attribute, ordered=True)
+            for attributes in self.spatial_indexes.get(class_name, []):
+                self.__add_composite(class_name, GeoIndex(*attributes))
+            for attributes in self.text_indexes.get(class_name, []):
+                self.__add_composite(class_name, TextIndex(*attributes))
+            for attributes in self.aggregates.get(class_name, []):
+                self.__add_composite(class_name, Aggregate(*attributes))
+        return (indexes)
+
+    def __aggregate(self, class_name, attribute, group):
+        """Returns the maintained Aggregate of attribute per group for
+        class_name, or None"""
+        return (next((index for index in self.__indexes[class_name].composites
+                      if isinstance(index, Aggregate) and
+                      index.group == group and index.attribute == attribute),
+                     None))
+
+    def __add_composite(self, class_name, index):
+        """Fills index, over several attributes, with the objects of
+        class_name and starts maintaining it"""
+        for key, obj in self.__classes.get(class_name, {}).items():
+            index.add(key, obj)
+        self.__indexes[class_name].add_composite(index)
+
+    @staticmethod
+    def __class_name(cls):
+        """Returns the name of cls, which can be a class or a string"""
+        return (cls if isinstance(cls, str) else cls.__name__)
+
+    def __encode(self, key, obj, changes):
+        """Returns the record of obj for the snapshot, serializing it
+        only if it is in changes or was never serialized
+
+        The record is the encoded bytes in a text format, and the
+        to_dict() dictionary in a binary one.
+        """
+        cached = self.__cache.get(key)
+        if cached is None or cached[0] is not obj or key in changes:
+            serializer = self.__get_serializer()
+            record = obj.to_dict()
+            if not serializer.binary:
+                record = serializer.dumps(record)
+            cached = (obj, record)
+            self.__cache[key] = cached
+        return (cached[1])
+
+    def __flush_journal(self):
+        """Appends the objects changed since the last flush to the log"""
+        with self.__lock.write():
+            changes = self.__take_changes()
+        try:
+            serializer = self.__get_serializer()
+            records = {}
+            for key, obj in changes.items():
+                if obj is None:
+                    self.__cache.pop(key, None)
+                    records[key] = None
+                elif serializer.binary:
+                    records[key] = JSONSerializer().dumps(
+                            self.__encode(key, obj, changes))
+                else:
+                    records[key] = self.__encode(key, obj, changes)
+            journal = self.__get_journal()
+            journal.append(records)
+        except BaseException:
+            self.__restore_changes(changes)
+            raise
+        journal.compact(self.__file_path, self.journal_threshold,
+                        self.__backup_path())
+
+    def __get_journal(self):
+        """Returns the Journal attached to the current file path"""
+        log_path = f"{self.__file_path}.log"
+        if FileStorage.__journal is None or \
+                FileStorage.__journal.path != log_path:
+            FileStorage.__journal = Journal(log_path)
+        FileStorage.__journal.sync = self.__get_sync()
+        FileStorage.__journal.serializer = self.serializer
+        FileStorage.__journal.lock = \
+            self.__get_file_lock() if self.shared else None
+        return (FileStorage.__journal)
+
+    def __get_file_lock(self):
+        """Returns the FileLock attached to the current file path"""
+        lock_path = f"{self.__file_path}.lock"
+        if FileStorage.__file_lock is None or \
+                FileStorage.__file_lock.path != lock_path:
+            FileStorage.__file_lock = FileLock(lock_path)
+        return (FileStorage.__file_lock)
+
+    def __get_serializer(self):
+        """Returns the serializer named serializer, dropping the records
+        cached in the format of the previous one"""
+        current = FileStorage.__serializer
+        if current is None or self.serializer not in \
+                (current.name, current.requested):
+            current = FileStorage.__serializer = \
+                get_serializer(self.serializer)
+            current.requested = self.serializer
+            self.__cache.clear()
+        return (current)
+
+    def __get_flusher(self):
+        """Returns the Flusher of the storage, set to flush_interval"""
+        if FileStorage.__flusher is None:
+            FileStorage.__flusher = Flusher(self.flush)
+        FileStorage.__flusher.interval = self.flush_interval
+        return (FileStorage.__flusher)
+
+    def __get_sync(self):
+        """Returns the SyncPolicy matching fsync and fsync_interval,
+        syncing what the previous policy still had pending"""
+        sync = FileStorage.__sync
+        if sync is None or sync.mode != self.fsync or \
+                sync.interval != self.fsync_interval:
+            if sync is not None:
+                sync.wait()
+            sync = FileStorage.__sync = SyncPolicy(
+                    self.fsync, self.fsync_interval)
+        return (sync)
@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+"""
+Module filelock
+This module defines the class FileLock used by FileStorage to share a
+storage file between processes
+"""
+import os
+import threading
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class FileLock():
+    """Advisory lock and generation number of a storage file
+
+    The lock file holds the generation number, bumped by each process
+    after it writes the storage file, so that other processes can tell
+    with a single small read whether they have to reload. Locks are
+    taken with flock() and only exclude processes that use them too;
+    where fcntl is not available they do nothing. A thread already
+    holding the lock can take it again, in either mode, without waiting.
+    """
+    __width = 20
+
+    def __init__(self, path):
+        """Initializes the lock kept in the file at path"""
+        self.path = path
+        self.__local = threading.local()
+
+    @contextmanager
+    def shared(self):
+        """Context manager holding the lock shared, to read"""
+        with self.__locked(fcntl.LOCK_SH if fcntl else None):
+            yield (self)
+
+    @contextmanager
+    def exclusive(self):
+        """Context manager holding the lock exclusively, to write"""
+        with self.__locked(fcntl.LOCK_EX if fcntl else None):
+            yield (self)
+
+    def generation(self):
+        """Returns the generation number, 0 before the first write"""
+        try:
+            with open(self.path, 'rb') as file:
+                return (int(file.read(self.__width) or 0))
+        except (FileNotFoundError, ValueError):
+            return (0)
+
+    def bump(self):
+        """Increments the generation number, under exclusive(), and
+        returns it"""
+        generation = self.generation() + 1
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.pwrite(fd, f"{generation:0{self.__width}d}".encode(), 0)
+        finally:
+            os.close(fd)
+        return (generation)
+
+    @contextmanager
+    def __locked(self, operation):
+        """Holds flock operation on the lock file, if supported"""
+        depth = getattr(self.__local, "depth", 0)
+        if operation is None or depth:
+            yield
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, operation)
+            self.__local.depth = 1
+            yield
+        finally:
+            self.__local.depth = 0
+            os.close(fd)
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+"""
+Module flusher
+This module defines the class Flusher used by FileStorage to write
+saved changes from a background thread
+"""
+import atexit
+import threading
+
+
+class Flusher():
+    """Background thread calling flush at most once per interval
+
+    request() only marks the storage dirty and returns; the thread then
+    waits interval milliseconds so that every request made meanwhile is
+    written by the same flush. A failed flush is retried on the next
+    interval and its exception is kept in error. stop() writes what is
+    still pending before returning, and runs at exit as well.
+    """
+
+    def __init__(self, flush, interval=100):
+        """Initializes a stopped flusher calling flush"""
+        self.interval = interval
+        self.error = None
+        self.__flush = flush
+        self.__condition = threading.Condition()
+        self.__dirty = False
+        self.__stopping = False
+        self.__thread = None
+        atexit.register(self.stop)
+
+    def request(self):
+        """Marks the storage dirty, starting the thread if needed"""
+        with self.__condition:
+            self.__dirty = True
+            self.__condition.notify()
+            if self.__thread is None:
+                self.__thread = threading.Thread(
+                        target=self.__run, daemon=True)
+                self.__thread.start()
+
+    def pending(self):
+        """Returns True while requested changes are not written yet"""
+        return (self.__dirty)
+
+    def stop(self):
+        """Stops the thread, then flushes the requests it did not write"""
+        with self.__condition:
+            thread = self.__thread
+            self.__stopping = True
+            self.__condition.notify()
+        if thread is not None:
+            thread.join()
+        with self.__condition:
+            self.__thread = None
+            self.__stopping = False
+            dirty = self.__dirty
+            self.__dirty = False
+        if dirty:
+            self.__flush()
+
+    def __run(self):
+        """Waits for requests and flushes them once per interval"""
+        condition = self.__condition
+        while True:
+            with condition:
+                condition.wait_for(lambda: self.__dirty or self.__stopping)
+                condition.wait_for(lambda: self.__stopping,
+                                   self.interval / 1000)
+                if self.__stopping:
+                    return
+                self.__dirty = False
+            try:
+                self.__flush()
+                self.error = None
+            except Exception as error:
+                self.error = error
+                with condition:
+                    self.__dirty = True
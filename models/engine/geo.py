@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+"""
+Module geo
+This module defines the class GeoIndex used by FileStorage to find the
+objects near a point, and the distance helpers it shares with DBStorage
+"""
+import math
+
+EARTH_RADIUS = 6371.0088
+"""Mean radius of the Earth, in kilometers"""
+
+
+def distance(latitude1, longitude1, latitude2, longitude2):
+    """Returns the great-circle distance in kilometers between two
+    points given in degrees"""
+    phi1 = math.radians(latitude1)
+    phi2 = math.radians(latitude2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + \
+        math.cos(phi1) * math.cos(phi2) * \
+        math.sin(math.radians(longitude2 - longitude1) / 2) ** 2
+    return (2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a))))
+
+
+def bounds(latitude, longitude, radius):
+    """Returns the (south, north, west, east) box in degrees holding the
+    circle of radius kilometers around a point
+
+    west is greater than east when the box crosses the antimeridian,
+    and the box spans every longitude when the circle holds a pole.
+    """
+    angle = radius / EARTH_RADIUS
+    south = latitude - math.degrees(angle)
+    north = latitude + math.degrees(angle)
+    if south <= -90 or north >= 90 or angle >= math.pi / 2:
+        return (max(south, -90.0), min(north, 90.0), -180.0, 180.0)
+    spread = math.degrees(math.asin(
+            min(1.0, math.sin(angle) / math.cos(math.radians(latitude)))))
+    west = (longitude - spread + 180) % 360 - 180
+    east = (longitude + spread + 180) % 360 - 180
+    return (south, north, west, east)
+
+
+def valid(latitude, longitude):
+    """Returns True if both are numbers within the range of coordinates"""
+    return (isinstance(latitude, (int, float)) and
+            isinstance(longitude, (int, float)) and
+            -90 <= latitude <= 90 and -180 <= longitude <= 180)
+
+
+def nearest(within, latitude, longitude, count, radius=None, start=10.0):
+    """Returns the (distance, key, obj) of the count objects nearest to a
+    point, within radius kilometers if given
+
+    within(latitude, longitude, radius) returns the sorted matches
+    within a radius; it is called with a radius doubling from start
+    until it holds count matches or covers the radius or the Earth.
+    Raises ValueError when count or radius is negative.
+    """
+    if count < 0 or (radius is not None and radius < 0):
+        raise ValueError("radius and count cannot be negative")
+    limit = radius if radius is not None else math.pi * EARTH_RADIUS
+    search = min(start, limit)
+    while True:
+        matches = within(latitude, longitude, search)
+        if len(matches) >= count or search >= limit:
+            return (matches[:count])
+        search = min(search * 2, limit)
+
+
+class GeoIndex():
+    """Grid of the objects on their latitude and longitude attributes
+
+    The globe is cut in cells of cell degrees on each side, so a radius
+    lookup only reads the cells its bounding box overlaps and checks the
+    exact distance of the objects found there. Objects whose
+    coordinates are missing or out of range are left out of the index.
+
+    Attributes:
+        attributes (tuple): The names of the latitude and longitude.
+    """
+
+    def __init__(self, latitude="latitude", longitude="longitude",
+                 cell=0.1):
+        """Initializes an empty index on the two attributes"""
+        self.attributes = (latitude, longitude)
+        self.cell = cell
+        self.__cells = {}
+        self.__points = {}
+
+    def add(self, key, obj):
+        """Indexes obj at its current position, moving it if it changed"""
+        latitude = getattr(obj, self.attributes[0], None)
+        longitude = getattr(obj, self.attributes[1], None)
+        if not valid(latitude, longitude):
+            self.remove(key)
+            return
+        cell = self.__cell(latitude, longitude)
+        point = self.__points.get(key)
+        if point is not None and point[2] != cell:
+            self.remove(key)
+        self.__points[key] = (latitude, longitude, cell)
+        self.__cells.setdefault(cell, {})[key] = obj
+
+    def remove(self, key):
+        """Removes the object stored under key from the index"""
+        point = self.__points.pop(key, None)
+        if point is None:
+            return
+        objects = self.__cells[point[2]]
+        del objects[key]
+        if not objects:
+            del self.__cells[point[2]]
+
+    def within(self, latitude, longitude, radius):
+        """Returns the (distance, key, obj) of the objects at most radius
+        kilometers away from a point, nearest first"""
+        south, north, west, east = bounds(latitude, longitude, radius)
+        rows = range(math.floor(south / self.cell),
+                     math.floor(north / self.cell) + 1)
+        columns = self.__columns(west, east)
+        if len(rows) * len(columns) > len(self.__cells):
+            cells = [cell for cell in self.__cells
+                     if cell[0] in rows and cell[1] in columns]
+        else:
+            cells = [(row, column) for row in rows for column in columns]
+        matches = []
+        for cell in cells:
+            for key, obj in self.__cells.get(cell, {}).items():
+                point = self.__points[key]
+                km = distance(latitude, longitude, point[0], point[1])
+                if km <= radius:
+                    matches.append((km, key, obj))
+        matches.sort(key=lambda match: (match[0], match[1]))
+        return (matches)
+
+    def nearest(self, latitude, longitude, count, radius=None):
+        """Returns the (distance, key, obj) of the count objects nearest
+        to a point, within radius kilometers if given"""
+        return (nearest(self.within, latitude, longitude, count, radius,
+                        start=self.cell * 111.0))
+
+    def __cell(self, latitude, longitude):
+        """Returns the (row, column) of the cell holding a point"""
+        return (math.floor(latitude / self.cell),
+                math.floor(longitude / self.cell))
+
+    def __columns(self, west, east):
+        """Returns the set of the columns between two longitudes"""
+        first = math.floor(west / self.cell)
+        last = math.floor(east / self.cell)
+        if west <= east:
+            return (set(range(first, last + 1)))
+        return (set(range(first, math.floor(180 / self.cell) + 1)) |
+                set(range(math.floor(-180 / self.cell), last + 1)))
+
+    def __len__(self):
+        """Returns the number of indexed objects"""
+        return (len(self.__points))
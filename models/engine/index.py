@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+"""
+Module index
+This module defines the attribute indexes maintained by FileStorage
+"""
+import bisect
+
+
+class IndexSet(dict):
+    """The indexes of one class: attribute -> index of that attribute
+
+    Indexes over several attributes, such as a GeoIndex, are kept in
+    composites, and watching maps each of their attributes to them so
+    that a change of one attribute updates only the indexes using it.
+    """
+
+    def __init__(self):
+        """Initializes a set without indexes"""
+        super().__init__()
+        self.composites = []
+        self.watching = {}
+
+    def add_composite(self, index):
+        """Adds an index over the attributes listed in index.attributes"""
+        self.composites.append(index)
+        for attribute in index.attributes:
+            self.watching.setdefault(attribute, []).append(index)
+
+
+class HashIndex():
+    """Maps the values of one attribute to the objects holding them
+
+    Attributes:
+        attribute (str): The name of the indexed attribute.
+    """
+
+    def __init__(self, attribute):
+        """Initializes an empty index on attribute"""
+        self.attribute = attribute
+        self.__buckets = {}
+        self.__values = {}
+
+    def add(self, key, obj):
+        """Indexes obj under its current value, moving it if it changed"""
+        value = getattr(obj, self.attribute, None)
+        try:
+            hash(value)
+        except TypeError:
+            self.remove(key)
+            return
+        if key in self.__values:
+            if self.__values[key] == value:
+                self.__buckets[value][key] = obj
+                return
+            self.remove(key)
+        self.__values[key] = value
+        self.__buckets.setdefault(value, {})[key] = obj
+
+    def remove(self, key):
+        """Removes the object stored under key from the index"""
+        if key not in self.__values:
+            return
+        value = self.__values.pop(key)
+        bucket = self.__buckets[value]
+        del bucket[key]
+        if not bucket:
+            del self.__buckets[value]
+
+    def find(self, value):
+        """Returns a dictionary key -> obj of the objects matching value"""
+        try:
+            return (dict(self.__buckets.get(value, {})))
+        except TypeError:
+            return ({})
+
+    def __len__(self):
+        """Returns the number of indexed objects"""
+        return (len(self.__values))
+
+
+class RangeIndex():
+    """Keeps the objects sorted on the numeric values of one attribute
+
+    The (value, key) pairs are kept in a sorted list maintained with
+    bisect, so a range lookup costs O(log n + k) for k matches. Objects
+    whose value is not a number are left out of the index.
+
+    Attributes:
+        attribute (str): The name of the indexed attribute.
+    """
+
+    def __init__(self, attribute):
+        """Initializes an empty index on attribute"""
+        self.attribute = attribute
+        self.__entries = []
+        self.__values = {}
+        self.__objects = {}
+
+    @staticmethod
+    def indexable(value):
+        """Returns True if value is a number the index can order"""
+        return (isinstance(value, (int, float)) and value == value)
+
+    def add(self, key, obj):
+        """Indexes obj under its current value, moving it if it changed"""
+        value = getattr(obj, self.attribute, None)
+        if not self.indexable(value):
+            self.remove(key)
+            return
+        if key in self.__values:
+            if self.__values[key] == value:
+                self.__objects[key] = obj
+                return
+            self.remove(key)
+        self.__values[key] = value
+        self.__objects[key] = obj
+        bisect.insort(self.__entries, (value, key))
+
+    def remove(self, key):
+        """Removes the object stored under key from the index"""
+        if key not in self.__values:
+            return
+        entry = (self.__values.pop(key), key)
+        del self.__objects[key]
+        del self.__entries[bisect.bisect_left(self.__entries, entry)]
+
+    def find(self, value):
+        """Returns a dictionary key -> obj of the objects matching value"""
+        if not self.indexable(value):
+            return ({})
+        return (self.range(value, value))
+
+    def range(self, low=None, high=None, include_low=True,
+              include_high=True):
+        """Returns a dictionary key -> obj of the objects whose value is
+        between low and high, each bound being optional"""
+        entries = self.__entries
+        start, end = 0, len(entries)
+        if low is not None:
+            start = bisect.bisect_left(entries, (low,)) if include_low \
+                else bisect.bisect_right(entries, (low, _last))
+        if high is not None:
+            end = bisect.bisect_right(entries, (high, _last)) \
+                if include_high else bisect.bisect_left(entries, (high,))
+        return ({key: self.__objects[key]
+                 for value, key in entries[start:end]})
+
+    def __len__(self):
+        """Returns the number of indexed objects"""
+        return (len(self.__values))
+
+
+class _Last():
+    """Sorts after every key, to bisect past all the entries of a value"""
+
+    def __gt__(self, other):
+        """Returns True: _Last is greater than any key"""
+        return (True)
+
+    def __lt__(self, other):
+        """Returns False: _Last is less than no key"""
+        return (False)
+
+
+_last = _Last()
@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+"""
+Module journal
+This module defines the class Journal used by FileStorage to append
+changed records to a log file instead of rewriting the whole snapshot
+"""
+import os
+import json
+import threading
+from models.engine.serializer import get_serializer, load_file
+from models.engine.sync import SyncPolicy
+
+
+class Journal():
+    """Append-only log of the records changed since the last snapshot
+
+    Each line of the log is the JSON object {key: value, ...} of one
+    flush, where value is the to_dict() of the object or null for a
+    deletion. Writing a flush as a single line makes it atomic: a line
+    torn by a crash is dropped as a whole on replay, and the next append
+    starts a new line after it.
+    Once the log grows past a threshold it is rotated to <path>.1 and a
+    background thread folds it into the snapshot file.
+    Appends and folded snapshots are synced to disk according to sync,
+    a SyncPolicy. When lock, a FileLock, is set, the fold holds it
+    exclusively so that other processes never read a half-folded log.
+    The log is always JSON; the folded snapshot is written with the
+    serializer named serializer, and read with the one that wrote it.
+    """
+
+    def __init__(self, path, sync=None):
+        """Initializes a journal writing to the log file at path"""
+        self.path = path
+        self.rotated_path = f"{path}.1"
+        self.size = 0
+        self.sync = sync or SyncPolicy()
+        self.lock = None
+        self.serializer = "json"
+        self.__compactor = None
+
+    def append(self, records):
+        """Appends the key -> JSON bytes (or None) records to the log,
+        on a line of their own even after a torn one"""
+        if not records:
+            return
+        line = b", ".join(json.dumps(key).encode() + b": " +
+                          (value or b"null")
+                          for key, value in records.items())
+        with open(self.path, 'a+b') as file:
+            start = b"{"
+            if file.seek(0, os.SEEK_END):
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b"\n":
+                    start = b"\n{"
+            file.write(start + line + b"}\n")
+            self.sync.file(file)
+        self.sync.written(self.path)
+        self.size += len(records)
+
+    def replay(self, data):
+        """Applies the rotated and the current log to the dictionary data
+
+        Without a lock, a running compaction is waited for first. With
+        one, the caller holds it, so no fold can be in progress.
+        """
+        if self.lock is None:
+            self.wait()
+        self.__apply(self.rotated_path, data)
+        self.size = self.__apply(self.path, data)
+        return (data)
+
+    def compact(self, snapshot_path, threshold, backup_path=None):
+        """Folds the log into snapshot_path once it exceeds threshold
+
+        The log is renamed before the thread starts so that appends made
+        while compacting go to a fresh log and are never lost. A rotated
+        log left by a failed fold is never overwritten; it stays to be
+        replayed until the next full snapshot. The previous snapshot is
+        kept at backup_path when it is given.
+        """
+        if self.size <= threshold or self.compacting() or \
+                os.path.exists(self.rotated_path):
+            return
+        os.replace(self.path, self.rotated_path)
+        self.size = 0
+        self.__compactor = threading.Thread(
+                target=self.__fold, args=(snapshot_path, backup_path))
+        self.__compactor.start()
+
+    def compacting(self):
+        """Returns True while a background compaction is running"""
+        return (self.__compactor is not None and self.__compactor.is_alive())
+
+    def wait(self):
+        """Blocks until the running compaction, if any, has finished"""
+        if self.__compactor is not None:
+            self.__compactor.join()
+            self.__compactor = None
+
+    def clear(self):
+        """Discards both logs once a full snapshot has been written"""
+        self.wait()
+        for path in (self.rotated_path, self.path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.size = 0
+
+    def __fold(self, snapshot_path, backup_path):
+        """Writes snapshot + rotated log as the new snapshot
+
+        When the snapshot is missing, e.g. after a crash between the two
+        renames of a save, the backup is folded instead. An unreadable
+        snapshot raises, leaving both files and the rotated log as is.
+        """
+        if self.lock is None:
+            self.__fold_locked(snapshot_path, backup_path)
+            return
+        with self.lock.exclusive():
+            self.__fold_locked(snapshot_path, backup_path)
+
+    def __fold_locked(self, snapshot_path, backup_path):
+        """Folds the rotated log, once the lock is held"""
+        data = {}
+        read_path = snapshot_path
+        if not os.path.exists(read_path) and backup_path is not None:
+            read_path = backup_path
+        if os.path.exists(read_path):
+            data = load_file(read_path, self.serializer)
+        self.__apply(self.rotated_path, data)
+
+        tmp_path = f"{snapshot_path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(get_serializer(self.serializer).dumps(data))
+            self.sync.file(file)
+        self.sync.replace(tmp_path, snapshot_path, backup_path)
+        os.remove(self.rotated_path)
+
+    @staticmethod
+    def __apply(path, data):
+        """Applies the records of the log at path to data
+
+        Returns the number of records applied. A torn line, left by a
+        crash in the middle of an append, is skipped.
+        """
+        count = 0
+        if not os.path.exists(path):
+            return (count)
+        with open(path, 'r', encoding="utf-8") as file:
+            for line in file:
+                try:
+                    records = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                for key, value in records.items():
+                    if value is None:
+                        data.pop(key, None)
+                    else:
+                        data[key] = value
+                count += len(records)
+        return (count)
@@ -0,0 +1,229 @@
+#!/usr/bin/python3
+"""
+Module lazy
+This module defines the class LazyIndex used by FileStorage to defer
+the construction of objects until they are first accessed
+"""
+import os
+import json
+import mmap
+
+
+class LazyIndex():
+    """Byte offsets of the snapshot records that are not loaded yet
+
+    The snapshot is only scanned on first use. Each record is kept as a
+    (start, end) span in the snapshot, or as a dictionary when it comes
+    from the journal, grouped by class name. The snapshot stays open so
+    spans remain readable after the file is replaced on disk.
+
+    When mapped is True the snapshot is mapped read-only in memory, so
+    processes reading the same file share its pages in the page cache
+    and only the bytes of the records decoded are copied. An offset
+    index written next to the snapshot by save_offsets() spares the
+    scan entirely when it matches the snapshot.
+    """
+    __decoder = json.JSONDecoder()
+
+    def __init__(self, path, mapped=False):
+        """Initializes an unscanned index of the snapshot at path"""
+        self.path = path
+        self.mapped = mapped
+        self.scanned = False
+        self.error = None
+        self.__class_names = ()
+        self.__records = {}
+        self.__file = None
+        self.__map = None
+
+    def scan(self, class_names, data=None, offsets_path=None):
+        """Records the span of every record whose class is in class_names
+
+        The file is decoded as latin-1 so that character positions are
+        byte positions; keys and JSON punctuation are plain ASCII.
+        A malformed file leaves the index empty, with the exception in
+        error. A snapshot in a binary format cannot be read by spans: it
+        is loaded by the caller and its key -> dictionary records are
+        given as data instead. The spans are read from the offset index
+        at offsets_path instead of scanning, if it matches the file.
+        """
+        self.scanned = True
+        self.__class_names = class_names
+        if data is not None:
+            for key, obj_dict in data.items():
+                self[key] = obj_dict
+            return
+        try:
+            self.__open(self.path)
+        except FileNotFoundError:
+            return
+        if offsets_path is not None and \
+                self.__read_offsets(offsets_path, class_names):
+            return
+        if self.__map is not None:
+            text = self.__map[:].decode("latin-1")
+        else:
+            text = self.__file.read().decode("latin-1")
+        try:
+            self.__scan(text, class_names)
+        except (json.JSONDecodeError, IndexError, AttributeError) as error:
+            self.__records.clear()
+            self.error = error
+
+    def __scan(self, text, class_names):
+        """Walks the top level object of text"""
+        decode = self.__decoder.raw_decode
+        pos = self.__skip(text, 0)
+        if text[pos] != "{":
+            raise json.JSONDecodeError("Expecting '{'", text, pos)
+        pos = self.__skip(text, pos + 1)
+        while text[pos] != "}":
+            key, pos = decode(text, pos)
+            pos = self.__skip(text, pos)
+            if text[pos] != ":":
+                raise json.JSONDecodeError("Expecting ':'", text, pos)
+            start = self.__skip(text, pos + 1)
+            value, end = decode(text, start)
+            if value.get("__class__") in class_names:
+                records = self.__records.setdefault(key.split(".", 1)[0], {})
+                records[key] = (start, end)
+            pos = self.__skip(text, end)
+            if text[pos] == ",":
+                pos = self.__skip(text, pos + 1)
+
+    @staticmethod
+    def __skip(text, pos):
+        """Returns the position of the next non blank character"""
+        while text[pos] in " \t\r\n":
+            pos += 1
+        return (pos)
+
+    def __setitem__(self, key, obj_dict):
+        """Stores a record given as a dictionary, e.g. from the journal"""
+        self.discard([key])
+        if obj_dict.get("__class__") in self.__class_names:
+            records = self.__records.setdefault(key.split(".", 1)[0], {})
+            records[key] = obj_dict
+
+    def pop(self, key, default=None):
+        """Removes key and returns its record as a dictionary"""
+        records = self.__records.get(key.split(".", 1)[0], {})
+        if key not in records:
+            return (default)
+        return (self.read(records.pop(key)))
+
+    def pop_class(self, class_name):
+        """Removes and returns the key -> dictionary records of a class"""
+        records = self.__records.pop(class_name, {})
+        return ({key: self.read(record)
+                 for key, record in records.items()})
+
+    def pop_all(self):
+        """Removes and returns every record as key -> dictionary"""
+        data = {}
+        for class_name in list(self.__records):
+            data.update(self.pop_class(class_name))
+        return (data)
+
+    def discard(self, keys):
+        """Forgets the records of keys without reading them"""
+        for key in keys:
+            self.__records.get(key.split(".", 1)[0], {}).pop(key, None)
+
+    def count(self, class_name=None):
+        """Returns the number of pending records, or of class_name"""
+        if class_name is not None:
+            return (len(self.__records.get(class_name, {})))
+        return (sum(len(records) for records in self.__records.values()))
+
+    def keys(self, class_name):
+        """Returns the keys of the pending records of class_name"""
+        return (list(self.__records.get(class_name, {})))
+
+    def items(self):
+        """Returns (key, record) pairs of every pending record"""
+        return ([(key, record) for records in self.__records.values()
+                 for key, record in records.items()])
+
+    def raw(self, record):
+        """Returns the JSON bytes of a record without decoding them
+
+        Spans are read with pread, which leaves the file position alone,
+        so several threads can read records at once.
+        """
+        if isinstance(record, dict):
+            return (json.dumps(record).encode())
+        start, end = record
+        if self.__map is not None:
+            return (self.__map[start:end])
+        return (os.pread(self.__file.fileno(), end - start, start))
+
+    def rebase(self, path, spans):
+        """Points the index at a rewritten snapshot
+
+        spans maps every pending key to its (start, end) in the new file,
+        or to its dictionary when the new file is in a binary format.
+        """
+        self.close()
+        self.path = path
+        self.__open(path)
+        for records in self.__records.values():
+            for key in records:
+                records[key] = spans[key]
+
+    def close(self):
+        """Closes the snapshot file"""
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def read(self, record):
+        """Returns the dictionary of a record"""
+        if isinstance(record, dict):
+            return (record)
+        return (json.loads(self.raw(record)))
+
+    @staticmethod
+    def save_offsets(path, offsets_path, spans):
+        """Writes the offset index of the snapshot at path, where spans
+        maps every key to its (start, end)
+
+        The index records the inode, size and modification time of the
+        snapshot, so that a reader can tell it belongs to another file.
+        """
+        stat = os.stat(path)
+        index = {"stamp": [stat.st_ino, stat.st_size, stat.st_mtime_ns],
+                 "records": spans}
+        tmp_path = f"{offsets_path}.tmp"
+        with open(tmp_path, 'w', encoding="utf-8") as file:
+            json.dump(index, file)
+        os.replace(tmp_path, offsets_path)
+
+    def __open(self, path):
+        """Opens the snapshot at path, and maps it if mapped"""
+        self.__file = open(path, 'rb')
+        if self.mapped and os.fstat(self.__file.fileno()).st_size:
+            self.__map = mmap.mmap(self.__file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+
+    def __read_offsets(self, offsets_path, class_names):
+        """Records the spans of the offset index at offsets_path, and
+        returns False if it is missing or does not match the snapshot"""
+        try:
+            with open(offsets_path, 'r', encoding="utf-8") as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return (False)
+        stat = os.fstat(self.__file.fileno())
+        if index.get("stamp") != [stat.st_ino, stat.st_size,
+                                  stat.st_mtime_ns]:
+            return (False)
+        for key, (start, end) in index["records"].items():
+            class_name = key.split(".", 1)[0]
+            if class_name in class_names:
+                records = self.__records.setdefault(class_name, {})
+                records[key] = (start, end)
+        return (True)
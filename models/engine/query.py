@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+"""
+Module query
+This module defines the class Query run by the storage engines to
+filter, order, limit and project the objects of a class
+"""
+import heapq
+import operator
+from itertools import islice
+
+
+class Query():
+    """Conditions, order, limit and projection of a lookup in one class
+
+    Each method returns the query itself, so calls can be chained:
+
+        Query(Place).where(("price_by_night", "<", 100), max_guest=4)
+                    .order_by("-price_by_night").limit(20)
+
+    The storage chooses the candidate objects, using its indexes for
+    the conditions it can, and run() does the rest lazily: it stops as
+    soon as limit objects matched when there is no order, and keeps
+    only the limit smallest in a heap when there is one.
+    """
+    operators = {
+            "==": operator.eq, "!=": operator.ne, "<": operator.lt,
+            "<=": operator.le, ">": operator.gt, ">=": operator.ge
+            }
+
+    def __init__(self, cls):
+        """Initializes a query matching every object of cls, which can
+        be a class or a class name"""
+        self.class_name = cls if isinstance(cls, str) else cls.__name__
+        self.conditions = []
+        self.order = []
+        self.count = None
+        self.fields = None
+
+    def where(self, *conditions, **equalities):
+        """Adds (attribute, operator, value) conditions, and
+        attribute=value ones; raises ValueError for an unknown operator"""
+        for attribute, op, value in conditions:
+            if op not in self.operators:
+                raise ValueError(f"unknown operator: {op}")
+            self.conditions.append((attribute, op, value))
+        for attribute, value in equalities.items():
+            self.conditions.append((attribute, "==", value))
+        return (self)
+
+    def order_by(self, *attributes):
+        """Orders by attributes, descending for names starting with -"""
+        for attribute in attributes:
+            descending = attribute.startswith("-")
+            self.order.append((attribute.lstrip("-"), descending))
+        return (self)
+
+    def limit(self, count):
+        """Returns at most count objects"""
+        if count < 0:
+            raise ValueError("limit cannot be negative")
+        self.count = count
+        return (self)
+
+    def select(self, *fields):
+        """Returns dictionaries of fields instead of the objects"""
+        self.fields = list(fields)
+        return (self)
+
+    def matches(self, obj):
+        """Returns True if obj meets every condition; an attribute that
+        cannot be compared with the value does not match"""
+        for attribute, op, value in self.conditions:
+            try:
+                if not self.operators[op](getattr(obj, attribute, None),
+                                          value):
+                    return (False)
+            except TypeError:
+                return (False)
+        return (True)
+
+    def run(self, objects):
+        """Yields the objects of the iterable objects that match, in
+        order, up to the limit, projected on fields if selected
+
+        Raises TypeError when the values of an order attribute cannot
+        be compared with each other.
+        """
+        matches = (obj for obj in objects if self.matches(obj))
+        if self.order and self.count is not None:
+            matches = heapq.nsmallest(self.count, matches, key=self.__key)
+        elif self.order:
+            matches = sorted(matches, key=self.__key)
+        elif self.count is not None:
+            matches = islice(matches, self.count)
+        for obj in matches:
+            if self.fields is None:
+                yield (obj)
+            else:
+                yield ({field: getattr(obj, field, None)
+                        for field in self.fields})
+
+    def __key(self, obj):
+        """Returns the sort key of obj; missing values sort last"""
+        key = []
+        for attribute, descending in self.order:
+            value = getattr(obj, attribute, None)
+            key.append((value is None,
+                        _Descending(value) if descending else value))
+        return (key)
+
+
+class _Descending():
+    """Wraps a value so that it sorts in reverse order"""
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        """Initializes the wrapper of value"""
+        self.value = value
+
+    def __eq__(self, other):
+        """Returns True if both values are equal"""
+        return (self.value == other.value)
+
+    def __lt__(self, other):
+        """Returns True if value sorts after the other value"""
+        return (other.value < self.value)
@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+"""
+Module rwlock
+This module defines the class RWLock used by FileStorage to let many
+threads read the stored objects while one at a time changes them
+"""
+import threading
+
+
+class RWLock():
+    """Readers-writer lock preferring writers
+
+    Any number of threads can hold read() at once; write() waits until
+    they are done and is exclusive. A writer holds the write mutex while
+    it waits for the readers to leave, so readers arriving meanwhile
+    queue behind it and writers are not starved. Both are re-entrant,
+    and the writer can also read, but a reader cannot upgrade to write()
+    since two upgrading readers would wait for each other: it raises
+    RuntimeError instead.
+    """
+
+    def __init__(self):
+        """Initializes an unlocked lock"""
+        self.__mutex = threading.Lock()
+        self.__drained = threading.Condition(threading.Lock())
+        self.__readers = 0
+        self.__writer = None
+        self.__writer_depth = 0
+        self.__local = _Local()
+        self.__read = _Held(self.acquire_read, self.release_read)
+        self.__write = _Held(self.acquire_write, self.release_write)
+
+    def read(self):
+        """Returns a context manager holding the lock shared"""
+        return (self.__read)
+
+    def write(self):
+        """Returns a context manager holding the lock exclusively"""
+        return (self.__write)
+
+    def acquire_read(self):
+        """Takes the lock shared, waiting for the writer if any"""
+        local = self.__local
+        depth = local.depth
+        if depth or self.__writer == threading.get_ident():
+            local.depth = depth + 1
+            return
+        with self.__mutex, self.__drained:
+            self.__readers += 1
+        local.depth = 1
+        local.counted = True
+
+    def release_read(self):
+        """Releases a shared hold of the lock"""
+        local = self.__local
+        local.depth -= 1
+        if local.depth or not local.counted:
+            return
+        local.counted = False
+        with self.__drained:
+            self.__readers -= 1
+            if not self.__readers:
+                self.__drained.notify_all()
+
+    def acquire_write(self):
+        """Takes the lock exclusively once every reader has left"""
+        me = threading.get_ident()
+        if self.__writer == me:
+            self.__writer_depth += 1
+            return
+        if self.__local.depth:
+            raise RuntimeError("cannot upgrade a read lock to write")
+        self.__mutex.acquire()
+        self.__writer = me
+        self.__writer_depth = 1
+        if self.__readers:
+            with self.__drained:
+                while self.__readers:
+                    self.__drained.wait()
+
+    def release_write(self):
+        """Releases an exclusive hold of the lock"""
+        self.__writer_depth -= 1
+        if not self.__writer_depth:
+            self.__writer = None
+            self.__mutex.release()
+
+
+class _Local(threading.local):
+    """Read holds of the current thread"""
+    depth = 0
+    counted = False
+
+
+class _Held():
+    """Context manager calling acquire on enter and release on exit"""
+
+    def __init__(self, acquire, release):
+        """Initializes the context manager"""
+        self.__acquire = acquire
+        self.__release = release
+
+    def __enter__(self):
+        """Acquires the lock"""
+        self.__acquire()
+
+    def __exit__(self, *exc_info):
+        """Releases the lock"""
+        self.__release()
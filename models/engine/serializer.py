@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+"""
+Module serializer
+This module defines the serializers FileStorage can write its snapshot
+with, and detects which one wrote a file
+"""
+import io
+import json
+import pickle
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JSONSerializer():
+    """Stdlib json; the default and the format of the journal
+
+    Text formats are written record by record, so the encoded record of
+    each object can be cached and the snapshot scanned lazily.
+    """
+    name = "json"
+    binary = False
+
+    def dumps(self, value):
+        """Returns value encoded as bytes"""
+        return (json.dumps(value).encode())
+
+    def loads(self, data):
+        """Returns the value encoded in the bytes data"""
+        return (json.loads(data))
+
+
+class OrjsonSerializer(JSONSerializer):
+    """orjson, writing the same JSON several times faster"""
+    name = "orjson"
+
+    def dumps(self, value):
+        """Returns value encoded as bytes"""
+        return (orjson.dumps(value))
+
+    def loads(self, data):
+        """Returns the value encoded in the bytes data"""
+        return (orjson.loads(data))
+
+
+class PickleSerializer():
+    """Pickle protocol 5, a compact binary format written in one piece
+
+    Loading only accepts builtin containers and scalars, so a crafted
+    file cannot run code.
+    """
+    name = "pickle"
+    binary = True
+
+    def dumps(self, value):
+        """Returns value encoded as bytes"""
+        return (pickle.dumps(value, protocol=5))
+
+    def loads(self, data):
+        """Returns the value encoded in the bytes data"""
+        return (_Unpickler(io.BytesIO(data)).load())
+
+
+class _Unpickler(pickle.Unpickler):
+    """Unpickler refusing every global"""
+
+    def find_class(self, module, name):
+        """Refuses to load module.name"""
+        raise pickle.UnpicklingError(f"global {module}.{name} is forbidden")
+
+
+decode_errors = (ValueError, EOFError, pickle.UnpicklingError)
+"""Exceptions raised by the serializers for malformed data"""
+
+
+def get_serializer(name):
+    """Returns the serializer called name; orjson falls back to json
+    when it is not installed. Raises ValueError for an unknown name."""
+    if name == "orjson" and orjson is None:
+        name = "json"
+    serializers = {"json": JSONSerializer, "orjson": OrjsonSerializer,
+                   "pickle": PickleSerializer}
+    if name not in serializers:
+        raise ValueError(f"unknown serializer: {name}")
+    return (serializers[name]())
+
+
+def detect(head, default="json"):
+    """Returns the serializer that wrote a file starting with the bytes
+    head: pickle data starts with its PROTO opcode, JSON with text. A
+    JSON file is read with default when that is a JSON serializer."""
+    if head.startswith(b"\x80"):
+        return (get_serializer("pickle"))
+    serializer = get_serializer(default)
+    return (serializer if not serializer.binary else JSONSerializer())
+
+
+def load_file(path, default="json"):
+    """Returns the value stored in the file at path by any serializer"""
+    with open(path, 'rb') as file:
+        data = file.read()
+    return (detect(data[:1], default).loads(data))
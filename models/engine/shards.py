@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+"""
+Module shards
+This module defines the class ShardLayout used by FileStorage to keep
+each class in its own files
+"""
+import os
+import re
+
+
+class ShardLayout():
+    """Names and paths of the shards of a storage file
+
+    The shards of <file> live in the directory <file>.d: one file per
+    class, e.g. Review.json, or when prefix is above 0 one per class
+    and first prefix characters of the id, e.g. Review.3f.json. The
+    name of a shard is its file name without the extension; it starts
+    with the class name, which never contains a dot.
+    """
+    __unsafe = re.compile(r"[^0-9A-Za-z_-]")
+
+    def __init__(self, file_path, prefix=0):
+        """Initializes the layout of the shards of file_path"""
+        self.directory = f"{file_path}.d"
+        self.ext = os.path.splitext(file_path)[1] or ".json"
+        self.prefix = prefix
+
+    def name(self, key):
+        """Returns the name of the shard holding key"""
+        class_name, _, id = key.partition(".")
+        if not self.prefix:
+            return (class_name)
+        part = self.__unsafe.sub("_", id[:self.prefix])
+        return (f"{class_name}.{part.ljust(self.prefix, '_')}")
+
+    def path(self, name):
+        """Returns the path of the shard called name"""
+        return (os.path.join(self.directory, name + self.ext))
+
+    def conforms(self, name):
+        """Returns True if name is a shard name of this layout, and False
+        for a shard written with another prefix"""
+        return (len(name.partition(".")[2]) == self.prefix)
+
+    def existing(self):
+        """Returns the name -> class name of every shard on disk,
+        including those only left as a backup"""
+        try:
+            files = os.listdir(self.directory)
+        except FileNotFoundError:
+            return ({})
+        shards = {}
+        for file_name in files:
+            for suffix in (self.ext, self.ext + ".bak"):
+                if file_name.endswith(suffix):
+                    name = file_name[:-len(suffix)]
+                    shards[name] = name.split(".", 1)[0]
+        return (shards)
@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+"""
+Module sync
+This module defines the class SyncPolicy used by FileStorage to decide
+when written files are forced to disk
+"""
+import os
+import threading
+
+
+class SyncPolicy():
+    """fsync policy applied to the files written by storage
+
+    mode is one of:
+    - "none": nothing is synced, the OS writes the data when it wants;
+    - "always": every written file and its directory entry are synced
+      before the write returns;
+    - "group": written paths are collected and synced together by a
+      timer at most interval milliseconds later, so a burst of saves
+      costs a single fsync per file.
+    """
+    modes = ("none", "always", "group")
+
+    def __init__(self, mode="none", interval=50):
+        """Initializes a policy; raises ValueError for an unknown mode"""
+        if mode not in self.modes:
+            raise ValueError(f"unknown fsync mode: {mode}")
+        self.mode = mode
+        self.interval = interval
+        self.__paths = set()
+        self.__lock = threading.Lock()
+        self.__timer = None
+
+    def file(self, file):
+        """Syncs the content of an open file being written, if "always"
+        """
+        if self.mode == "always":
+            file.flush()
+            os.fsync(file.fileno())
+
+    def written(self, *paths):
+        """Records that the files at paths were written or renamed
+
+        With "always" their directories are synced now, with "group"
+        the files and their directories are synced by the next timer.
+        """
+        if self.mode == "always":
+            for directory in {self.__directory(path) for path in paths}:
+                self.__sync_path(directory)
+        elif self.mode == "group":
+            with self.__lock:
+                self.__paths.update(paths)
+                if self.__timer is None:
+                    self.__timer = threading.Timer(
+                            self.interval / 1000, self.wait)
+                    self.__timer.start()
+
+    def replace(self, tmp_path, path, backup_path=None):
+        """Renames the written file at tmp_path over path
+
+        When backup_path is given, the previous file at path is kept
+        there first, as the last good copy to recover from.
+        """
+        if backup_path is not None and os.path.exists(path):
+            os.replace(path, backup_path)
+        os.replace(tmp_path, path)
+        self.written(path)
+
+    def wait(self):
+        """Syncs the paths collected for the group commit now"""
+        with self.__lock:
+            paths = self.__paths
+            self.__paths = set()
+            timer = self.__timer
+            self.__timer = None
+        if timer is not None and timer is not threading.current_thread():
+            timer.cancel()
+        directories = set()
+        for path in paths:
+            directories.add(self.__directory(path))
+            if os.path.exists(path):
+                self.__sync_path(path)
+        for directory in directories:
+            self.__sync_path(directory)
+
+    @staticmethod
+    def __directory(path):
+        """Returns the directory containing path"""
+        return (os.path.dirname(os.path.abspath(path)))
+
+    @staticmethod
+    def __sync_path(path):
+        """Syncs the file or directory at path"""
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,127 @@
+#!/usr/bin/python3
+"""
+Module text
+This module defines the class TextIndex used by FileStorage to search
+the words of free text attributes
+"""
+import heapq
+import math
+import re
+from collections import Counter
+
+
+class TextIndex():
+    """Inverted index of the words of some text attributes
+
+    Each word maps to the posting list of the objects holding it, with
+    the number of times it appears in them, so a search only reads the
+    postings of its own words. Matches are ranked with BM25: rare words
+    weigh more than common ones, and repeated words in short texts more
+    than in long ones.
+
+    Attributes:
+        attributes (tuple): The names of the indexed attributes.
+    """
+    k1 = 1.2
+    b = 0.75
+    __word = re.compile(r"\w+")
+
+    def __init__(self, *attributes):
+        """Initializes an empty index on attributes"""
+        self.attributes = attributes
+        self.__postings = {}
+        self.__lengths = {}
+        self.__words = {}
+        self.__total = 0
+
+    @classmethod
+    def tokenize(cls, text):
+        """Returns the lowercase words of text"""
+        return (cls.__word.findall(text.casefold()))
+
+    def add(self, key, obj):
+        """Indexes the words of obj, replacing those indexed before"""
+        words = []
+        for attribute in self.attributes:
+            value = getattr(obj, attribute, None)
+            if isinstance(value, str):
+                words += self.tokenize(value)
+        self.__index(key, Counter(words), len(words))
+
+    def remove(self, key):
+        """Removes the object stored under key from the index"""
+        length = self.__lengths.pop(key, None)
+        if length is None:
+            return
+        self.__total -= length
+        for word in self.__words.pop(key):
+            posting = self.__postings[word]
+            del posting[key]
+            if not posting:
+                del self.__postings[word]
+
+    def search(self, text, count=None):
+        """Returns the (score, key) of the objects holding any word of
+        text, best first, at most count of them if given"""
+        if not self.__lengths:
+            return ([])
+        documents = len(self.__lengths)
+        average = self.__total / documents or 1
+        scores = {}
+        for word in set(self.tokenize(text)):
+            posting = self.__postings.get(word, {})
+            idf = math.log(1 + (documents - len(posting) + 0.5) /
+                           (len(posting) + 0.5))
+            for key, frequency in posting.items():
+                norm = 1 - self.b + self.b * self.__lengths[key] / average
+                scores[key] = scores.get(key, 0) + idf * \
+                    frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+        ranked = ((score, key) for key, score in scores.items())
+        if count is None:
+            return (sorted(ranked, key=self.__rank))
+        return (heapq.nsmallest(count, ranked, key=self.__rank))
+
+    def covers(self, keys):
+        """Returns True if every key in keys is indexed"""
+        return (all(key in self.__lengths for key in keys))
+
+    def state(self):
+        """Returns the postings and lengths of the index as a dictionary
+        that can be stored as JSON and given back to load()"""
+        return ({"attributes": list(self.attributes),
+                 "postings": self.__postings, "lengths": self.__lengths})
+
+    def load(self, state):
+        """Adds the objects of a state() not indexed yet"""
+        words = {}
+        for word, posting in state["postings"].items():
+            for key, frequency in posting.items():
+                if key not in self.__lengths:
+                    words.setdefault(key, {})[word] = frequency
+        for key, counts in words.items():
+            self.__index(key, counts, state["lengths"][key])
+
+    def __index(self, key, counts, length):
+        """Stores the word -> frequency counts of key"""
+        self.remove(key)
+        if not length:
+            return
+        postings = self.__postings
+        for word, frequency in counts.items():
+            posting = postings.get(word)
+            if posting is None:
+                postings[word] = {key: frequency}
+            else:
+                posting[key] = frequency
+        self.__words[key] = tuple(counts)
+        self.__lengths[key] = length
+        self.__total += length
+
+    @staticmethod
+    def __rank(match):
+        """Returns the sort key of a (score, key) match, best first"""
+        return (-match[0], match[1])
+
+    def __len__(self):
+        """Returns the number of indexed objects"""
+        return (len(self.__lengths))
@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+"""
+Module integrity
+This module defines the functions that keep the ids the models refer
+to each other with pointing at stored objects. The on_delete policies
+listed in HBNB_ON_DELETE are set when it is loaded.
+"""
+from os import getenv
+import models
+from models.relationship import BelongsTo, ReferencesMany, Relationship
+
+
+def configure(setting):
+    """Sets the on_delete policy of the BelongsTo relationships listed in
+    setting, e.g. "City.state=cascade,Place.user=restrict"
+
+    Raises ValueError for an unknown relationship or policy.
+    """
+    for item in setting.replace(" ", "").split(","):
+        if not item:
+            continue
+        name, _, policy = item.partition("=")
+        class_name, _, attribute = name.partition(".")
+        cls = models.storage.class_map.get(class_name)
+        relationship = getattr(cls, attribute, None)
+        if not isinstance(relationship, BelongsTo):
+            raise ValueError(f"unknown relationship: {name}")
+        if policy == "none":
+            policy = None
+        if policy not in BelongsTo.policies:
+            raise ValueError(f"unknown on_delete policy: {policy}")
+        relationship.on_delete = policy
+
+
+def referrers(class_name):
+    """Returns the BelongsTo relationships whose target is class_name"""
+    return ([relationship
+             for relationships in Relationship.declared.values()
+             for relationship in relationships
+             if isinstance(relationship, BelongsTo) and
+             relationship.target == class_name])
+
+
+def dependents(obj):
+    """Returns the key -> obj of obj and of every object destroying obj
+    destroys, following the cascade relationships through the indexes
+
+    Raises ValueError when a restrict relationship refers to one of
+    them from an object that is not destroyed with it.
+    """
+    storage = models.storage
+    doomed = {f"{obj.__class__.__name__}.{obj.id}": obj}
+    queue = [obj]
+    blockers = []
+    while queue:
+        parent = queue.pop()
+        for relationship in referrers(parent.__class__.__name__):
+            if relationship.on_delete is None:
+                continue
+            children = storage.find(relationship.owner,
+                                    **{relationship.attribute: parent.id})
+            if relationship.on_delete == "restrict":
+                blockers += children.items()
+                continue
+            for key, child in children.items():
+                if key not in doomed:
+                    doomed[key] = child
+                    queue.append(child)
+    for key, blocker in blockers:
+        if key not in doomed:
+            raise ValueError(f"referenced by {key}")
+    return (doomed)
+
+
+def destroy(obj):
+    """Deletes obj and its dependents and saves them in one write;
+    raises ValueError, deleting nothing, when a restrict relationship
+    refers to them"""
+    storage = models.storage
+    doomed = dependents(obj)
+    with storage.batch():
+        for dependent in doomed.values():
+            storage.delete(dependent)
+        storage.save()
+    return (doomed)
+
+
+def check():
+    """Returns the (obj, relationship, id) of every id an object refers
+    to without a stored object, in one pass over the storage; id list
+    attributes holding something else than a list are left alone"""
+    objects = models.storage.all()
+    checks = {}
+    problems = []
+    for obj in objects.values():
+        class_name = obj.__class__.__name__
+        if class_name not in checks:
+            checks[class_name] = [
+                    relationship for relationship in
+                    Relationship.declared.get(class_name, ())
+                    if isinstance(relationship, (BelongsTo, ReferencesMany))]
+        for relationship in checks[class_name]:
+            ids = getattr(obj, relationship.attribute, None)
+            if isinstance(relationship, BelongsTo):
+                ids = (ids,)
+            elif not isinstance(ids, list):
+                continue
+            for id in ids:
+                if id and f"{relationship.target}.{id}" not in objects:
+                    problems.append((obj, relationship, id))
+    return (problems)
+
+
+def repair(problems):
+    """Fixes the problems of check() in one write: destroys the objects
+    whose cascade relationship lost its target, with their dependents,
+    and drops the missing ids from id lists. Returns the number of
+    problems fixed; those of other relationships are left."""
+    storage = models.storage
+    fixed = 0
+    with storage.batch():
+        doomed = {}
+        for obj, relationship, id in problems:
+            if isinstance(relationship, ReferencesMany):
+                ids = getattr(obj, relationship.attribute)
+                if not isinstance(ids, list):
+                    continue
+                setattr(obj, relationship.attribute,
+                        [other for other in ids if other != id])
+            elif relationship.on_delete == "cascade":
+                try:
+                    doomed.update(dependents(obj))
+                except ValueError:
+                    continue
+            else:
+                continue
+            fixed += 1
+        for obj in doomed.values():
+            storage.delete(obj)
+        storage.save()
+    return (fixed)
+
+
+configure(getenv("HBNB_ON_DELETE", ""))
@@ -3,9 +3,11 @@
 Module place
 This module defines the Place class that inherits from BaseModel class
 """
-from models.base_model import BaseModel
+from models.base_model import BaseModel, compact
+from models.relationship import BelongsTo, HasMany, ReferencesMany
 
 
+@compact
 class Place(BaseModel):
     """Represents a place or accommodation in the project application.
 
@@ -21,6 +23,10 @@ class Place(BaseModel):
         latitude (float): Geographical latitude of the place.
         longitude (float): Geographical longitude of the place.
         amenity_ids (list of str): List of amenity IDs available at the place.
+        city (City): The city of the place, or None.
+        user (User): The owner of the place, or None.
+        reviews (list): The reviews of the place.
+        amenities (list): The amenities listed in amenity_ids.
     """
     city_id = ""
     user_id = ""
@@ -33,3 +39,7 @@ class Place(BaseModel):
     latitude = 0.0
     longitude = 0.0
     amenity_ids = []
+    city = BelongsTo("City", "city_id")
+    user = BelongsTo("User", "user_id")
+    reviews = HasMany("Review", "place_id")
+    amenities = ReferencesMany("Amenity", "amenity_ids")
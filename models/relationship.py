@@ -0,0 +1,210 @@
+#!/usr/bin/python3
+"""
+Module relationship
+This module defines the relationship attributes that navigate from a
+model to the objects its ids refer to, or that refer to it
+"""
+import weakref
+import models
+
+
+class Relationship():
+    """Read-only attribute returning the objects related to an instance
+
+    The result of each instance is cached until storage.revision() of
+    a class and attribute it was computed from changes, so reading it
+    again does not look the objects up again. The cache holds instances
+    weakly and the returned lists are copies, so callers can change
+    them freely.
+
+    Attributes:
+        target (str): The name of the class of the related objects.
+        attribute (str): The name of the attribute holding the id or
+            ids that relate the objects.
+        declared (dict): The list of the relationships of each class
+            name, shared by all relationships.
+    """
+    declared = {}
+
+    def __init__(self, target, attribute):
+        """Initializes a relationship to target through attribute"""
+        self.target = target
+        self.attribute = attribute
+        self.owner = None
+        self.name = None
+        self.__cache = weakref.WeakKeyDictionary()
+
+    def __set_name__(self, owner, name):
+        """Records the name of the class the relationship belongs to"""
+        self.owner = owner.__name__
+        self.name = name
+        Relationship.declared.setdefault(self.owner, []).append(self)
+
+    def __get__(self, obj, owner=None):
+        """Returns the related objects of obj, or the relationship
+        itself when read from the class"""
+        if obj is None:
+            return (self)
+        stamp = self.stamp(obj)
+        cached = self.__cache.get(obj)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, self.load(obj))
+            self.__cache[obj] = cached
+        return (self.result(cached[1]))
+
+    def related_class(self):
+        """Returns the name of the class of the related objects"""
+        return (self.target)
+
+    def depends(self):
+        """Returns the (class name, attribute) pairs whose changes can
+        change the result; attribute None stands for created and
+        deleted objects"""
+        raise NotImplementedError
+
+    def stamp(self, obj):
+        """Returns a value that changes whenever the result for obj can"""
+        storage = models.storage
+        return (obj.id, tuple(storage.revision(class_name, attribute)
+                              for class_name, attribute in self.depends()))
+
+    def load(self, obj):
+        """Returns the tuple of the objects related to obj"""
+        raise NotImplementedError
+
+    def result(self, objects):
+        """Returns the value of the attribute for a tuple of objects"""
+        return (list(objects))
+
+
+class BelongsTo(Relationship):
+    """The object whose id is the value of attribute, or None
+
+    on_delete is what destroying the object does to the instances
+    referring to it (see models.integrity): None leaves them, "cascade"
+    destroys them too and "restrict" refuses to destroy it. The models
+    declare no policy; see models.integrity.configure() to set them.
+
+        Ex: City.state = BelongsTo("State", "state_id")
+    """
+    policies = (None, "cascade", "restrict")
+
+    def __init__(self, target, attribute, on_delete=None):
+        """Initializes a relationship to target through attribute;
+        raises ValueError for an unknown on_delete policy"""
+        if on_delete not in self.policies:
+            raise ValueError(f"unknown on_delete policy: {on_delete}")
+        super().__init__(target, attribute)
+        self.on_delete = on_delete
+
+    def depends(self):
+        """Returns the id attribute and the objects of target"""
+        return ([(self.owner, self.attribute), (self.target, None)])
+
+    def stamp(self, obj):
+        """Returns the id and the revision of target"""
+        return (getattr(obj, self.attribute, None),
+                models.storage.revision(self.target))
+
+    def load(self, obj):
+        """Returns the object whose id is the value of attribute"""
+        id = getattr(obj, self.attribute, None)
+        if not isinstance(id, str) or not id:
+            return (())
+        related = models.storage.get(self.target, id)
+        return (() if related is None else (related,))
+
+    def result(self, objects):
+        """Returns the object, or None"""
+        return (objects[0] if objects else None)
+
+
+class HasMany(Relationship):
+    """The objects of target whose attribute holds the id of the instance,
+    found through the index of that attribute
+
+        Ex: State.cities = HasMany("City", "state_id")
+    """
+
+    def depends(self):
+        """Returns the attribute and the objects of target"""
+        return ([(self.target, self.attribute)])
+
+    def load(self, obj):
+        """Returns the objects of target referring to obj"""
+        return (tuple(models.storage.find(
+                self.target, **{self.attribute: obj.id}).values()))
+
+
+class ReferencesMany(Relationship):
+    """The objects whose ids are listed in attribute, skipping missing
+    ones
+
+        Ex: Place.amenities = ReferencesMany("Amenity", "amenity_ids")
+    """
+
+    def depends(self):
+        """Returns the id list attribute and the objects of target"""
+        return ([(self.owner, self.attribute), (self.target, None)])
+
+    def stamp(self, obj):
+        """Returns the listed ids and the revision of target, so that a
+        list changed in place is noticed too"""
+        return (tuple(getattr(obj, self.attribute, None) or ()),
+                models.storage.revision(self.target))
+
+    def load(self, obj):
+        """Returns the objects whose ids are listed in attribute"""
+        objects = []
+        for id in getattr(obj, self.attribute, None) or ():
+            related = models.storage.get(self.target, id)
+            if related is not None:
+                objects.append(related)
+        return (tuple(objects))
+
+
+class Through(Relationship):
+    """The objects reached by following a relationship of the instance,
+    then a relationship of each object it returns, without duplicates
+
+        Ex: State.places = Through("cities", "places")
+    """
+
+    def __init__(self, first, second):
+        """Initializes the chain of the relationships named first, on
+        the instance, and second, on the objects first returns"""
+        super().__init__(None, None)
+        self.first = first
+        self.second = second
+
+    def hops(self):
+        """Returns the two relationships of the chain"""
+        storage = models.storage
+        first = getattr(storage.class_map[self.owner], self.first)
+        second = getattr(storage.class_map[first.related_class()],
+                         self.second)
+        return (first, second)
+
+    def related_class(self):
+        """Returns the class of the objects of the second relationship"""
+        return (self.hops()[1].related_class())
+
+    def depends(self):
+        """Returns what both relationships depend on"""
+        first, second = self.hops()
+        return (first.depends() + second.depends())
+
+    def load(self, obj):
+        """Returns the objects of the second relationship of each object
+        of the first one"""
+        first, second = self.hops()
+        related = first.__get__(obj)
+        if not isinstance(related, list):
+            related = [] if related is None else [related]
+        objects = {}
+        for middle in related:
+            value = second.__get__(middle)
+            if not isinstance(value, list):
+                value = [] if value is None else [value]
+            objects.update(dict.fromkeys(value))
+        return (tuple(objects))
@@ -3,9 +3,11 @@
 Module review
 This module defines the Review class that inherits from BaseModel class
 """
-from models.base_model import BaseModel
+from models.base_model import BaseModel, compact
+from models.relationship import BelongsTo
 
 
+@compact
 class Review(BaseModel):
     """Represents a review left by a user for a place.
 
@@ -13,7 +15,11 @@ class Review(BaseModel):
         place_id (str): The ID of the place being reviewed.
         user_id (str): The ID of the user who created the review.
         text (str): The text content of the review.
+        place (Place): The reviewed place, or None.
+        user (User): The author of the review, or None.
     """
     place_id = ""
     user_id = ""
     text = ""
+    place = BelongsTo("Place", "place_id")
+    user = BelongsTo("User", "user_id")
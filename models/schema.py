@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+"""
+Module schema
+This module defines the class Schema that converts attribute values to
+the types the models declare
+"""
+import ast
+
+
+def to_int(value):
+    """Returns value as an int; strings are parsed, and floats and
+    strings holding a whole number are accepted"""
+    if isinstance(value, str):
+        try:
+            return (int(value))
+        except ValueError:
+            value = float(value)
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"{value} is not a whole number")
+        return (int(value))
+    if isinstance(value, int):
+        return (int(value))
+    raise ValueError(f"{value!r} is not a number")
+
+
+def to_float(value):
+    """Returns value as a float; strings are parsed"""
+    if isinstance(value, (str, int, float)):
+        return (float(value))
+    raise ValueError(f"{value!r} is not a number")
+
+
+def to_str(value):
+    """Returns value as a str; numbers are formatted"""
+    if isinstance(value, (str, int, float)):
+        return (str(value))
+    raise ValueError(f"{value!r} is not a string")
+
+
+def to_list(value):
+    """Returns value as a list; strings holding a list are parsed"""
+    if isinstance(value, str):
+        try:
+            value = ast.literal_eval(value)
+        except (SyntaxError, ValueError):
+            raise ValueError(f"{value!r} is not a list") from None
+    if isinstance(value, (list, tuple)):
+        return (list(value))
+    raise ValueError(f"{value!r} is not a list")
+
+
+class Schema():
+    """The types of the attributes a model class declares
+
+    The str, int, float and list class attributes of the class and of
+    its bases give the type of each attribute, e.g. Place.max_guest is
+    an int. The schema of a class is compiled once into a table of
+    attribute -> (type, converter), so converting a value costs a dict
+    lookup, and nothing more when it already has the right type.
+    Attributes the class does not declare are left as they are.
+
+    Attributes:
+        types (dict): The type of each declared attribute.
+    """
+    converters = {int: to_int, float: to_float, str: to_str, list: to_list}
+    __compiled = {}
+
+    def __init__(self, cls):
+        """Compiles the schema of the model class cls"""
+        self.types = {}
+        for klass in reversed(cls.__mro__):
+            for name, value in vars(klass).items():
+                if not name.startswith("_") and \
+                        type(value) in self.converters:
+                    self.types[name] = type(value)
+        self.__table = {name: (kind, self.converters[kind])
+                        for name, kind in self.types.items()}
+
+    @classmethod
+    def of(cls, model):
+        """Returns the schema of the model class, compiling it once"""
+        schema = cls.__compiled.get(model)
+        if schema is None:
+            schema = cls.__compiled[model] = cls(model)
+        return (schema)
+
+    def coerce(self, name, value, current=None):
+        """Returns value converted to the type of the attribute name
+
+        An attribute the class does not declare is converted to the
+        type of its current value when that is given, and otherwise
+        left as it is. Raises ValueError when value cannot be converted.
+        """
+        entry = self.__table.get(name)
+        if entry is None:
+            converter = self.converters.get(type(current))
+            return (value if converter is None else converter(value))
+        if type(value) is entry[0]:
+            return (value)
+        return (entry[1](value))
+
+    def coerce_dict(self, attributes):
+        """Returns a copy of the dictionary attributes with the declared
+        attributes converted; raises ValueError like coerce()"""
+        return ({name: self.coerce(name, value)
+                 for name, value in attributes.items()})
+
+    def load(self, name, value):
+        """Returns value converted like coerce(), or unchanged when it
+        cannot be, so that stored objects always load"""
+        entry = self.__table.get(name)
+        if entry is None or type(value) is entry[0]:
+            return (value)
+        try:
+            return (entry[1](value))
+        except ValueError:
+            return (value)
@@ -3,13 +3,21 @@
 Module state
 This module defines the State class that inherits from BaseModel class
 """
-from models.base_model import BaseModel
+from models.base_model import BaseModel, compact
+from models.relationship import HasMany, Through
 
 
+@compact
 class State(BaseModel):
     """Classifies the State object, representing a state or region.
 
         Attributes:
             name (str): The name of the state.
+            cities (list): The cities of the state.
+            places (list): The places in the cities of the state.
+            reviews (list): The reviews of the places of the state.
     """
     name = ""
+    cities = HasMany("City", "state_id")
+    places = Through("cities", "places")
+    reviews = Through("places", "reviews")
@@ -4,15 +4,19 @@ Module user
 This module defines the User class
 User class inherits from BaseModel class
 """
-from models.base_model import BaseModel
+from models.base_model import BaseModel, compact
+from models.relationship import HasMany
 
 
+@compact
 class User(BaseModel):
     """Difines essential users attributes"""
     email = ""
     password = ""
     first_name = ""
     last_name = ""
+    places = HasMany("Place", "user_id")
+    reviews = HasMany("Review", "user_id")
 
     def __init__(self, *args, **kwargs):
         """Initialize User instance attributes"""
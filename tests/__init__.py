@@ -0,0 +1,14 @@
+#!/usr/bin/python3
+"""
+Package tests
+Runs the tests from a temporary directory, so that the snapshots,
+backups and other files they save are removed once they are done
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+_directory = tempfile.mkdtemp(prefix="hbnb-tests-")
+os.chdir(_directory)
+atexit.register(shutil.rmtree, _directory, True)
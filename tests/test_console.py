@@ -13,12 +13,17 @@ Features Tested:
 - Error handling and edge cases.
 """
 import unittest
+import os
+import json
 from unittest.mock import patch
 from io import StringIO
 from console import HBNBCommand
 from models import storage
+from models import integrity
 from models.base_model import BaseModel
 from models.user import User
+from models.place import Place
+from models.review import Review
 
 
 class TestConsole(unittest.TestCase):
@@ -123,6 +128,90 @@ class TestConsole(unittest.TestCase):
             HBNBCommand().onecmd(f"destroy BaseModel {instance.id}")
             self.assertNotIn(key, storage.all())
 
+    def test_update_converts_types(self):
+        """Test that both update syntaxes store the declared types."""
+        place = Place()
+        with patch('sys.stdout', new=StringIO()):
+            HBNBCommand().onecmd(f'Place.update({place.id}, "max_guest", '
+                                 '"4")')
+            HBNBCommand().onecmd(f'Place.update({place.id}, '
+                                 '{"latitude": "6.5", "number_rooms": 2.0})')
+            HBNBCommand().onecmd(f'update Place {place.id} price_by_night 90')
+        self.assertEqual((place.max_guest, place.latitude,
+                          place.number_rooms, place.price_by_night),
+                         (4, 6.5, 2, 90))
+        self.assertIsInstance(place.number_rooms, int)
+        storage.delete(place)
+
+    def test_update_invalid_type(self):
+        """Test that values of the wrong type are refused."""
+        place = Place()
+        for line in (f"update Place {place.id} max_guest many",
+                     f'Place.update({place.id}, "latitude", "north")',
+                     f'Place.update({place.id}, {{"max_guest": 2.5}})'):
+            with patch('sys.stdout', new=StringIO()) as f:
+                HBNBCommand().onecmd(line)
+                self.assertIn("** invalid value type **", f.getvalue())
+        self.assertEqual((place.max_guest, place.latitude), (0, 0.0))
+        storage.delete(place)
+
+    def test_update_protected_attributes(self):
+        """Test that no update syntax changes the id or the dates."""
+        place = Place()
+        created_at = place.created_at
+        for line in (f"update Place {place.id} created_at 2020-01-01",
+                     f'Place.update({place.id}, "id", "other")',
+                     f'Place.update({place.id}, {{"created_at": '
+                     '"2020-01-01", "name": "Loft"})'):
+            with patch('sys.stdout', new=StringIO()) as f:
+                HBNBCommand().onecmd(line)
+                self.assertIn("** attribute cannot be updated **",
+                              f.getvalue())
+        self.assertEqual(place.created_at, created_at)
+        self.assertEqual(place.name, "")
+        self.assertIs(storage.get(Place, place.id), place)
+        storage.delete(place)
+
+    def test_destroy_cascade_and_restrict(self):
+        """Test destroy command with cascade and restrict relationships."""
+        self.addCleanup(setattr, Place.user, "on_delete", None)
+        self.addCleanup(setattr, Review.place, "on_delete", None)
+        integrity.configure("Place.user=restrict,Review.place=cascade")
+        user = User()
+        place = Place()
+        place.user_id = user.id
+        review = Review()
+        review.place_id = place.id
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd(f"destroy User {user.id}")
+            self.assertIn(f"** instance is referenced by Place.{place.id} **",
+                          f.getvalue())
+        self.assertIs(storage.get(User, user.id), user)
+        with patch('sys.stdout', new=StringIO()):
+            HBNBCommand().onecmd(f"Place.destroy({place.id})")
+            HBNBCommand().onecmd(f"destroy User {user.id}")
+        for obj in (user, place, review):
+            self.assertIsNone(storage.get(obj.__class__, obj.id))
+
+    def test_fsck(self):
+        """Test fsck command and its repair option."""
+        self.addCleanup(setattr, Review.place, "on_delete", None)
+        integrity.configure("Review.place=cascade")
+        review = Review()
+        review.place_id = "fsck-missing"
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("fsck")
+            self.assertIn(f"Review.{review.id}.place_id -> "
+                          "Place.fsck-missing", f.getvalue())
+        self.assertIs(storage.get(Review, review.id), review)
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("fsck repair")
+            self.assertIn("repaired", f.getvalue())
+        self.assertIsNone(storage.get(Review, review.id))
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("fsck everything")
+            self.assertIn("** invalid fsck format **", f.getvalue())
+
     """def test_all_no_args(self):
         # Test all command with no arguments.
         with patch('sys.stdout', new=StringIO()) as f:
@@ -141,6 +230,269 @@ class TestConsole(unittest.TestCase):
             HBNBCommand().onecmd("all BaseModel")
             self.assertIn("[", f.getvalue())
 
+    def test_count_valid_class(self):
+        """Test count command matches the number of stored instances."""
+        User().save()
+        expected = len([key for key in storage.all()
+                        if key.startswith("User.")])
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("User.count()")
+            self.assertEqual(f.getvalue().strip(), str(expected))
+
+    def test_where_by_attribute(self):
+        """Test where command lists the matching instances."""
+        user = User()
+        user.first_name = "Ada"
+        other = User()
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('User.where(first_name="Ada")')
+            self.assertIn(user.id, f.getvalue())
+            self.assertNotIn(other.id, f.getvalue())
+
+    def test_where_invalid_filter(self):
+        """Test where command with a malformed filter."""
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('User.where(first_name)')
+            self.assertIn("** invalid filter format **", f.getvalue())
+
+    def test_where_query(self):
+        """Test where command with comparisons, order, limit and select."""
+        city_id = f"city-{id(self)}"
+        places = []
+        for price in (150, 50, 90):
+            place = Place()
+            place.city_id = city_id
+            place.price_by_night = price
+            places.append(place)
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd(
+                    f'Place.where(city_id=="{city_id}", price_by_night<100)'
+                    '.order_by("-price_by_night").limit(1).select("id")')
+            self.assertEqual(f.getvalue().strip(),
+                             str([{"id": places[2].id}]))
+        for place in places:
+            storage.delete(place)
+
+    def test_where_invalid_query(self):
+        """Test where command with an unknown chained method."""
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('Place.where(max_guest>2).group_by("x")')
+            self.assertIn("** invalid filter format **", f.getvalue())
+
+    def test_near(self):
+        """Test near command with a radius and with a count."""
+        place = Place()
+        place.latitude = -89.5
+        place.longitude = 12.0
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("near Place -89.5 12.0 1")
+            self.assertIn(place.id, f.getvalue())
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("Place.near(-89.6, 12.0, *, 1)")
+            self.assertIn("(11.", f.getvalue())
+        storage.delete(place)
+
+    def test_near_invalid(self):
+        """Test near command with missing or invalid values."""
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("near Place 6.4")
+            self.assertIn("** coordinates and radius missing **",
+                          f.getvalue())
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("near Place north 3 10")
+            self.assertIn("** invalid value type **", f.getvalue())
+        for line in ("near Place 6.4 3.3 * -1", "near Place 6.4 3.3 -5",
+                     "Place.near(6.4, 3.3, 10, -2)", "near Place 0 0 nan",
+                     "near Place nan 0 5", "near Place 0 inf * 2",
+                     "near Place 0 0 -inf"):
+            with patch('sys.stdout', new=StringIO()) as f:
+                HBNBCommand().onecmd(line)
+                self.assertEqual(f.getvalue().strip(),
+                                 "** invalid value type **")
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("near User 6.4 3.3 10")
+            self.assertIn("** class has no spatial index **", f.getvalue())
+
+    def test_search(self):
+        """Test search command and its dot notation."""
+        review = Review()
+        review.text = "Flawless gazebo"
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("search Review gazebo")
+            self.assertIn(review.id, f.getvalue())
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('Review.search("flawless", 1)')
+            self.assertIn(review.id, f.getvalue())
+        storage.delete(review)
+
+    def test_search_invalid(self):
+        """Test search command with missing or invalid arguments."""
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("search Review")
+            self.assertIn("** search text missing **", f.getvalue())
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("Review.search(gazebo)")
+            self.assertIn("** invalid search format **", f.getvalue())
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("search State gazebo")
+            self.assertIn("** class has no text index **", f.getvalue())
+
+    def test_stats(self):
+        """Test stats command and its dot notation."""
+        place = Place()
+        place.city_id = "stats-console"
+        place.price_by_night = 42
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("stats Place price_by_night by city_id")
+            self.assertIn("'stats-console': {'count': 1, 'sum': 42",
+                          f.getvalue())
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd('Place.stats(by="city_id")')
+            self.assertIn("'stats-console': {'count': 1}", f.getvalue())
+        storage.delete(place)
+
+    def test_stats_invalid(self):
+        """Test stats command with invalid arguments."""
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("stats Place a b")
+            self.assertIn("** invalid stats format **", f.getvalue())
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("Place.stats(price_by_night)")
+            self.assertIn("** invalid stats format **", f.getvalue())
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("stats Town")
+            self.assertIn("** class doesn't exist **", f.getvalue())
+
+    def test_begin_commit_writes_once(self):
+        """Test that commands between begin and commit save once."""
+        console = HBNBCommand()
+        with patch('sys.stdout', new=StringIO()), \
+                patch.object(type(storage), "flush") as flush:
+            console.onecmd("begin")
+            console.onecmd("create User")
+            console.onecmd("create Place")
+            flush.assert_not_called()
+            console.onecmd("commit")
+        flush.assert_called_once_with()
+
+    def test_commit_without_begin(self):
+        """Test commit command outside of a batch."""
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("commit")
+            self.assertIn("** no batch in progress **", f.getvalue())
+
+    def test_quit_commits_open_batch(self):
+        """Test that quit writes the changes of an open batch."""
+        console = HBNBCommand()
+        with patch('sys.stdout', new=StringIO()), \
+                patch.object(type(storage), "flush") as flush:
+            console.onecmd("begin")
+            console.onecmd("create User")
+            console.onecmd("quit")
+        flush.assert_called_once_with()
+
+    def test_quit_closes_storage(self):
+        """Test that quit and EOF write the saves still pending."""
+        for command in ("quit", "EOF"):
+            with patch('sys.stdout', new=StringIO()), \
+                    patch.object(type(storage), "close") as close:
+                HBNBCommand().onecmd(command)
+            close.assert_called_once_with()
+
+    def test_read_only_refuses_changes(self):
+        """Test that changes are refused when the storage is read-only."""
+        user = User()
+        count = storage.count()
+        with patch.object(storage, "read_only", True, create=True):
+            for command in ("create State", f"destroy User {user.id}",
+                            f'update User {user.id} first_name "Ada"',
+                            f'User.update("{user.id}", "first_name", "A")'):
+                with patch('sys.stdout', new=StringIO()) as f:
+                    HBNBCommand().onecmd(command)
+                    self.assertEqual(f.getvalue().strip(),
+                                     "** storage is read-only **")
+        self.assertEqual(storage.count(), count)
+        self.assertEqual(user.first_name, "")
+        storage.delete(user)
+
+    def test_export_then_import(self):
+        """Test that exported records can be imported back."""
+        user = User()
+        user.first_name = "Ada"
+        user.save()
+        test_file = "test_export.ndjson"
+        self.addCleanup(os.remove, test_file)
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd(f"export User {test_file}")
+            self.assertEqual(f.getvalue().strip(), str(storage.count(User)))
+
+        storage.delete(user)
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd(f"import {test_file}")
+        imported = storage.get(User, user.id)
+        self.assertEqual(imported.to_dict(), user.to_dict())
+
+    def test_import_skips_invalid_records(self):
+        """Test that import reports bad lines and keeps the good ones."""
+        test_file = "test_import.ndjson"
+        self.addCleanup(os.remove, test_file)
+        with open(test_file, "w") as file:
+            file.write(json.dumps({"__class__": "State", "id": "imp-1"}))
+            file.write("\nnot json\n")
+            file.write(json.dumps({"__class__": "Nope", "id": "imp-2"}))
+            file.write("\n")
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd(f"import {test_file}")
+            output = f.getvalue()
+        self.assertIn("** invalid record on line 2 **", output)
+        self.assertIn("** invalid record on line 3 **", output)
+        self.assertTrue(output.endswith("1\n"))
+        self.assertIsNotNone(storage.get("State", "imp-1"))
+
+    def test_import_flushes_once(self):
+        """Test that an import is written by a single flush."""
+        test_file = "test_import.ndjson"
+        self.addCleanup(os.remove, test_file)
+        with open(test_file, "w") as file:
+            for i in range(5):
+                file.write(json.dumps({"__class__": "City"}) + "\n")
+        with patch('sys.stdout', new=StringIO()), \
+                patch.object(type(storage), "flush") as flush:
+            HBNBCommand().onecmd(f"import {test_file}")
+        flush.assert_called_once_with()
+
+    def test_import_converts_types(self):
+        """Test that import converts values and rejects wrong types."""
+        test_file = "test_import.ndjson"
+        self.addCleanup(os.remove, test_file)
+        with open(test_file, "w") as file:
+            file.write(json.dumps({"__class__": "Place", "id": "imp-3",
+                                   "max_guest": "4", "latitude": 6}))
+            file.write("\n")
+            file.write(json.dumps({"__class__": "Place", "id": "imp-4",
+                                   "max_guest": "four"}))
+            file.write("\n")
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd(f"import {test_file}")
+            self.assertIn("** invalid record on line 2 **", f.getvalue())
+        place = storage.get("Place", "imp-3")
+        self.assertEqual((place.max_guest, place.latitude), (4, 6.0))
+        self.assertIsInstance(place.latitude, float)
+        self.assertIsNone(storage.get("Place", "imp-4"))
+        storage.delete(place)
+
+    def test_import_missing_file(self):
+        """Test import with a file that does not exist."""
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("import no_such_file.ndjson")
+            self.assertIn("** file doesn't exist **", f.getvalue())
+
+    def test_export_missing_file_name(self):
+        """Test export without a file name."""
+        with patch('sys.stdout', new=StringIO()) as f:
+            HBNBCommand().onecmd("export User")
+            self.assertIn("** file name missing **", f.getvalue())
+
     def test_update_no_args(self):
         """Test update command with no arguments."""
         with patch('sys.stdout', new=StringIO()) as f:
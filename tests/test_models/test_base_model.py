@@ -6,11 +6,15 @@ Contains the test cases:
     TestBaseModelStr
     TestBaseModelSave
     TestBaseModelToDict
+    TestCompactModel
 """
+import os
 import unittest
+from unittest.mock import patch
 from datetime import datetime, timedelta
 from uuid import UUID
-from models.base_model import BaseModel
+from models.base_model import BaseModel, compact
+from models.place import Place
 import time
 
 
@@ -168,6 +172,108 @@ class TestBaseModelEdgeCases(unittest.TestCase):
         self.assertEqual(model_dict["attr_99"], 99)
         self.assertEqual(len(model_dict), 104)
 
+    def test_kwargs_equal_timestamps_are_shared(self):
+        """Test that equal created_at and updated_at are parsed once."""
+        now = datetime.now().isoformat()
+        model = BaseModel(id="1234", created_at=now, updated_at=now)
+        self.assertIs(model.created_at, model.updated_at)
+        self.assertEqual(model.to_dict()["updated_at"], now)
+        model.updated_at = datetime.now()
+        self.assertIsNot(model.created_at, model.updated_at)
+
+    def test_kwargs_different_timestamps(self):
+        """Test that different timestamps round trip through to_dict."""
+        kwargs = {
+            "id": "1234", "created_at": "2024-01-02T03:04:05.000006",
+            "updated_at": "2024-02-03T04:05:06.000007"
+        }
+        model_dict = BaseModel(**kwargs).to_dict()
+        self.assertEqual(model_dict["created_at"], kwargs["created_at"])
+        self.assertEqual(model_dict["updated_at"], kwargs["updated_at"])
+
+    def test_kwargs_missing_fields_are_generated(self):
+        """Test that a missing id or timestamp is still generated."""
+        model = BaseModel(name="test")
+        self.assertIsInstance(model.id, str)
+        self.assertIsInstance(model.created_at, datetime)
+        self.assertIsInstance(model.updated_at, datetime)
+        self.assertEqual(list(model.__dict__)[:3],
+                         ["id", "created_at", "updated_at"])
+
+
+class TestCompactModel(unittest.TestCase):
+    """Tests the compact slots representation of the models."""
+
+    def setUp(self):
+        """Build a compact Place class."""
+        with patch.dict(os.environ, {"HBNB_COMPACT_MODELS": "1"}):
+            self.CompactPlace = compact(Place)
+        self.kwargs = {
+            "id": "1234", "created_at": datetime.now().isoformat(),
+            "updated_at": datetime.now().isoformat(),
+            "city_id": "city-1", "name": "Loft", "max_guest": 4
+        }
+
+    def test_disabled_by_default(self):
+        """Test that compact returns the class unchanged when off."""
+        with patch.dict(os.environ, {"HBNB_COMPACT_MODELS": "0"}):
+            self.assertIs(compact(BaseModel), BaseModel)
+
+    def test_is_a_place(self):
+        """Test that the compact class keeps the name and base class."""
+        place = self.CompactPlace(**self.kwargs)
+        self.assertIsInstance(place, Place)
+        self.assertEqual(type(place).__name__, "Place")
+
+    def test_schema_attributes_use_slots(self):
+        """Test that schema attributes are stored in slots."""
+        self.assertIn("max_guest", self.CompactPlace.__slots__)
+        place = self.CompactPlace(**self.kwargs)
+        self.assertEqual(vars(BaseModel)["__dict__"].__get__(place), {})
+        self.assertEqual(place.max_guest, 4)
+
+    def test_unset_attribute_returns_default(self):
+        """Test that unset schema attributes read the class default."""
+        place = self.CompactPlace(**self.kwargs)
+        self.assertEqual(place.description, "")
+        self.assertEqual(place.price_by_night, 0)
+        with self.assertRaises(AttributeError):
+            place.not_an_attribute
+
+    def test_list_default_is_not_shared(self):
+        """Test that each instance gets its own amenity_ids list."""
+        place = self.CompactPlace(**self.kwargs)
+        place.amenity_ids.append("wifi")
+        other = self.CompactPlace(**self.kwargs)
+        self.assertEqual(other.amenity_ids, [])
+        self.assertEqual(place.amenity_ids, ["wifi"])
+
+    def test_dynamic_attributes(self):
+        """Test that attributes outside the schema are kept."""
+        place = self.CompactPlace(**self.kwargs)
+        place.pets = True
+        self.assertTrue(place.pets)
+        self.assertTrue(place.to_dict()["pets"])
+
+    def test_same_output_as_regular_class(self):
+        """Test that to_dict and __str__ match the regular class."""
+        regular = Place(**self.kwargs)
+        place = self.CompactPlace(**self.kwargs)
+        self.assertEqual(place.to_dict(), regular.to_dict())
+        self.assertEqual(str(place), str(regular))
+
+    def test_attributes_keep_insertion_order(self):
+        """Test that attributes show in the order they were set."""
+        regular = Place(**self.kwargs)
+        place = self.CompactPlace(**self.kwargs)
+        for obj in (regular, place):
+            obj.pets = True
+            obj.latitude = 6.5
+            obj.description = "Quiet"
+        self.assertEqual(list(place.to_dict()), list(regular.to_dict()))
+        self.assertEqual(str(place), str(regular))
+        self.assertEqual(place.__dict__, regular.__dict__)
+
 
 if __name__ == "__main__":
     unittest.main()
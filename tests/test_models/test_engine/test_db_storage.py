@@ -0,0 +1,311 @@
+#!/usr/bin/python3
+"""
+Unittest for DBStorage class in module models.engine.db_storage
+This test module defines the test class TestDBStorage
+"""
+import unittest
+import os
+from models.base_model import BaseModel
+from models.user import User
+from models.state import State
+from models.city import City
+from models.place import Place
+from models.review import Review
+from models.engine.db_storage import DBStorage
+from models.engine.file_storage import FileStorage
+from models.engine.query import Query
+
+
+class TestDBStorage(unittest.TestCase):
+    """Tests the DBStorage class"""
+
+    def setUp(self):
+        """Set up a storage on an empty database"""
+        self.test_file = "test_file.db"
+        self.storage = DBStorage(self.test_file)
+        self.storage.reload()
+
+    def tearDown(self):
+        """Close the database and remove it"""
+        self.storage.disconnect()
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+
+    def reopen(self):
+        """Closes the storage and opens the database again"""
+        self.storage.disconnect()
+        self.storage = DBStorage(self.test_file)
+        self.storage.reload()
+
+    def test_new_and_save_persist(self):
+        """Test that saved objects survive reopening the database"""
+        user = User()
+        user.email = "ada@mail.com"
+        self.storage.new(user)
+        self.storage.save()
+        self.reopen()
+
+        loaded = self.storage.get(User, user.id)
+        self.assertIsNot(loaded, user)
+        self.assertEqual(loaded.to_dict(), user.to_dict())
+
+    def test_close_keeps_storage_usable(self):
+        """Test that close commits and later calls still work"""
+        state = State()
+        self.storage.new(state)
+        self.assertEqual(self.storage.count(State), 1)
+        self.storage.close()
+        self.assertIs(self.storage.get(State, state.id), state)
+        self.reopen()
+        self.assertEqual(self.storage.count(State), 1)
+
+    def test_unsaved_objects_are_discarded(self):
+        """Test that reload drops the uncommitted changes"""
+        self.storage.new(State())
+        self.reopen()
+        self.assertEqual(self.storage.count(State), 0)
+
+    def test_all_and_count(self):
+        """Test all and count with and without a class"""
+        for obj in (State(), State(), City()):
+            self.storage.new(obj)
+        self.storage.save()
+        self.assertEqual(len(self.storage.all(State)), 2)
+        self.assertEqual(len(self.storage.all("City")), 1)
+        self.assertEqual(len(self.storage.all()), 3)
+        self.assertEqual(self.storage.count(State), 2)
+        self.assertEqual(self.storage.count(), 3)
+
+    def test_get_returns_same_instance(self):
+        """Test that a row is always the same object"""
+        self.storage.new(BaseModel())
+        self.storage.save()
+        self.reopen()
+        obj = next(iter(self.storage.all(BaseModel).values()))
+        self.assertIs(self.storage.get(BaseModel, obj.id), obj)
+        self.assertIsNone(self.storage.get(BaseModel, "1234"))
+
+    def test_delete(self):
+        """Test that deleted objects are removed from the table"""
+        city = City()
+        self.storage.new(city)
+        self.storage.save()
+        self.storage.delete(city)
+        self.storage.save()
+        self.assertIsNone(self.storage.get(City, city.id))
+        self.assertEqual(self.storage.count(City), 0)
+
+    def test_find(self):
+        """Test finding rows by column and by extra attribute"""
+        review = Review()
+        review.place_id = "place-1"
+        review.mood = "happy"
+        other = Review()
+        other.place_id = "place-2"
+        self.storage.new(review)
+        self.storage.new(other)
+        self.storage.save()
+        self.reopen()
+
+        found = self.storage.find(Review, place_id="place-1")
+        self.assertEqual(list(found), [f"Review.{review.id}"])
+        found = self.storage.find(Review, mood="happy")
+        self.assertEqual(list(found), [f"Review.{review.id}"])
+
+    def test_extra_attributes_round_trip(self):
+        """Test that attributes without a column are kept"""
+        place = Place()
+        place.amenity_ids = ["wifi", "pool"]
+        place.max_guest = 4
+        place.latitude = 6.5
+        self.storage.new(place)
+        self.storage.save()
+        self.reopen()
+
+        loaded = self.storage.get(Place, place.id)
+        self.assertEqual(loaded.amenity_ids, ["wifi", "pool"])
+        self.assertEqual(loaded.max_guest, 4)
+        self.assertEqual(loaded.latitude, 6.5)
+        self.assertEqual(loaded.name, "")
+
+    def test_touch_marks_loaded_object(self):
+        """Test that changes to loaded objects are written on save"""
+        state = State()
+        self.storage.new(state)
+        self.storage.save()
+        state.name = "Lagos"
+        self.storage.touch(state, "name")
+        self.assertEqual(self.storage.dirty(state), {"name"})
+        self.storage.save()
+        self.reopen()
+        self.assertEqual(self.storage.get(State, state.id).name, "Lagos")
+
+    def test_refresh_reads_rows_again(self):
+        """Test that refresh drops the clean objects only"""
+        state = State()
+        self.storage.new(state)
+        self.storage.save()
+        other = DBStorage(self.test_file)
+        other.reload()
+        other.get(State, state.id).name = "Lagos"
+        other.touch(other.get(State, state.id), "name")
+        other.save()
+        other.disconnect()
+
+        changed = City()
+        self.storage.new(changed)
+        self.storage.refresh()
+        self.assertEqual(self.storage.get(State, state.id).name, "Lagos")
+        self.assertIs(self.storage.get(City, changed.id), changed)
+
+    def test_reload_classes_reads_their_rows_again(self):
+        """Test that reload with classes only forgets their objects"""
+        state = State()
+        city = City()
+        for obj in (state, city):
+            self.storage.new(obj)
+        self.storage.save()
+        self.storage.reload([State])
+        self.assertIsNot(self.storage.get(State, state.id), state)
+        self.assertIs(self.storage.get(City, city.id), city)
+
+    def test_query(self):
+        """Test a query mixing SQL and Python conditions"""
+        places = [Place(), Place(), Place()]
+        for price, place in zip((90, 30, 60), places):
+            place.city_id = "city-1"
+            place.price_by_night = price
+            self.storage.new(place)
+        self.storage.save()
+        self.reopen()
+        query = Query(Place).where(("price_by_night", ">", 40),
+                                   city_id="city-1").order_by("price_by_night")
+        self.assertEqual([place.id for place in self.storage.query(query)],
+                         [places[2].id, places[0].id])
+
+    def test_nearby(self):
+        """Test the places within a radius and the nearest one"""
+        places = [Place(), Place(), Place()]
+        for (latitude, longitude), place in zip(
+                ((6.45, 3.39), (6.5, 3.4), (9.07, 7.4)), places):
+            place.latitude = latitude
+            place.longitude = longitude
+            self.storage.new(place)
+        self.storage.save()
+        self.reopen()
+        matches = self.storage.nearby(Place, 6.46, 3.39, 10)
+        self.assertEqual([obj.id for km, obj in matches],
+                         [places[0].id, places[1].id])
+        nearest = self.storage.nearby(Place, 9.0, 7.5, count=1)
+        self.assertEqual(nearest[0][1].id, places[2].id)
+        with self.assertRaises(ValueError):
+            self.storage.nearby(Place, 9.0, 7.5, count=-1)
+
+    def test_search(self):
+        """Test that search ranks the reviews holding the words"""
+        reviews = [Review(), Review(), Review()]
+        for text, review in zip(("wifi wifi", "slow wifi here", "pool"),
+                                reviews):
+            review.text = text
+            self.storage.new(review)
+        self.storage.save()
+        self.reopen()
+        matches = self.storage.search(Review, "wifi")
+        self.assertEqual([obj.id for score, obj in matches],
+                         [reviews[0].id, reviews[1].id])
+
+    def test_default_values_match_file_storage(self):
+        """Test that attributes left at their class default are found
+        like FileStorage finds them"""
+        place = Place()
+        self.storage.new(place)
+        self.storage.save()
+        self.reopen()
+        file_storage = FileStorage()
+        file_storage._FileStorage__objects = {}
+        file_storage._FileStorage__classes = {}
+        file_storage._FileStorage__indexes = {}
+        file_storage._FileStorage__changes = {}
+        file_storage.new(place)
+        for storage in (self.storage, file_storage):
+            self.assertEqual(list(storage.find(Place, city_id="")),
+                             [f"Place.{place.id}"])
+            self.assertEqual(list(storage.find(Place, number_rooms=0)),
+                             [f"Place.{place.id}"])
+            query = Query(Place).where(("max_guest", "<", 5))
+            self.assertEqual([obj.id for obj in storage.query(query)],
+                             [place.id])
+            self.assertEqual([obj.id for km, obj in
+                              storage.nearby(Place, 0.0, 0.0, 1)],
+                             [place.id])
+            self.assertEqual(storage.stats(Place, group="city_id"),
+                             {"": {"count": 1}})
+
+    def test_values_not_matched_in_sql(self):
+        """Test that lists and None are compared on the objects"""
+        place = Place()
+        place.name = None
+        self.storage.new(place)
+        self.storage.save()
+        self.assertEqual(self.storage.find(Place, name=["a"]), {})
+        self.assertEqual(list(self.storage.find(Place, name=None)),
+                         [f"Place.{place.id}"])
+        query = Query(Place).where(name=["a"])
+        self.assertEqual(list(self.storage.query(query)), [])
+        query = Query(Place).where(name=None)
+        self.assertEqual(list(self.storage.query(query)), [place])
+
+    def test_stats(self):
+        """Test the statistics of columns and of extra attributes"""
+        for city_id, price in (("a", 100), ("a", 50), ("b", 80),
+                               ("b", "free")):
+            place = Place()
+            place.city_id = city_id
+            place.price_by_night = price
+            place.rating = price / 10 if price != "free" else None
+            self.storage.new(place)
+        self.storage.save()
+        self.reopen()
+        stats = self.storage.stats(Place, "price_by_night", "city_id")
+        self.assertEqual(stats, {
+                "a": {"count": 2, "sum": 150, "min": 50, "max": 100,
+                      "avg": 75},
+                "b": {"count": 2, "sum": 80, "min": 80, "max": 80,
+                      "avg": 80}})
+        self.assertEqual(self.storage.stats(Place, "rating")[None]["max"],
+                         10)
+        self.assertEqual(self.storage.stats(Place), {None: {"count": 4}})
+        self.assertEqual(self.storage.stats(State), {})
+
+    def test_revision(self):
+        """Test that revisions change with the objects and attributes"""
+        city = City()
+        self.storage.new(city)
+        revision = self.storage.revision(City, "state_id")
+        self.storage.touch(city, "name")
+        self.assertEqual(self.storage.revision(City, "state_id"), revision)
+        self.storage.touch(city, "state_id")
+        self.assertNotEqual(self.storage.revision(City, "state_id"),
+                            revision)
+        revision = self.storage.revision(City)
+        self.storage.delete(city)
+        self.assertNotEqual(self.storage.revision(City), revision)
+
+    def test_batch_commits_at_the_end(self):
+        """Test that saves inside a batch are committed together"""
+        with self.storage.batch():
+            state = State()
+            self.storage.new(state)
+            self.storage.save()
+            other = DBStorage(self.test_file)
+            other.reload()
+            self.assertEqual(other.count(State), 0)
+            other.disconnect()
+        other = DBStorage(self.test_file)
+        other.reload()
+        self.assertEqual(other.count(State), 1)
+        other.disconnect()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,16 @@
 #!/usr/bin/python3                                                       """                                                                      Unittest for FileStorage class in module models.file_storge              This test module defines the test class Test_FileStorage                 """
 import unittest
+from unittest.mock import patch
 import os
+import sys
 import json
+import shutil
+import subprocess
+import tempfile
+import threading
+from types import SimpleNamespace
+import models
+from models import storage
 from models.base_model import BaseModel
 from models.user import User
 from models.state import State
@@ -9,7 +18,13 @@ from models.city import City
 from models.amenity import Amenity
 from models.place import Place
 from models.review import Review
+from models.engine.aggregate import Aggregate
 from models.engine.file_storage import FileStorage
+from models.engine.geo import GeoIndex, distance
+from models.engine.lazy import LazyIndex
+from models.engine.query import Query
+from models.engine.rwlock import RWLock
+from models.engine.serializer import get_serializer
 
 
 class TestFileStorage(unittest.TestCase):
@@ -19,13 +34,16 @@ class TestFileStorage(unittest.TestCase):
         """Set up a clean test environment"""
         self.storage = FileStorage()
         self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
         self.test_file = "test_file.json"
         FileStorage._FileStorage__file_path = self.test_file
 
     def tearDown(self):
         """Clean up after tests"""
-        if os.path.exists(self.test_file):
-            os.remove(self.test_file)
+        for suffix in ("", ".bak", ".corrupt", ".bak.corrupt"):
+            if os.path.exists(self.test_file + suffix):
+                os.remove(self.test_file + suffix)
 
     def test_all_method(self):
         """Test the `all` method"""
@@ -34,6 +52,58 @@ class TestFileStorage(unittest.TestCase):
         self.storage.new(obj)
         self.assertIn(f"BaseModel.{obj.id}", self.storage.all())
 
+    def test_all_with_class(self):
+        """Test that `all` filters by class or class name"""
+        user = User()
+        place = Place()
+        self.storage.new(user)
+        self.storage.new(place)
+        self.assertEqual(self.storage.all(User), {f"User.{user.id}": user})
+        self.assertEqual(self.storage.all("Place"),
+                         {f"Place.{place.id}": place})
+        self.assertEqual(self.storage.all(State), {})
+
+    def test_count_method(self):
+        """Test the `count` method with and without a class"""
+        self.storage.new(User())
+        self.storage.new(User())
+        self.storage.new(City())
+        self.assertEqual(self.storage.count(), 3)
+        self.assertEqual(self.storage.count(User), 2)
+        self.assertEqual(self.storage.count("City"), 1)
+        self.assertEqual(self.storage.count(Review), 0)
+
+    def test_deleted_objects_leave_the_cache(self):
+        """Test that deleted objects do not stay in the record cache"""
+        cache = FileStorage._FileStorage__cache
+        for _ in range(5):
+            obj = State()
+            self.storage.new(obj)
+            self.storage.save()
+            self.assertIn(f"State.{obj.id}", cache)
+            self.storage.delete(obj)
+            self.storage.save()
+            self.assertNotIn(f"State.{obj.id}", cache)
+
+    def test_delete_updates_class_index(self):
+        """Test that deleted objects leave the class index"""
+        user = User()
+        self.storage.new(user)
+        self.storage.delete(user)
+        self.assertEqual(self.storage.all(User), {})
+        self.assertEqual(self.storage.count(User), 0)
+
+    def test_reload_builds_class_index(self):
+        """Test that reloaded objects are indexed by class"""
+        self.storage.new(State())
+        self.storage.new(State())
+        self.storage.save()
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+
+        self.storage.reload()
+        self.assertEqual(self.storage.count(State), 2)
+
     def test_new_method(self):
         """Test the `new` method"""
         obj = BaseModel()
@@ -154,5 +224,1430 @@ class TestFileStorage(unittest.TestCase):
         self.assertEqual(self.storage.all()[key], obj2)
 
 
+class TestFileStorageDirtyTracking(unittest.TestCase):
+    """Tests that FileStorage only serializes changed objects"""
+
+    def setUp(self):
+        """Set up a stored object and flush it once"""
+        self.test_file = "test_file.json"
+        FileStorage._FileStorage__file_path = self.test_file
+        self.obj = Place()
+        storage.save()
+
+    def tearDown(self):
+        """Remove the object and the file"""
+        storage.delete(self.obj)
+        for path in (self.test_file, self.test_file + ".bak"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_setattr_marks_attribute_dirty(self):
+        """Test that setting an attribute records its name"""
+        self.assertEqual(storage.dirty(self.obj), set())
+        self.obj.name = "Loft"
+        self.obj.max_guest = 4
+        self.assertEqual(storage.dirty(self.obj), {"name", "max_guest"})
+
+    def test_flush_clears_dirty_attributes(self):
+        """Test that a flush resets the dirty attributes"""
+        self.obj.name = "Loft"
+        storage.flush()
+        self.assertEqual(storage.dirty(self.obj), set())
+
+    def test_flush_serializes_changed_objects_only(self):
+        """Test that clean objects reuse their cached serialization"""
+        other = Place()
+        storage.save()
+        self.obj.name = "Loft"
+        with patch.object(Place, "to_dict", autospec=True,
+                          side_effect=Place.to_dict) as to_dict:
+            storage.flush()
+        storage.delete(other)
+        self.assertEqual([c.args[0] for c in to_dict.call_args_list],
+                         [self.obj])
+
+    def test_flush_writes_current_values(self):
+        """Test that the written file reflects cached and changed objects"""
+        self.obj.name = "Loft"
+        storage.flush()
+        with open(self.test_file, "r") as file:
+            data = json.load(file)
+        self.assertEqual(data[f"Place.{self.obj.id}"]["name"], "Loft")
+        self.assertEqual(len(data), len(storage.all()))
+
+    def test_untracked_object_is_not_dirty(self):
+        """Test that objects outside storage are not tracked"""
+        obj = Place(id="1234")
+        obj.name = "Loft"
+        self.assertEqual(storage.dirty(obj), set())
+
+
+class TestFileStorageIndexes(unittest.TestCase):
+    """Tests the attribute indexes and find() of FileStorage"""
+
+    def setUp(self):
+        """Set up a state with two cities and one review"""
+        self.state = State()
+        self.city1 = City()
+        self.city1.state_id = self.state.id
+        self.city2 = City()
+        self.city2.state_id = self.state.id
+        self.review = Review()
+        self.review.place_id = "place-1"
+        self.review.user_id = "user-1"
+        self.created = [self.state, self.city1, self.city2, self.review]
+
+    def tearDown(self):
+        """Remove the created objects"""
+        for obj in self.created:
+            storage.delete(obj)
+
+    def test_find_by_indexed_attribute(self):
+        """Test finding the cities of a state"""
+        cities = storage.find(City, state_id=self.state.id)
+        self.assertEqual(set(cities.values()), {self.city1, self.city2})
+
+    def test_find_follows_attribute_changes(self):
+        """Test that the index is updated when the attribute changes"""
+        self.city2.state_id = "another-state"
+        cities = storage.find("City", state_id=self.state.id)
+        self.assertEqual(list(cities.values()), [self.city1])
+        moved = storage.find("City", state_id="another-state")
+        self.assertEqual(list(moved.values()), [self.city2])
+
+    def test_find_with_several_attributes(self):
+        """Test that every attribute must match"""
+        self.assertEqual(
+                storage.find(Review, place_id="place-1", user_id="user-1"),
+                {f"Review.{self.review.id}": self.review})
+        self.assertEqual(
+                storage.find(Review, place_id="place-1", user_id="other"),
+                {})
+
+    def test_find_by_unindexed_attribute(self):
+        """Test that unindexed attributes fall back to the class index"""
+        self.state.name = f"Lagos {self.state.id}"
+        self.assertEqual(storage.find(State, name=self.state.name),
+                         {f"State.{self.state.id}": self.state})
+
+    def test_find_after_delete(self):
+        """Test that deleted objects leave the indexes"""
+        storage.delete(self.city1)
+        cities = storage.find(City, state_id=self.state.id)
+        self.assertEqual(list(cities.values()), [self.city2])
+
+    def test_create_index(self):
+        """Test indexing an attribute of existing objects"""
+        self.state.name = "Abuja"
+        storage.create_index(State, "name")
+        indexes = storage._FileStorage__indexes_of("State")
+        self.assertIn("name", indexes)
+        self.assertEqual(indexes["name"].find("Abuja"),
+                         {f"State.{self.state.id}": self.state})
+        del indexes["name"]
+
+
+class TestFileStorageQuery(unittest.TestCase):
+    """Tests query() of FileStorage"""
+
+    def setUp(self):
+        """Set up five places of one city with different prices"""
+        self.city_id = f"city-{id(self)}"
+        self.places = []
+        for price in (120, 40, 80, 60, 80):
+            place = Place()
+            place.city_id = self.city_id
+            place.price_by_night = price
+            place.max_guest = price // 20
+            self.places.append(place)
+
+    def tearDown(self):
+        """Remove the created places"""
+        for place in self.places:
+            storage.delete(place)
+
+    def run_query(self, query):
+        """Returns the list of results of query in the city"""
+        return (list(storage.query(query.where(city_id=self.city_id))))
+
+    def test_conditions(self):
+        """Test that every condition must hold"""
+        query = Query(Place).where(("price_by_night", "<", 100),
+                                   ("max_guest", ">=", 3))
+        self.assertEqual(set(self.run_query(query)),
+                         set(self.places[2:]))
+
+    def test_order_and_limit(self):
+        """Test ordering on several attributes with a limit"""
+        query = Query(Place).order_by("-price_by_night", "id").limit(3)
+        expected = sorted(self.places[2::2], key=lambda place: place.id)
+        self.assertEqual(self.run_query(query),
+                         [self.places[0]] + expected)
+        query = Query(Place).order_by("price_by_night").limit(1)
+        self.assertEqual(self.run_query(query), [self.places[1]])
+
+    def test_limit_stops_early(self):
+        """Test that a limit without order stops at the first matches"""
+        query = Query(Place).limit(2)
+        with patch.object(Query, "matches", return_value=True) as matches:
+            self.assertEqual(len(self.run_query(query)), 2)
+        self.assertEqual(matches.call_count, 2)
+
+    def test_select(self):
+        """Test that select projects the matches on fields"""
+        query = Query(Place).where(price_by_night=40).select("max_guest")
+        self.assertEqual(self.run_query(query), [{"max_guest": 2}])
+
+    def test_uncomparable_values_do_not_match(self):
+        """Test that a value of another type is not an error"""
+        self.places[0].price_by_night = "cheap"
+        query = Query(Place).where(("price_by_night", "<", 100))
+        self.assertEqual(len(self.run_query(query)), 4)
+
+    def test_range_index_narrows_candidates(self):
+        """Test that comparisons on a range index bound the candidates"""
+        candidates = storage._FileStorage__candidates(
+                "Place", [("price_by_night", ">", 40),
+                          ("price_by_night", "<=", 80),
+                          ("price_by_night", ">=", 60)])
+        mine = {key for key in candidates
+                if candidates[key].city_id == self.city_id}
+        self.assertEqual(mine, {f"Place.{place.id}"
+                                for place in self.places[2:]})
+        self.assertTrue(all(60 <= place.price_by_night <= 80
+                            for place in candidates.values()))
+
+    def test_equality_with_values_out_of_range_index(self):
+        """Test that == finds values a range index cannot hold"""
+        self.places[0].price_by_night = "50"
+        self.places[1].latitude = None
+        query = Query(Place).where(price_by_night="50",
+                                   city_id=self.city_id)
+        self.assertEqual(self.run_query(query), [self.places[0]])
+        self.assertEqual(storage.find(Place, latitude=None,
+                                      city_id=self.city_id),
+                         {f"Place.{self.places[1].id}": self.places[1]})
+        self.assertEqual(storage.find(Place, price_by_night="50"),
+                         {f"Place.{self.places[0].id}": self.places[0]})
+
+    def test_range_index_follows_updates(self):
+        """Test that the range index is updated with the attribute"""
+        self.places[0].price_by_night = 10
+        query = Query(Place).where(("price_by_night", "<", 50))
+        self.assertEqual(set(self.run_query(query)),
+                         {self.places[0], self.places[1]})
+        storage.delete(self.places[1])
+        self.assertEqual(self.run_query(query), [self.places[0]])
+
+    def test_unknown_operator(self):
+        """Test that an unknown operator raises ValueError"""
+        with self.assertRaises(ValueError):
+            Query(Place).where(("price_by_night", "~", 1))
+
+
+class TestFileStorageSpatial(unittest.TestCase):
+    """Tests the spatial index and nearby() of FileStorage"""
+
+    def setUp(self):
+        """Set up places on both sides of the antimeridian"""
+        self.places = []
+        for latitude, longitude in ((-16.5, 179.95), (-16.5, -179.95),
+                                    (-16.6, 179.5), (-17.5, 178.0)):
+            place = Place()
+            place.latitude = latitude
+            place.longitude = longitude
+            self.places.append(place)
+
+    def tearDown(self):
+        """Remove the created places"""
+        for place in self.places:
+            storage.delete(place)
+
+    def test_radius(self):
+        """Test the places within a radius, across the antimeridian"""
+        matches = storage.nearby(Place, -16.5, 179.99, 60)
+        self.assertEqual([obj for km, obj in matches], self.places[:3])
+        self.assertEqual([km for km, obj in matches],
+                         sorted(km for km, obj in matches))
+
+    def test_nearest(self):
+        """Test the nearest places, within a radius or not"""
+        matches = storage.nearby(Place, -17.4, 178.1, count=1)
+        self.assertIs(matches[0][1], self.places[3])
+        self.assertAlmostEqual(matches[0][0],
+                               distance(-17.4, 178.1, -17.5, 178.0))
+        self.assertEqual(storage.nearby(Place, -17.4, 178.1, 1, 1), [])
+
+    def test_negative_radius_or_count(self):
+        """Test that a negative radius or count is refused"""
+        for radius, count in ((-1, None), (None, -1), (10, -1)):
+            with self.assertRaises(ValueError):
+                storage.nearby(Place, -17.4, 178.1, radius, count)
+
+    def test_index_follows_moves(self):
+        """Test that the index is updated with the coordinates"""
+        self.places[3].longitude = -179.9
+        matches = storage.nearby(Place, -17.5, -179.9, 1)
+        self.assertEqual([obj for km, obj in matches], [self.places[3]])
+        storage.delete(self.places[3])
+        self.assertEqual(storage.nearby(Place, -17.5, -179.9, 1), [])
+
+    def test_grid_matches_full_scan(self):
+        """Test GeoIndex against the distance of every point"""
+        index = GeoIndex(cell=1.0)
+        points = {}
+        for i in range(-80, 81, 7):
+            for j in range(-180, 180, 11):
+                point = SimpleNamespace(latitude=i + 0.5, longitude=j + 0.25)
+                points[f"Place.{i}.{j}"] = point
+                index.add(f"Place.{i}.{j}", point)
+        for latitude, longitude, radius in ((0, 0, 900), (75, 170, 1500),
+                                            (-60, -179, 700)):
+            expected = {key for key, point in points.items()
+                        if distance(latitude, longitude, point.latitude,
+                                    point.longitude) <= radius}
+            matches = index.within(latitude, longitude, radius)
+            self.assertEqual({key for km, key, obj in matches}, expected)
+
+    def test_no_spatial_index(self):
+        """Test nearby on a class without coordinates"""
+        with self.assertRaises(ValueError):
+            storage.nearby(User, 0, 0, 10)
+
+
+class TestFileStorageSearch(unittest.TestCase):
+    """Tests the text indexes and search() of FileStorage"""
+
+    def setUp(self):
+        """Set up three reviews and a place with some words in common"""
+        self.reviews = [Review(), Review(), Review()]
+        self.reviews[0].text = "Quixotic xylophone, quixotic pool"
+        self.reviews[1].text = ("The quixotic host was kind but the "
+                                "room was small and the street loud")
+        self.reviews[2].text = "Zealous staff"
+        self.place = Place()
+        self.place.description = "A quixotic flat"
+
+    def tearDown(self):
+        """Remove the created objects"""
+        for obj in self.reviews + [self.place]:
+            storage.delete(obj)
+
+    def test_ranked_matches(self):
+        """Test that matches are ranked, per class, case insensitively"""
+        matches = storage.search(Review, "QUIXOTIC")
+        self.assertEqual([obj for score, obj in matches], self.reviews[:2])
+        self.assertGreater(matches[0][0], matches[1][0])
+        self.assertEqual(storage.search(Review, "quixotic", 1)[0][1],
+                         self.reviews[0])
+        self.assertEqual([obj for score, obj in
+                          storage.search(Place, "quixotic")], [self.place])
+
+    def test_any_word_matches(self):
+        """Test that a match needs one of the words only"""
+        matches = storage.search(Review, "zealous xylophone")
+        self.assertEqual({obj for score, obj in matches},
+                         {self.reviews[0], self.reviews[2]})
+
+    def test_index_follows_updates(self):
+        """Test that changed and deleted texts leave the index"""
+        self.reviews[2].text = "Quixotic staff"
+        storage.delete(self.reviews[0])
+        matches = storage.search(Review, "quixotic")
+        self.assertEqual({obj for score, obj in matches},
+                         set(self.reviews[1:]))
+        self.assertEqual(storage.search(Review, "zealous"), [])
+
+    def test_no_text_index(self):
+        """Test search on a class without text attributes"""
+        with self.assertRaises(ValueError):
+            storage.search(State, "quixotic")
+
+
+class TestFileStorageStats(unittest.TestCase):
+    """Tests the aggregates and stats() of FileStorage"""
+
+    def setUp(self):
+        """Set up places in two cities of their own"""
+        self.places = []
+        for city_id, price in (("stats-a", 100), ("stats-a", 50),
+                               ("stats-b", 80), ("stats-b", "free")):
+            place = Place()
+            place.city_id = city_id
+            place.price_by_night = price
+            self.places.append(place)
+
+    def tearDown(self):
+        """Remove the created places"""
+        for place in self.places:
+            storage.delete(place)
+
+    def test_stats_per_group(self):
+        """Test the statistics of a declared aggregate"""
+        stats = storage.stats(Place, "price_by_night", "city_id")
+        self.assertEqual(stats["stats-a"], {"count": 2, "sum": 150,
+                                            "min": 50, "max": 100,
+                                            "avg": 75})
+        self.assertEqual(stats["stats-b"], {"count": 2, "sum": 80,
+                                            "min": 80, "max": 80,
+                                            "avg": 80})
+
+    def test_stats_follow_changes(self):
+        """Test that updates, moves and deletes change the statistics"""
+        self.places[0].price_by_night = 20
+        self.places[2].city_id = "stats-a"
+        storage.delete(self.places[1])
+        stats = storage.stats(Place, "price_by_night", "city_id")
+        self.assertEqual(stats["stats-a"], {"count": 2, "sum": 100,
+                                            "min": 20, "max": 80,
+                                            "avg": 50})
+        self.assertEqual(stats["stats-b"], {"count": 1, "sum": None,
+                                            "min": None, "max": None,
+                                            "avg": None})
+        storage.delete(self.places[3])
+        self.assertNotIn("stats-b", storage.stats(Place, "price_by_night",
+                                                  "city_id"))
+
+    def test_unlisted_pair_is_scanned(self):
+        """Test that a pair not declared is computed but not maintained"""
+        self.places[2].number_rooms = 2
+        self.places[3].number_rooms = 3
+        stats = storage.stats(Place, "number_rooms", "city_id")
+        self.assertEqual(stats["stats-b"], {"count": 2, "sum": 5, "min": 2,
+                                            "max": 3, "avg": 2.5})
+        with patch.object(Aggregate, "add") as add:
+            self.places[3].number_rooms = 4
+        add.assert_not_called()
+        stats = storage.stats(Place, "number_rooms", "city_id")
+        self.assertEqual(stats["stats-b"]["max"], 4)
+        self.assertEqual(storage.stats(Place)[None]["count"],
+                         storage.count(Place))
+
+    def test_create_aggregate(self):
+        """Test that an aggregate created by the API is maintained"""
+        storage.create_aggregate(Place, group="city_id")
+        self.assertEqual(storage.stats(Place, group="city_id")["stats-b"],
+                         {"count": 2})
+        self.places[3].city_id = "stats-c"
+        stats = storage.stats(Place, group="city_id")
+        self.assertEqual(stats["stats-b"], {"count": 1})
+        self.assertEqual(stats["stats-c"], {"count": 1})
+
+
+class TestFileStorageSearchFile(unittest.TestCase):
+    """Tests saving the text indexes next to the file"""
+
+    def setUp(self):
+        """Save three reviews with their text index"""
+        self.storage = FileStorage()
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.storage._FileStorage__changes = {}
+        self.storage.text_index_file = True
+        self.test_file = "test_file.json"
+        FileStorage._FileStorage__file_path = self.test_file
+        self.reviews = [Review(), Review(), Review()]
+        for review, text in zip(self.reviews, ("wifi", "pool", "wifi")):
+            review.text = text
+            self.storage.new(review)
+        self.storage.save()
+
+    def tearDown(self):
+        """Drop the lazy index and remove the files"""
+        if FileStorage._FileStorage__lazy is not None:
+            FileStorage._FileStorage__lazy.close()
+            FileStorage._FileStorage__lazy = None
+        for path in (self.test_file, self.test_file + ".bak",
+                     self.test_file + ".fts"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def reload_lazy(self):
+        """Drops the objects and indexes, then reloads lazily"""
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.storage.lazy = True
+        self.storage.reload()
+
+    def test_search_builds_matches_only(self):
+        """Test that the saved index spares building the other objects"""
+        self.reload_lazy()
+        matches = self.storage.search(Review, "wifi")
+        self.assertEqual({obj.id for score, obj in matches},
+                         {self.reviews[0].id, self.reviews[2].id})
+        self.assertEqual(set(self.storage._FileStorage__objects),
+                         {f"Review.{self.reviews[0].id}",
+                          f"Review.{self.reviews[2].id}"})
+
+    def test_stale_index_is_ignored(self):
+        """Test that an index older than the snapshot is not loaded"""
+        self.storage.text_index_file = False
+        self.reviews[1].text = "wifi"
+        self.storage.touch(self.reviews[1], "text")
+        self.storage.save()
+        self.reload_lazy()
+        self.assertEqual(len(self.storage.search(Review, "wifi")), 3)
+
+
+class TestFileStorageJournal(unittest.TestCase):
+    """Tests the journaled save mode of FileStorage"""
+
+    def setUp(self):
+        """Set up a clean journaled storage"""
+        self.storage = FileStorage()
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.storage._FileStorage__changes = {}
+        self.storage.journal = True
+        self.test_file = "test_file.json"
+        self.log_file = "test_file.json.log"
+        FileStorage._FileStorage__file_path = self.test_file
+
+    def tearDown(self):
+        """Clean up the snapshot and the logs"""
+        self.storage._FileStorage__get_journal().wait()
+        for path in (self.test_file, self.test_file + ".bak",
+                     self.log_file, self.log_file + ".1"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_save_appends_changed_objects_only(self):
+        """Test that save appends only new or changed objects"""
+        obj1 = BaseModel()
+        obj2 = BaseModel()
+        self.storage.new(obj1)
+        self.storage.new(obj2)
+        self.storage.save()
+        obj1.name = "changed"
+        self.storage.new(obj1)
+        self.storage.save()
+
+        with open(self.log_file, "r") as file:
+            lines = [json.loads(line) for line in file]
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(len(lines[0]), 2)
+        self.assertEqual(list(lines[1]), [f"BaseModel.{obj1.id}"])
+        self.assertEqual(lines[1][f"BaseModel.{obj1.id}"]["name"], "changed")
+        self.assertFalse(os.path.exists(self.test_file))
+
+    def test_reload_replays_log(self):
+        """Test that reload applies the log over the snapshot"""
+        obj1 = BaseModel()
+        obj2 = User()
+        self.storage.new(obj1)
+        self.storage.new(obj2)
+        self.storage.save()
+        self.storage.delete(obj1)
+        self.storage.save()
+        self.storage._FileStorage__objects = {}
+
+        self.storage.reload()
+        self.assertNotIn(f"BaseModel.{obj1.id}", self.storage.all())
+        self.assertIn(f"User.{obj2.id}", self.storage.all())
+
+    def test_reload_ignores_torn_record(self):
+        """Test that a partially written last record is ignored"""
+        obj = BaseModel()
+        self.storage.new(obj)
+        self.storage.save()
+        with open(self.log_file, "a") as file:
+            file.write('{"BaseModel.12')
+        self.storage._FileStorage__objects = {}
+
+        self.storage.reload()
+        self.assertEqual(list(self.storage.all()), [f"BaseModel.{obj.id}"])
+
+    def test_save_after_torn_record(self):
+        """Test that a save after a torn record is replayed"""
+        with open(self.log_file, "w") as file:
+            file.write('{"State.x": {"__cla')
+        state = State()
+        self.storage.new(state)
+        self.storage.save()
+        self.storage._FileStorage__objects = {}
+
+        self.storage.reload()
+        self.assertEqual(list(self.storage.all()), [f"State.{state.id}"])
+
+    def test_compaction_folds_log_into_snapshot(self):
+        """Test that a log over the threshold becomes the snapshot"""
+        self.storage.journal_threshold = 2
+        objs = [BaseModel() for _ in range(3)]
+        for obj in objs:
+            self.storage.new(obj)
+        self.storage.save()
+        self.storage._FileStorage__get_journal().wait()
+
+        with open(self.test_file, "r") as file:
+            data = json.load(file)
+        self.assertEqual(len(data), 3)
+        self.assertFalse(os.path.exists(self.log_file + ".1"))
+
+    def test_torn_flush_is_dropped_as_a_whole(self):
+        """Test that the records of a torn flush are all ignored"""
+        obj1 = BaseModel()
+        obj2 = BaseModel()
+        self.storage.new(obj1)
+        self.storage.new(obj2)
+        self.storage.save()
+        with open(self.log_file, "r") as file:
+            line = file.read()
+        with open(self.log_file, "w") as file:
+            file.write(line[:len(line) // 2])
+        self.storage._FileStorage__objects = {}
+
+        self.storage.reload()
+        self.assertEqual(self.storage.all(), {})
+
+    def test_full_save_discards_log(self):
+        """Test that a save with the journal off removes the log"""
+        self.storage.new(BaseModel())
+        self.storage.save()
+        self.storage.journal = False
+        self.storage.save()
+        self.assertFalse(os.path.exists(self.log_file))
+
+
+class TestFileStorageBatch(unittest.TestCase):
+    """Tests the batch API of FileStorage"""
+
+    def setUp(self):
+        """Set up a clean storage"""
+        self.storage = FileStorage()
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.test_file = "test_file.json"
+        FileStorage._FileStorage__file_path = self.test_file
+
+    def tearDown(self):
+        """Remove the file and its backup"""
+        for path in (self.test_file, self.test_file + ".bak"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_batch_writes_once(self):
+        """Test that saves inside a batch are written by one flush"""
+        with patch.object(FileStorage, "flush") as flush:
+            with self.storage.batch():
+                for _ in range(3):
+                    self.storage.new(BaseModel())
+                    self.storage.save()
+                flush.assert_not_called()
+        flush.assert_called_once_with()
+
+    def test_nested_batches(self):
+        """Test that only the outermost commit flushes"""
+        with patch.object(FileStorage, "flush") as flush:
+            self.storage.begin()
+            with self.storage.batch():
+                self.storage.save()
+            flush.assert_not_called()
+            self.storage.commit()
+        flush.assert_called_once_with()
+
+    def test_batch_content_is_written(self):
+        """Test that the objects of a batch reach the file"""
+        with self.storage.batch():
+            obj = User()
+            self.storage.new(obj)
+            self.storage.save()
+            self.assertFalse(os.path.exists(self.test_file))
+        with open(self.test_file, "r") as file:
+            self.assertIn(f"User.{obj.id}", json.load(file))
+
+    def test_commit_without_begin(self):
+        """Test that an unmatched commit does nothing"""
+        with patch.object(FileStorage, "flush") as flush:
+            self.storage.commit()
+        flush.assert_not_called()
+
+
+class TestFileStorageLazy(unittest.TestCase):
+    """Tests the lazy reload mode of FileStorage"""
+
+    def setUp(self):
+        """Write two users and a place, then reload them lazily"""
+        self.storage = FileStorage()
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.test_file = "test_file.json"
+        FileStorage._FileStorage__file_path = self.test_file
+        self.users = [User(), User()]
+        self.place = Place()
+        for obj in self.users + [self.place]:
+            self.storage.new(obj)
+        self.storage.save()
+
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.storage.lazy = True
+        self.storage.reload()
+
+    def tearDown(self):
+        """Drop the lazy index and remove the files"""
+        FileStorage._FileStorage__lazy.close()
+        FileStorage._FileStorage__lazy = None
+        for path in (self.test_file, self.test_file + ".bak",
+                     self.test_file + ".log"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def built(self):
+        """Returns the keys of the objects built so far"""
+        return (set(self.storage._FileStorage__objects))
+
+    def test_reload_does_not_read_file(self):
+        """Test that reload defers scanning the file"""
+        self.assertFalse(FileStorage._FileStorage__lazy.scanned)
+        self.assertEqual(self.built(), set())
+
+    def test_count_does_not_build(self):
+        """Test that count includes pending records without building"""
+        self.assertEqual(self.storage.count(User), 2)
+        self.assertEqual(self.storage.count(), 3)
+        self.assertEqual(self.built(), set())
+
+    def test_get_builds_one_object(self):
+        """Test that get builds only the requested object"""
+        user = self.storage.get(User, self.users[0].id)
+        self.assertEqual(user.to_dict(), self.users[0].to_dict())
+        self.assertEqual(self.built(), {f"User.{user.id}"})
+        self.assertIs(self.storage.get("User", user.id), user)
+        self.assertIsNone(self.storage.get(User, "1234"))
+
+    def test_all_with_class_builds_that_class(self):
+        """Test that all(cls) builds only the objects of cls"""
+        self.assertEqual(len(self.storage.all(User)), 2)
+        self.assertEqual(self.built(),
+                         {f"User.{user.id}" for user in self.users})
+
+    def test_all_builds_everything(self):
+        """Test that all() builds every pending object"""
+        self.assertEqual(len(self.storage.all()), 3)
+
+    def test_save_keeps_pending_records(self):
+        """Test that saving copies the records that were never built"""
+        user = self.storage.get(User, self.users[0].id)
+        user.first_name = "Ada"
+        self.storage.save()
+        self.assertEqual(self.storage.get(Place, self.place.id).to_dict(),
+                         self.place.to_dict())
+
+        with open(self.test_file, "r") as file:
+            data = json.load(file)
+        self.assertEqual(len(data), 3)
+        self.assertEqual(data[f"User.{user.id}"]["first_name"], "Ada")
+
+    def test_journal_is_replayed_over_pending_records(self):
+        """Test that journaled changes apply to the lazy records"""
+        self.storage.journal = True
+        user = self.storage.get(User, self.users[1].id)
+        self.storage.delete(user)
+        self.storage.save()
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage.reload()
+
+        self.assertEqual(self.storage.count(User), 1)
+        self.assertIsNone(self.storage.get(User, self.users[1].id))
+
+
+class TestFileStorageRecovery(unittest.TestCase):
+    """Tests the atomic saves, the backup and the fsync policies"""
+
+    def setUp(self):
+        """Save two states so that a backup exists"""
+        self.storage = FileStorage()
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.test_file = "test_file.json"
+        self.backup_file = "test_file.json.bak"
+        FileStorage._FileStorage__file_path = self.test_file
+        self.first = State()
+        self.storage.new(self.first)
+        self.storage.save()
+        self.second = State()
+        self.storage.new(self.second)
+        self.storage.save()
+
+    def tearDown(self):
+        """Reset the options and remove the files"""
+        if FileStorage._FileStorage__lazy is not None:
+            FileStorage._FileStorage__lazy.close()
+            FileStorage._FileStorage__lazy = None
+        FileStorage._FileStorage__sync = None
+        for path in (self.test_file, self.backup_file,
+                     self.test_file + ".corrupt", self.test_file + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def reload(self):
+        """Forgets the objects and reloads them"""
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.storage.reload()
+
+    def test_save_keeps_previous_snapshot(self):
+        """Test that the previous snapshot is kept as a backup"""
+        with open(self.backup_file, "r") as file:
+            data = json.load(file)
+        self.assertEqual(list(data), [f"State.{self.first.id}"])
+        self.assertFalse(os.path.exists(self.test_file + ".tmp"))
+
+    def test_no_backup(self):
+        """Test that backup=False replaces the file without a copy"""
+        os.remove(self.backup_file)
+        self.storage.backup = False
+        self.storage.save()
+        self.assertFalse(os.path.exists(self.backup_file))
+
+    def test_corrupt_file_falls_back_to_backup(self):
+        """Test that an unreadable file is set aside for the backup"""
+        with open(self.test_file, "w") as file:
+            file.write('{"State.1": {"id"')
+        with self.assertWarns(RuntimeWarning):
+            self.reload()
+        self.assertEqual(list(self.storage.all()),
+                         [f"State.{self.first.id}"])
+        self.assertTrue(os.path.exists(self.test_file + ".corrupt"))
+
+        self.storage.save()
+        with open(self.backup_file, "r") as file:
+            self.assertIn(f"State.{self.first.id}", json.load(file))
+
+    def test_missing_file_falls_back_to_backup(self):
+        """Test a crash between the two renames of a save"""
+        os.remove(self.test_file)
+        self.reload()
+        self.assertEqual(self.storage.count(State), 1)
+
+    def test_lazy_reload_falls_back_to_backup(self):
+        """Test that the lazy scan recovers from the backup too"""
+        with open(self.test_file, "w") as file:
+            file.write("{not valid JSON}")
+        self.storage.lazy = True
+        self.reload()
+        with self.assertWarns(RuntimeWarning):
+            self.assertEqual(self.storage.count(State), 1)
+        self.assertIsNotNone(self.storage.get(State, self.first.id))
+
+    def test_fsync_none(self):
+        """Test that the default policy never syncs"""
+        with patch("os.fsync") as fsync:
+            self.storage.save()
+        fsync.assert_not_called()
+
+    def test_fsync_always(self):
+        """Test that every save syncs the file and the directory"""
+        self.storage.fsync = "always"
+        with patch("os.fsync") as fsync:
+            self.storage.save()
+            self.assertEqual(fsync.call_count, 2)
+            self.storage.save()
+            self.assertEqual(fsync.call_count, 4)
+
+    def test_fsync_group(self):
+        """Test that saves in the same interval are synced once"""
+        self.storage.fsync = "group"
+        self.storage.fsync_interval = 60000
+        with patch("os.fsync") as fsync:
+            for i in range(5):
+                self.storage.save()
+            fsync.assert_not_called()
+            FileStorage._FileStorage__sync.wait()
+            self.assertEqual(fsync.call_count, 2)
+
+    def test_unknown_fsync_mode(self):
+        """Test that an unknown policy is rejected"""
+        self.storage.fsync = "sometimes"
+        with self.assertRaises(ValueError):
+            self.storage.save()
+
+
+class TestFileStorageAsync(unittest.TestCase):
+    """Tests the background flusher of FileStorage"""
+
+    def setUp(self):
+        """Set up an empty storage saving asynchronously"""
+        self.storage = FileStorage()
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.storage.async_save = True
+        self.test_file = "test_file.json"
+        FileStorage._FileStorage__file_path = self.test_file
+
+    def tearDown(self):
+        """Stop the flusher and remove the files"""
+        self.storage.close()
+        FileStorage._FileStorage__flusher = None
+        for path in (self.test_file, self.test_file + ".bak"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_save_returns_before_writing(self):
+        """Test that save only requests the write"""
+        self.storage.flush_interval = 60000
+        self.storage.new(State())
+        self.storage.save()
+        self.assertFalse(os.path.exists(self.test_file))
+        self.assertTrue(FileStorage._FileStorage__flusher.pending())
+
+    def test_close_writes_pending_saves(self):
+        """Test that close writes what was saved"""
+        self.storage.flush_interval = 60000
+        state = State()
+        self.storage.new(state)
+        self.storage.save()
+        self.storage.close()
+        with open(self.test_file, "r") as file:
+            self.assertIn(f"State.{state.id}", json.load(file))
+
+    def test_saves_are_coalesced(self):
+        """Test that the saves of one interval are written once"""
+        self.storage.flush_interval = 50
+        with patch.object(FileStorage, "flush") as flush:
+            for i in range(10):
+                self.storage.new(State())
+                self.storage.save()
+            self.storage.close()
+        flush.assert_called_once()
+
+    def test_flush_is_synchronous(self):
+        """Test that an explicit flush writes at once"""
+        self.storage.flush_interval = 60000
+        self.storage.new(State())
+        self.storage.flush()
+        self.assertTrue(os.path.exists(self.test_file))
+
+
+class TestFileStorageThreads(unittest.TestCase):
+    """Tests sharing FileStorage between threads"""
+
+    def setUp(self):
+        """Set up an empty storage"""
+        self.storage = FileStorage()
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.storage._FileStorage__changes = {}
+        self.test_file = "test_file.json"
+        FileStorage._FileStorage__file_path = self.test_file
+
+    def tearDown(self):
+        """Remove the files"""
+        for path in (self.test_file, self.test_file + ".bak"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_concurrent_changes_and_saves(self):
+        """Test that threads can add, change, read and save at once"""
+        errors = []
+
+        def work():
+            try:
+                for i in range(50):
+                    city = City()
+                    self.storage.new(city)
+                    city.state_id = "state-1"
+                    self.storage.save()
+                    for key in self.storage.all():
+                        pass
+                    self.storage.find(City, state_id="state-1")
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=work) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.storage.count(City), 200)
+        with open(self.test_file, "r") as file:
+            self.assertEqual(len(json.load(file)), 200)
+
+    def test_flush_restores_changes_on_failure(self):
+        """Test that a failed flush leaves the changes to write"""
+        state = State()
+        self.storage.new(state)
+        with patch("json.dumps", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.storage.flush()
+        self.assertIn(f"State.{state.id}",
+                      self.storage._FileStorage__changes)
+        self.storage.flush()
+        with open(self.test_file, "r") as file:
+            self.assertIn(f"State.{state.id}", json.load(file))
+
+    def test_batch_of_a_thread_leaves_others_saving(self):
+        """Test that a batch only defers the saves of its own thread"""
+        with patch.object(FileStorage, "flush") as flush:
+            with self.storage.batch():
+                thread = threading.Thread(target=self.storage.save)
+                thread.start()
+                thread.join()
+                flush.assert_called_once_with()
+                self.storage.save()
+                flush.assert_called_once_with()
+        self.assertEqual(flush.call_count, 2)
+
+
+class TestRWLock(unittest.TestCase):
+    """Tests the readers-writer lock of FileStorage"""
+
+    def setUp(self):
+        """Set up a lock"""
+        self.lock = RWLock()
+
+    def test_readers_share_the_lock(self):
+        """Test that a reader does not wait for another reader"""
+        entered = threading.Event()
+
+        def read():
+            with self.lock.read():
+                entered.set()
+
+        with self.lock.read():
+            thread = threading.Thread(target=read)
+            thread.start()
+            self.assertTrue(entered.wait(5))
+        thread.join()
+
+    def test_writer_excludes_readers(self):
+        """Test that a reader waits for the writer"""
+        entered = threading.Event()
+
+        def read():
+            with self.lock.read():
+                entered.set()
+
+        with self.lock.write():
+            thread = threading.Thread(target=read)
+            thread.start()
+            self.assertFalse(entered.wait(0.05))
+        self.assertTrue(entered.wait(5))
+        thread.join()
+
+    def test_reentrant(self):
+        """Test that the writer can write and read again"""
+        with self.lock.write():
+            with self.lock.write():
+                with self.lock.read():
+                    pass
+        with self.lock.read():
+            with self.lock.read():
+                pass
+
+    def test_upgrade_raises(self):
+        """Test that a reader cannot take the lock to write"""
+        with self.lock.read():
+            with self.assertRaises(RuntimeError):
+                with self.lock.write():
+                    pass
+
+
+class TestFileStorageShared(unittest.TestCase):
+    """Tests sharing the file between processes"""
+    script = (
+        "import sys\n"
+        "from models import storage\n"
+        "from models.engine.file_storage import FileStorage\n"
+        "from models.state import State\n"
+        "FileStorage._FileStorage__file_path = sys.argv[1]\n"
+        "storage.shared = True\n"
+        "storage.reload()\n"
+        "state = storage.get(State, sys.argv[2])\n"
+        "state.name = 'Renamed'\n"
+        "storage.delete(storage.get(State, sys.argv[3]))\n"
+        "added = State()\n"
+        "storage.save()\n"
+        "print(added.id)\n"
+        )
+
+    def setUp(self):
+        """Save three states as one process"""
+        self.storage = FileStorage()
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.storage._FileStorage__changes = {}
+        self.storage.shared = True
+        self.test_file = "test_file.json"
+        FileStorage._FileStorage__file_path = self.test_file
+        self.storage.reload()
+        self.states = [State(), State(), State()]
+        for state in self.states:
+            self.storage.new(state)
+        self.storage.save()
+
+    def tearDown(self):
+        """Remove the files"""
+        for path in (self.test_file, self.test_file + ".bak",
+                     self.test_file + ".lock"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def other_process(self):
+        """Renames the first state, deletes the second and adds one in
+        another process; returns the id of the new state"""
+        root = os.path.dirname(os.path.abspath(models.__path__[0]))
+        with tempfile.TemporaryDirectory() as cwd:
+            result = subprocess.run(
+                    [sys.executable, "-c", self.script,
+                     os.path.abspath(self.test_file),
+                     self.states[0].id, self.states[1].id],
+                    cwd=cwd, env=dict(os.environ, PYTHONPATH=root),
+                    capture_output=True, text=True, check=True)
+        return (result.stdout.strip())
+
+    def test_refresh_merges_other_writes(self):
+        """Test that refresh applies what another process saved"""
+        added = self.other_process()
+        self.storage.refresh()
+        self.assertEqual(self.storage.get(State, self.states[0].id).name,
+                         "Renamed")
+        self.assertIsNone(self.storage.get(State, self.states[1].id))
+        self.assertIsNotNone(self.storage.get(State, added))
+        self.assertEqual(self.storage.count(State), 3)
+
+    def test_save_does_not_clobber_other_writes(self):
+        """Test that a stale process keeps the other writes on save"""
+        added = self.other_process()
+        mine = State()
+        self.storage.new(mine)
+        self.states[2].name = "Mine"
+        self.storage.touch(self.states[2], "name")
+        self.storage.save()
+        with open(self.test_file, "r") as file:
+            data = json.load(file)
+        self.assertEqual(set(data), {
+                f"State.{self.states[0].id}", f"State.{self.states[2].id}",
+                f"State.{added}", f"State.{mine.id}"})
+        self.assertEqual(data[f"State.{self.states[0].id}"]["name"],
+                         "Renamed")
+        self.assertEqual(data[f"State.{self.states[2].id}"]["name"], "Mine")
+
+    def test_unsaved_changes_win(self):
+        """Test that changes not saved yet are kept by refresh"""
+        self.states[0].name = "Local"
+        self.storage.touch(self.states[0], "name")
+        self.other_process()
+        self.storage.refresh()
+        self.assertEqual(self.states[0].name, "Local")
+        self.assertIs(self.storage.get(State, self.states[0].id),
+                      self.states[0])
+
+    def test_refresh_without_other_writes(self):
+        """Test that refresh keeps the objects when nothing changed"""
+        with patch("models.engine.file_storage.load_file") as load:
+            self.storage.refresh()
+        load.assert_not_called()
+        self.assertIs(self.storage.get(State, self.states[0].id),
+                      self.states[0])
+
+
+class TestFileStorageSerializers(unittest.TestCase):
+    """Tests the snapshot formats of FileStorage"""
+
+    def setUp(self):
+        """Store a user and a place"""
+        self.storage = FileStorage()
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.storage._FileStorage__changes = {}
+        self.test_file = "test_file.json"
+        FileStorage._FileStorage__file_path = self.test_file
+        self.user = User()
+        self.user.first_name = "Ada"
+        self.place = Place()
+        for obj in (self.user, self.place):
+            self.storage.new(obj)
+
+    def tearDown(self):
+        """Drop the lazy index and remove the files"""
+        if FileStorage._FileStorage__lazy is not None:
+            FileStorage._FileStorage__lazy.close()
+            FileStorage._FileStorage__lazy = None
+        for path in (self.test_file, self.test_file + ".bak",
+                     self.test_file + ".corrupt"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def reloaded(self, serializer="json", lazy=False):
+        """Returns the objects read back with serializer selected"""
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.storage.serializer = serializer
+        self.storage.lazy = lazy
+        self.storage.reload()
+        return (self.storage.all())
+
+    def test_pickle_round_trip(self):
+        """Test that a pickled file is read back whatever is selected"""
+        self.storage.serializer = "pickle"
+        self.storage.save()
+        with open(self.test_file, "rb") as file:
+            self.assertEqual(file.read(1), b"\x80")
+        objects = self.reloaded("json")
+        self.assertEqual(objects[f"User.{self.user.id}"].to_dict(),
+                         self.user.to_dict())
+        self.assertEqual(len(objects), 2)
+
+    def test_json_formats_are_interchangeable(self):
+        """Test that json and orjson read each other's files"""
+        for written, read in (("orjson", "json"), ("json", "orjson")):
+            self.storage.serializer = written
+            self.storage.touch(self.user, "first_name")
+            self.storage.save()
+            with open(self.test_file, "r") as file:
+                self.assertEqual(len(json.load(file)), 2)
+            objects = self.reloaded(read)
+            self.assertEqual(objects[f"User.{self.user.id}"].first_name,
+                             "Ada")
+            self.user = objects[f"User.{self.user.id}"]
+
+    def test_lazy_reload_of_pickled_file(self):
+        """Test that lazy mode keeps pending records of a pickled file"""
+        self.storage.serializer = "pickle"
+        self.storage.save()
+        self.reloaded("pickle", lazy=True)
+        self.assertEqual(self.storage.count(User), 1)
+        user = self.storage.get(User, self.user.id)
+        user.first_name = "Grace"
+        self.storage.touch(user, "first_name")
+        self.storage.save()
+        objects = self.reloaded("json")
+        self.assertEqual(objects[f"User.{user.id}"].first_name, "Grace")
+        self.assertIn(f"Place.{self.place.id}", objects)
+
+    def test_pickle_refuses_globals(self):
+        """Test that a pickle naming a global is set aside, not loaded"""
+        with open(self.test_file, "wb") as file:
+            file.write(b"\x80\x05cos\nsystem\n(S'true'\ntR.")
+        with self.assertWarns(RuntimeWarning):
+            self.assertEqual(self.reloaded("pickle"), {})
+        self.assertTrue(os.path.exists(self.test_file + ".corrupt"))
+
+    def test_unknown_serializer(self):
+        """Test that an unknown format name raises ValueError"""
+        with self.assertRaises(ValueError):
+            get_serializer("yaml")
+
+
+class TestFileStorageSharded(unittest.TestCase):
+    """Tests the sharded layout of FileStorage"""
+
+    def setUp(self):
+        """Save two states and three reviews in shards"""
+        self.storage = FileStorage()
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.storage._FileStorage__changes = {}
+        self.storage.sharded = True
+        self.test_file = "test_file.json"
+        self.shards = self.test_file + ".d"
+        FileStorage._FileStorage__file_path = self.test_file
+        self.states = [State(), State()]
+        self.reviews = [Review(), Review(), Review()]
+        for obj in self.states + self.reviews:
+            self.storage.new(obj)
+        self.storage.save()
+
+    def tearDown(self):
+        """Remove the files and forget the shards not read"""
+        FileStorage._FileStorage__shards = {}
+        FileStorage._FileStorage__stale = set()
+        shutil.rmtree(self.shards, ignore_errors=True)
+        for path in (self.test_file, self.test_file + ".bak"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def built(self):
+        """Returns the keys of the objects built so far"""
+        return (set(self.storage._FileStorage__objects))
+
+    def reload(self, classes=None):
+        """Drops the objects, then reloads them"""
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.storage.reload(classes)
+
+    def test_one_file_per_class(self):
+        """Test that each class is saved in its own file"""
+        self.assertEqual(set(os.listdir(self.shards)),
+                         {"State.json", "Review.json"})
+        with open(os.path.join(self.shards, "State.json")) as file:
+            self.assertEqual(len(json.load(file)), 2)
+
+    def test_save_rewrites_dirty_shards_only(self):
+        """Test that a change only rewrites the shard of its class"""
+        state_path = os.path.join(self.shards, "State.json")
+        review_path = os.path.join(self.shards, "Review.json")
+        inodes = (os.stat(state_path).st_ino, os.stat(review_path).st_ino)
+        self.reviews[0].text = "Great"
+        self.storage.touch(self.reviews[0], "text")
+        self.storage.save()
+        self.assertEqual(os.stat(state_path).st_ino, inodes[0])
+        self.assertNotEqual(os.stat(review_path).st_ino, inodes[1])
+        self.reload()
+        self.assertEqual(
+                self.storage.get(Review, self.reviews[0].id).text, "Great")
+
+    def test_reload_selected_classes(self):
+        """Test that reload reads the other classes on first access"""
+        self.reload([State])
+        self.assertEqual(self.built(),
+                         {f"State.{state.id}" for state in self.states})
+        self.assertEqual(self.storage.count(Review), 3)
+        self.assertEqual(len(self.storage.all()), 5)
+
+    def test_save_keeps_shards_not_read(self):
+        """Test that a new object keeps the records of its shard"""
+        self.reload([State])
+        review = Review()
+        self.storage.new(review)
+        self.storage.save()
+        self.reload()
+        self.assertEqual(self.storage.count(Review), 4)
+
+    def test_id_prefix_partitions(self):
+        """Test that get reads only the shard of the id prefix"""
+        self.storage.shard_prefix = 1
+        self.reload()
+        self.storage.save()
+        names = os.listdir(self.shards)
+        self.assertNotIn("Review.json", names)
+        self.assertIn(f"Review.{self.reviews[0].id[0]}.json", names)
+
+        self.storage.lazy = True
+        self.reload()
+        self.assertEqual(self.built(), set())
+        review = self.storage.get(Review, self.reviews[0].id)
+        self.assertEqual(review.to_dict(), self.reviews[0].to_dict())
+        self.assertEqual({key.split(".")[1][0] for key in self.built()},
+                         {review.id[0]})
+        self.assertEqual(self.storage.count(), 5)
+
+    def test_single_file_is_split(self):
+        """Test that the first sharded save splits the single file"""
+        shutil.rmtree(self.shards)
+        self.storage.sharded = False
+        self.storage.save()
+        self.storage.sharded = True
+        self.reload()
+        self.storage.save()
+        self.reload()
+        self.assertEqual(self.storage.count(), 5)
+        self.assertEqual(len(os.listdir(self.shards)), 2)
+
+
+class TestFileStorageReadOnly(unittest.TestCase):
+    """Tests the memory mapped read-only mode of FileStorage"""
+
+    def setUp(self):
+        """Save two users and a place with an offset index"""
+        self.storage = FileStorage()
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.storage._FileStorage__changes = {}
+        self.storage.offset_index = True
+        self.test_file = "test_file.json"
+        FileStorage._FileStorage__file_path = self.test_file
+        self.users = [User(), User()]
+        self.place = Place()
+        for obj in self.users + [self.place]:
+            self.storage.new(obj)
+        self.storage.save()
+
+    def tearDown(self):
+        """Drop the mapped snapshot and remove the files"""
+        if FileStorage._FileStorage__lazy is not None:
+            FileStorage._FileStorage__lazy.close()
+            FileStorage._FileStorage__lazy = None
+        for path in (self.test_file, self.test_file + ".bak",
+                     self.test_file + ".idx", self.test_file + ".corrupt"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def reload_read_only(self):
+        """Drops the objects, then maps the snapshot"""
+        self.storage._FileStorage__objects = {}
+        self.storage._FileStorage__classes = {}
+        self.storage._FileStorage__indexes = {}
+        self.storage.read_only = True
+        self.storage.reload()
+
+    def test_records_found_through_offset_index(self):
+        """Test that the offset index spares scanning the snapshot"""
+        self.reload_read_only()
+        with patch.object(LazyIndex, "_LazyIndex__scan") as scan:
+            user = self.storage.get(User, self.users[1].id)
+        scan.assert_not_called()
+        self.assertEqual(user.to_dict(), self.users[1].to_dict())
+        self.assertEqual(set(self.storage._FileStorage__objects),
+                         {f"User.{user.id}"})
+        self.assertEqual(self.storage.count(), 3)
+        self.assertIsNotNone(
+                FileStorage._FileStorage__lazy._LazyIndex__map)
+
+    def test_stale_offset_index_is_ignored(self):
+        """Test that a snapshot saved without the index is scanned"""
+        self.users[0].first_name = "Ada"
+        self.storage.touch(self.users[0], "first_name")
+        self.storage.offset_index = False
+        self.storage.save()
+        self.reload_read_only()
+        self.assertEqual(self.storage.get(User, self.users[0].id)
+                         .first_name, "Ada")
+        self.assertEqual(self.storage.count(), 3)
+
+    def test_read_only_cannot_flush(self):
+        """Test that flush raises in read-only mode"""
+        self.reload_read_only()
+        with self.assertRaises(RuntimeError):
+            self.storage.flush()
+
+    def test_read_only_leaves_unreadable_file(self):
+        """Test that an unreadable snapshot is neither moved nor written,
+        and its backup is read instead"""
+        self.users[0].first_name = "Ada"
+        self.storage.touch(self.users[0], "first_name")
+        self.storage.save()
+        with open(self.test_file, "w") as file:
+            file.write('{"User.')
+        with self.assertWarns(RuntimeWarning):
+            self.reload_read_only()
+            self.assertEqual(self.storage.count(), 3)
+        with open(self.test_file, "r") as file:
+            self.assertEqual(file.read(), '{"User.')
+        self.assertFalse(os.path.exists(self.test_file + ".corrupt"))
+
+    def test_read_only_refuses_new_and_delete(self):
+        """Test that new and delete raise before changing anything"""
+        self.reload_read_only()
+        user = self.storage.get(User, self.users[0].id)
+        with self.assertRaises(RuntimeError):
+            self.storage.new(Place())
+        with self.assertRaises(RuntimeError):
+            self.storage.delete(user)
+        self.assertEqual(self.storage.count(), 3)
+        self.assertIs(self.storage.get(User, user.id), user)
+        self.assertEqual(self.storage._FileStorage__changes, {})
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,171 @@
+#!/usr/bin/python3
+"""Unittest for module integrity
+
+Contains the test cases:
+    TestConfigure
+    TestDestroy
+    TestCheck
+"""
+import unittest
+from unittest.mock import patch
+from models import storage
+from models import integrity
+from models.state import State
+from models.city import City
+from models.place import Place
+from models.review import Review
+from models.user import User
+from models.amenity import Amenity
+
+POLICIES = "City.state=cascade, Place.city=cascade, Place.user=restrict, " \
+    "Review.place=cascade, Review.user=cascade"
+
+
+def set_policies(test, setting=POLICIES):
+    """Sets the on_delete policies of setting until test ends"""
+    for relationship in (City.state, Place.city, Place.user, Review.place,
+                         Review.user):
+        test.addCleanup(setattr, relationship, "on_delete",
+                        relationship.on_delete)
+    integrity.configure(setting)
+
+
+class TestConfigure(unittest.TestCase):
+    """Tests configure() and the default policies."""
+
+    def test_no_policy_by_default(self):
+        """Test that destroying leaves the referring objects alone."""
+        state = State()
+        city = City()
+        city.state_id = state.id
+        self.addCleanup(storage.delete, city)
+        self.assertEqual(integrity.dependents(state),
+                         {f"State.{state.id}": state})
+        storage.delete(state)
+
+    def test_configure(self):
+        """Test that policies are set, and bad settings refused."""
+        set_policies(self, "City.state=cascade,Place.user=restrict")
+        self.assertEqual(City.state.on_delete, "cascade")
+        self.assertEqual(Place.user.on_delete, "restrict")
+        integrity.configure("City.state=none")
+        self.assertIsNone(City.state.on_delete)
+        for setting in ("City.places=cascade", "City.nothing=cascade",
+                        "Nowhere.state=cascade", "City.state=delete"):
+            with self.assertRaises(ValueError):
+                integrity.configure(setting)
+
+
+class TestDestroy(unittest.TestCase):
+    """Tests destroy() and its cascade and restrict policies."""
+
+    def setUp(self):
+        """Set up a state, a city, a place of a user and its review"""
+        set_policies(self)
+        self.state = State()
+        self.city = City()
+        self.city.state_id = self.state.id
+        self.user = User()
+        self.place = Place()
+        self.place.city_id = self.city.id
+        self.place.user_id = self.user.id
+        self.review = Review()
+        self.review.place_id = self.place.id
+        self.objects = [self.state, self.city, self.user, self.place,
+                        self.review]
+
+    def tearDown(self):
+        """Remove the created objects"""
+        for obj in self.objects:
+            storage.delete(obj)
+
+    def stored(self, obj):
+        """Returns True if obj is still in storage"""
+        return (storage.get(obj.__class__, obj.id) is obj)
+
+    def test_cascade(self):
+        """Test that destroying a state destroys what refers to it."""
+        with patch.object(type(storage), "flush") as flush:
+            doomed = integrity.destroy(self.state)
+        flush.assert_called_once_with()
+        self.assertEqual(set(doomed.values()),
+                         {self.state, self.city, self.place, self.review})
+        for obj in (self.state, self.city, self.place, self.review):
+            self.assertFalse(self.stored(obj))
+        self.assertTrue(self.stored(self.user))
+
+    def test_restrict(self):
+        """Test that a user owning a place is not destroyed."""
+        with self.assertRaises(ValueError):
+            integrity.destroy(self.user)
+        self.assertTrue(self.stored(self.user))
+        integrity.destroy(self.place)
+        integrity.destroy(self.user)
+        self.assertFalse(self.stored(self.user))
+
+    def test_restrict_within_cascade(self):
+        """Test that a restricting object destroyed too does not block."""
+        self.place.user_id = ""
+        review = Review()
+        review.place_id = self.place.id
+        review.user_id = self.user.id
+        self.objects.append(review)
+        self.assertIn(f"Review.{review.id}",
+                      integrity.dependents(self.user))
+
+
+class TestCheck(unittest.TestCase):
+    """Tests check() and repair()."""
+
+    def setUp(self):
+        """Set up a city without its state and a place with a missing
+        amenity"""
+        set_policies(self)
+        self.amenity = Amenity()
+        self.city = City()
+        self.city.state_id = "missing-state"
+        self.place = Place()
+        self.place.city_id = self.city.id
+        self.place.amenity_ids = [self.amenity.id, "missing-amenity"]
+        self.review = Review()
+        self.review.user_id = "missing-user"
+
+    def tearDown(self):
+        """Remove the created objects"""
+        for obj in (self.amenity, self.city, self.place, self.review):
+            storage.delete(obj)
+
+    def problems(self):
+        """Returns the problems of the created objects"""
+        return ([(obj, relationship.attribute, id)
+                 for obj, relationship, id in integrity.check()
+                 if obj in (self.city, self.place, self.review)])
+
+    def test_check(self):
+        """Test that only the missing ids are reported."""
+        self.assertCountEqual(self.problems(), [
+                (self.city, "state_id", "missing-state"),
+                (self.place, "amenity_ids", "missing-amenity"),
+                (self.review, "user_id", "missing-user")])
+
+    def test_id_list_that_is_not_a_list(self):
+        """Test that a legacy string id list is neither reported nor
+        rewritten."""
+        self.place.amenity_ids = "wifi"
+        self.assertNotIn(self.place, [obj for obj, attribute, id
+                                      in self.problems()
+                                      if attribute == "amenity_ids"])
+        problems = [(self.place, Place.amenities, "w")]
+        self.assertEqual(integrity.repair(problems), 0)
+        self.assertEqual(self.place.amenity_ids, "wifi")
+
+    def test_repair(self):
+        """Test that repair applies the cascade and cleans id lists."""
+        problems = [problem for problem in integrity.check()
+                    if problem[0] in (self.city, self.place, self.review)]
+        self.assertEqual(integrity.repair(problems), 3)
+        self.assertIsNone(storage.get(City, self.city.id))
+        self.assertIsNone(storage.get(Place, self.place.id))
+        self.assertIsNone(storage.get(Review, self.review.id))
+        self.assertEqual(self.place.amenity_ids, [self.amenity.id])
+        self.assertEqual(self.problems(), [])
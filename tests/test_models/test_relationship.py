@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+"""Unittest for module relationship
+
+Contains the test cases:
+    TestRelationships
+"""
+import unittest
+from unittest.mock import patch
+from models import storage
+from models.state import State
+from models.city import City
+from models.place import Place
+from models.review import Review
+from models.user import User
+from models.amenity import Amenity
+from models.relationship import HasMany
+
+
+class TestRelationships(unittest.TestCase):
+    """Tests the relationship attributes of the models."""
+
+    def setUp(self):
+        """Set up a state with two cities, places, reviews and amenities"""
+        self.state = State()
+        self.cities = [City(), City()]
+        self.places = [Place(), Place(), Place()]
+        self.reviews = [Review(), Review()]
+        self.amenities = [Amenity(), Amenity()]
+        self.user = User()
+        for city in self.cities:
+            city.state_id = self.state.id
+        for place, city in zip(self.places, self.cities + self.cities):
+            place.city_id = city.id
+            place.user_id = self.user.id
+        for review, place in zip(self.reviews, self.places[1:]):
+            review.place_id = place.id
+        self.places[0].amenity_ids = [self.amenities[1].id, "missing",
+                                      self.amenities[0].id]
+
+    def tearDown(self):
+        """Remove the created objects"""
+        for obj in [self.state, self.user] + self.cities + self.places + \
+                self.reviews + self.amenities:
+            storage.delete(obj)
+
+    def test_belongs_to(self):
+        """Test that the object of an id is returned, or None."""
+        self.assertIs(self.cities[0].state, self.state)
+        self.assertIs(self.reviews[0].place, self.places[1])
+        self.assertIsNone(self.reviews[0].user)
+        self.cities[0].state_id = "missing"
+        self.assertIsNone(self.cities[0].state)
+
+    def test_has_many(self):
+        """Test the objects referring to an instance."""
+        self.assertEqual(self.state.cities, self.cities)
+        self.assertEqual(self.cities[0].places,
+                         [self.places[0], self.places[2]])
+        self.assertEqual(self.user.places, self.places)
+        self.assertEqual(self.places[1].reviews, [self.reviews[0]])
+
+    def test_references_many(self):
+        """Test the objects listed by id, even after an in-place change."""
+        self.assertEqual(self.places[0].amenities,
+                         [self.amenities[1], self.amenities[0]])
+        self.places[0].amenity_ids.remove(self.amenities[1].id)
+        self.assertEqual(self.places[0].amenities, [self.amenities[0]])
+
+    def test_through(self):
+        """Test relationships of relationships, without duplicates."""
+        self.assertEqual(self.state.places,
+                         [self.places[0], self.places[2], self.places[1]])
+        self.assertEqual(self.state.reviews,
+                         [self.reviews[1], self.reviews[0]])
+        self.assertEqual(self.cities[1].reviews, [self.reviews[0]])
+
+    def test_cache_follows_changes(self):
+        """Test that results are cached until a related object changes."""
+        self.assertEqual(self.state.reviews,
+                         [self.reviews[1], self.reviews[0]])
+        with patch.object(type(storage), "find") as find:
+            self.assertEqual(self.state.reviews,
+                             [self.reviews[1], self.reviews[0]])
+            self.assertEqual(self.places[1].reviews, [self.reviews[0]])
+        find.assert_not_called()
+        review = Review()
+        review.place_id = self.places[0].id
+        self.reviews.append(review)
+        self.assertEqual(self.state.reviews,
+                         [review, self.reviews[1], self.reviews[0]])
+        self.places[0].city_id = "elsewhere"
+        self.assertEqual(self.state.reviews,
+                         [self.reviews[1], self.reviews[0]])
+        storage.delete(self.reviews[1])
+        self.assertEqual(self.state.reviews, [self.reviews[0]])
+
+    def test_results_are_copies(self):
+        """Test that changing a returned list leaves the cache intact."""
+        self.state.cities.clear()
+        self.assertEqual(self.state.cities, self.cities)
+
+    def test_class_access(self):
+        """Test that the class attribute is the relationship itself."""
+        self.assertIsInstance(State.cities, HasMany)
+        self.assertNotIn("cities", State().to_dict())
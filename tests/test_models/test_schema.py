@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+"""Unittest for module schema
+
+Contains the test cases:
+    TestSchema
+"""
+import unittest
+from models.base_model import BaseModel
+from models.place import Place
+from models.user import User
+from models.schema import Schema
+
+
+class TestSchema(unittest.TestCase):
+    """Tests the schema compiled from the class attributes."""
+
+    def test_types(self):
+        """Test that the types come from the class attributes."""
+        types = Schema.of(Place).types
+        self.assertEqual(types["max_guest"], int)
+        self.assertEqual(types["latitude"], float)
+        self.assertEqual(types["name"], str)
+        self.assertEqual(types["amenity_ids"], list)
+        self.assertNotIn("reviews", types)
+        self.assertEqual(Schema.of(BaseModel).types, {})
+        self.assertIs(Schema.of(User), Schema.of(User))
+
+    def test_coerce(self):
+        """Test the conversions of declared attributes."""
+        schema = Schema.of(Place)
+        self.assertEqual(schema.coerce("max_guest", " 4 "), 4)
+        self.assertEqual(schema.coerce("max_guest", "4.0"), 4)
+        self.assertEqual(schema.coerce("latitude", "6.5"), 6.5)
+        self.assertIsInstance(schema.coerce("longitude", 3), float)
+        self.assertEqual(schema.coerce("name", 12), "12")
+        self.assertEqual(schema.coerce("amenity_ids", '["a", "b"]'),
+                         ["a", "b"])
+        self.assertEqual(schema.coerce("color", "red"), "red")
+        self.assertEqual(schema.coerce("color", "3", current=1), 3)
+        for name, value in (("max_guest", "many"), ("max_guest", 2.5),
+                            ("latitude", None), ("name", ["x"]),
+                            ("amenity_ids", "a, b")):
+            with self.assertRaises(ValueError):
+                schema.coerce(name, value)
+
+    def test_coerce_dict(self):
+        """Test that only the declared attributes are converted."""
+        converted = Schema.of(Place).coerce_dict(
+                {"__class__": "Place", "id": "1", "max_guest": "3"})
+        self.assertEqual(converted, {"__class__": "Place", "id": "1",
+                                     "max_guest": 3})
+
+    def test_loaded_objects_are_typed(self):
+        """Test that objects built from a dictionary are converted, and
+        values that cannot be are kept."""
+        place = Place(id="1", max_guest="3", price_by_night="cheap")
+        self.assertEqual(place.max_guest, 3)
+        self.assertEqual(place.price_by_night, "cheap")